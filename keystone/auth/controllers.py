@@ -20,6 +20,7 @@ from keystone.auth import token_factory
 from keystone.common import controller
 from keystone.common import cms
 from keystone.common import logging
+from keystone.common import signing
 from keystone import config
 from keystone import exception
 from keystone import identity
@@ -374,9 +375,7 @@ class Auth(controller.V3Controller):
         token_ref = self.token_api.get_token(context=context,
                                              token_id=token_id)
         if cms.is_ans1_token(token_id):
-            verified_token = cms.cms_verify(cms.token_to_cms(token_id),
-                                            CONF.signing.certfile,
-                                            CONF.signing.ca_certs)
+            verified_token = signing.verify_token(token_id)
             token_ref = json.loads(verified_token)
         if belongs_to:
             assert token_ref['project']['id'] == belongs_to
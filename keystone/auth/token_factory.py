@@ -17,12 +17,11 @@
 """Token Factory"""
 
 import json
-import subprocess
 import uuid
 import webob
 
-from keystone.common import cms
 from keystone.common import logging
+from keystone.common import signing
 from keystone.common import utils
 from keystone import catalog
 from keystone import config
@@ -68,11 +67,9 @@ class TokenDataHelper(object):
     def _get_project_roles_for_user(self, user_id, project_id):
         roles = self.identity_api.get_roles_for_user_and_project(
             self.context, user_id, project_id)
-        roles_ref = []
-        for role_id in roles:
-            role_ref = self.identity_api.get_role(self.context, role_id)
+        roles_ref = self.identity_api.get_roles_by_ids(self.context, roles)
+        for role_ref in roles_ref:
             role_ref.setdefault('project_id', project_id)
-            roles_ref.append(role_ref)
         # user have no project roles, therefore access denied
         if len(roles_ref) == 0:
             msg = _('User have no access to project')
@@ -83,11 +80,9 @@ class TokenDataHelper(object):
     def _get_domain_roles_for_user(self, user_id, domain_id):
         roles = self.identity_api.get_roles_for_user_and_domain(
             self.context, user_id, domain_id)
-        roles_ref = []
-        for role_id in roles:
-            role_ref = self.identity_api.get_role(self.context, role_id)
+        roles_ref = self.identity_api.get_roles_by_ids(self.context, roles)
+        for role_ref in roles_ref:
             role_ref.setdefault('domain_id', domain_id)
-            roles_ref.append(role_ref)
         # user have no domain roles, therefore access denied
         if len(roles_ref) == 0:
             msg = _('User have no access to domain')
@@ -257,10 +252,8 @@ def create_token(context, auth_context, auth_info):
         token_id = uuid.uuid4().hex
     elif CONF.signing.token_format == 'PKI':
         try:
-            token_id = cms.cms_sign_token(json.dumps(token_data),
-                                          CONF.signing.certfile,
-                                          CONF.signing.keyfile)
-        except subprocess.CalledProcessError:
+            token_id = signing.sign_token(json.dumps(token_data))
+        except signing.SigningError:
             raise exception.UnexpectedError(_(
                 'Unable to sign token.'))
     else:
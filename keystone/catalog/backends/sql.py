@@ -15,6 +15,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import time
+
 from keystone import catalog
 from keystone.catalog import core
 from keystone.common import sql
@@ -24,6 +26,7 @@ from keystone import exception
 
 
 CONF = config.CONF
+config.register_int('refresh_interval', group='catalog', default=30)
 
 
 class Service(sql.ModelBase, sql.DictBase):
@@ -47,10 +50,83 @@ class Endpoint(sql.ModelBase, sql.DictBase):
     extra = sql.Column(sql.JsonBlob())
 
 
+class CompiledCatalog(object):
+    """Every endpoint with its service, and its URL template parsed.
+
+    Building a catalog from it only puts the user and tenant ids in place.
+
+    """
+
+    def __init__(self, rows, data):
+        self.entries = []
+        for endpoint, service in rows:
+            endpoint = endpoint.to_dict()
+            url = core.UrlTemplate(endpoint.pop('url', None), data)
+            del endpoint['service_id']
+            self.entries.append((endpoint, service.to_dict(), url))
+
+    def get_catalog(self, user_id, tenant_id):
+        catalog = {}
+        for endpoint, service, url in self.entries:
+            # add the endpoint to the catalog if it's not already there
+            catalog.setdefault(endpoint['region'], {})
+            catalog[endpoint['region']].setdefault(
+                service['type'], {
+                    'id': endpoint['id'],
+                    'name': service['name'],
+                    'publicURL': '',  # this may be overridden, but must exist
+                })
+
+            # add the interface's url
+            interface_url = '%sURL' % endpoint['interface']
+            catalog[endpoint['region']][service['type']][interface_url] = (
+                url.format(tenant_id, user_id))
+
+        return catalog
+
+    def get_v3_catalog(self, user_id, tenant_id):
+        services = {}
+        for endpoint, service, url in self.entries:
+            services.setdefault(service['id'], {'id': service['id'],
+                                                'type': service['type'],
+                                                'endpoints': []})
+            services[service['id']]['endpoints'].append(
+                dict(endpoint, url=url.format(tenant_id, user_id)))
+        return services.values()
+
+
 class Catalog(sql.Base, catalog.Driver):
+    """SQL catalog backend.
+
+    The catalogs handed out for tokens are built from a CompiledCatalog,
+    which is rebuilt after any change made through this driver, and at
+    least every ``[catalog] refresh_interval`` seconds to see changes made
+    by other processes.
+
+    """
+
+    def __init__(self):
+        super(Catalog, self).__init__()
+        self._compiled = None
+        self._compiled_at = 0
+
     def db_sync(self):
         migration.db_sync()
 
+    def _invalidate(self):
+        self._compiled = None
+
+    def _get_compiled(self):
+        compiled = self._compiled
+        age = time.time() - self._compiled_at
+        if compiled is None or age >= CONF.catalog.refresh_interval:
+            session = self.get_session()
+            rows = session.query(Endpoint, Service).join(Service)
+            compiled = CompiledCatalog(rows, dict(CONF.iteritems()))
+            self._compiled = compiled
+            self._compiled_at = time.time()
+        return compiled
+
     # Services
     def list_services(self):
         session = self.get_session()
@@ -74,6 +150,7 @@ class Catalog(sql.Base, catalog.Driver):
             session.query(Endpoint).filter_by(service_id=service_id).delete()
             session.delete(ref)
             session.flush()
+        self._invalidate()
 
     def create_service(self, service_id, service_ref):
         session = self.get_session()
@@ -81,6 +158,7 @@ class Catalog(sql.Base, catalog.Driver):
             service = Service.from_dict(service_ref)
             session.add(service)
             session.flush()
+        self._invalidate()
         return service.to_dict()
 
     def update_service(self, service_id, service_ref):
@@ -95,6 +173,7 @@ class Catalog(sql.Base, catalog.Driver):
                     setattr(ref, attr, getattr(new_service, attr))
             ref.extra = new_service.extra
             session.flush()
+        self._invalidate()
         return ref.to_dict()
 
     # Endpoints
@@ -105,6 +184,7 @@ class Catalog(sql.Base, catalog.Driver):
         with session.begin():
             session.add(new_endpoint)
             session.flush()
+        self._invalidate()
         return new_endpoint.to_dict()
 
     def delete_endpoint(self, endpoint_id):
@@ -113,6 +193,7 @@ class Catalog(sql.Base, catalog.Driver):
             if not session.query(Endpoint).filter_by(id=endpoint_id).delete():
                 raise exception.EndpointNotFound(endpoint_id=endpoint_id)
             session.flush()
+        self._invalidate()
 
     def _get_endpoint(self, session, endpoint_id):
         try:
@@ -141,64 +222,11 @@ class Catalog(sql.Base, catalog.Driver):
                     setattr(ref, attr, getattr(new_endpoint, attr))
             ref.extra = new_endpoint.extra
             session.flush()
+        self._invalidate()
         return ref.to_dict()
 
     def get_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
-
-        catalog = {}
-        services = {}
-        for endpoint in self.list_endpoints():
-            # look up the service
-            services.setdefault(
-                endpoint['service_id'],
-                self.get_service(endpoint['service_id']))
-            service = services[endpoint['service_id']]
-
-            # add the endpoint to the catalog if it's not already there
-            catalog.setdefault(endpoint['region'], {})
-            catalog[endpoint['region']].setdefault(
-                service['type'], {
-                    'id': endpoint['id'],
-                    'name': service['name'],
-                    'publicURL': '',  # this may be overridden, but must exist
-                })
-
-            # add the interface's url
-            url = core.format_url(endpoint.get('url'), d)
-            interface_url = '%sURL' % endpoint['interface']
-            catalog[endpoint['region']][service['type']][interface_url] = url
-
-        return catalog
+        return self._get_compiled().get_catalog(user_id, tenant_id)
 
     def get_v3_catalog(self, user_id, tenant_id, metadata=None):
-        d = dict(CONF.iteritems())
-        d.update({'tenant_id': tenant_id,
-                  'user_id': user_id})
-
-        services = {}
-        for endpoint in self.list_endpoints():
-            # look up the service
-            service_id = endpoint['service_id']
-            services.setdefault(
-                service_id,
-                self.get_service(service_id))
-            service = services[service_id]
-            del endpoint['service_id']
-            endpoint['url'] = core.format_url(endpoint['url'], d)
-            if 'endpoints' in services[service_id]:
-                services[service_id]['endpoints'].append(endpoint)
-            else:
-                services[service_id]['endpoints'] = [endpoint]
-
-        catalog = []
-        for service_id, service in services.iteritems():
-            formatted_service = {}
-            formatted_service['id'] = service['id']
-            formatted_service['type'] = service['type']
-            formatted_service['endpoints'] = service['endpoints']
-            catalog.append(formatted_service)
-
-        return catalog
+        return self._get_compiled().get_v3_catalog(user_id, tenant_id)
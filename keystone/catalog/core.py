@@ -52,6 +52,35 @@ def format_url(url, data):
     return result
 
 
+class UrlTemplate(object):
+    """An endpoint URL with everything but the user and tenant filled in.
+
+    The rest of the substitution data, typically the configuration, is
+    applied once here, so formatting the URL for a request only puts the
+    user and tenant ids in place. Malformed URLs raise MalformedEndpoint
+    straight away.
+
+    """
+
+    KEYS = ('tenant_id', 'user_id')
+
+    def __init__(self, url, data):
+        # stand-ins that cannot appear in a URL mark where the ids go
+        markers = dict((key, '\0%s\0' % key) for key in self.KEYS)
+        formatted = format_url(url, dict(data, **markers))
+        # literal text at even indexes, the ids' keys at odd ones
+        self.parts = formatted.split('\0') if formatted is not None else None
+
+    def format(self, tenant_id, user_id):
+        if self.parts is None:
+            return None
+        values = {'tenant_id': tenant_id, 'user_id': user_id}
+        parts = list(self.parts)
+        for i in range(1, len(parts), 2):
+            parts[i] = '%s' % values[parts[i]]
+        return ''.join(parts)
+
+
 @dependency.provider('catalog_api')
 class Manager(manager.Manager):
     """Default pivot point for the Catalog backend.
@@ -61,6 +90,12 @@ class Manager(manager.Manager):
 
     """
 
+    cache_namespace = 'catalog'
+    cached_methods = ('get_service',
+                      'get_endpoint',
+                      'get_catalog',
+                      'get_v3_catalog')
+
     def __init__(self):
         super(Manager, self).__init__(CONF.catalog.driver)
 
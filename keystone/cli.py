@@ -143,12 +143,26 @@ class ImportNovaAuth(BaseApp):
         nova.import_auth(dump_data)
 
 
+class TokenFlush(BaseApp):
+    """Purge expired tokens from the token backend."""
+
+    name = 'token_flush'
+
+    @staticmethod
+    def main():
+        from keystone import token
+        token_manager = token.Manager()
+        count, elapsed = token_manager.flush_expired_tokens(None)
+        print 'Removed %d expired tokens in %.2f seconds' % (count, elapsed)
+
+
 CMDS = [
     DbSync,
     ExportLegacyCatalog,
     ImportLegacy,
     ImportNovaAuth,
     PKISetup,
+    TokenFlush,
 ]
 
 
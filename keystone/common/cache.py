@@ -0,0 +1,257 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Read-through caching of the lookups a manager forwards to its driver.
+
+Cached values are keyed by a per namespace generation. Any call that changes
+the backend (``create_*``, ``update_*``, ``delete_*``, ``add_*`` and
+``remove_*``) moves the namespace to a new generation, so every entry cached
+before the change is left to expire unread.
+
+"""
+
+import copy
+import functools
+import hashlib
+import time
+
+from keystone.common import utils
+from keystone import config
+from keystone import exception
+from keystone.openstack.common import importutils
+from keystone.openstack.common import jsonutils
+
+
+CONF = config.CONF
+
+WRITE_PREFIXES = ('create_', 'update_', 'delete_', 'add_', 'remove_')
+
+_BACKENDS = {}
+
+
+class ConfigurationError(Exception):
+    """Raised when the cache configuration can't be used."""
+    pass
+
+
+class Backend(object):
+    """Interface description for a cache backend."""
+
+    def get(self, key):
+        """Returns the value cached at key, or None."""
+        raise exception.NotImplemented()
+
+    def set(self, key, value, ttl):
+        """Caches value at key for ttl seconds."""
+        raise exception.NotImplemented()
+
+    def get_generation(self, namespace):
+        """Returns the current generation of a namespace."""
+        raise exception.NotImplemented()
+
+    def bump_generation(self, namespace):
+        """Moves a namespace to a new generation."""
+        raise exception.NotImplemented()
+
+
+class MemoryBackend(Backend):
+    """Caches values in the memory of this process.
+
+    Writes made by other processes are not noticed until the entries they
+    affect expire, so keystone-all refuses it when running several workers;
+    use the MemcacheBackend instead.
+
+    """
+
+    def __init__(self):
+        self._cache = utils.LRUCache(CONF.cache.max_size)
+        self._generations = {}
+
+    def get(self, key):
+        # callers are free to modify what they are given
+        return copy.deepcopy(self._cache.get(key))
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, copy.deepcopy(value), ttl)
+
+    def get_generation(self, namespace):
+        return self._generations.get(namespace, 0)
+
+    def bump_generation(self, namespace):
+        self._generations[namespace] = self.get_generation(namespace) + 1
+
+
+class MemcacheBackend(Backend):
+    """Caches values in the memcached servers of the ``[memcache]`` section.
+
+    The generations live in memcached as well, so a write made by any
+    process sharing the servers is seen by all of them.
+
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            from keystone.common import memcache_pool
+            client = memcache_pool.get_client()
+        self.client = client
+
+    def _generation_key(self, namespace):
+        return 'cache-generation-%s' % namespace
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, time=ttl)
+
+    def get_generation(self, namespace):
+        key = self._generation_key(namespace)
+        generation = self.client.get(key)
+        if generation is None:
+            self._start_generation(key)
+            generation = self.client.get(key) or 0
+        return generation
+
+    def bump_generation(self, namespace):
+        key = self._generation_key(namespace)
+        if self.client.incr(key) is None:
+            self._start_generation(key)
+            self.client.incr(key)
+
+    def _start_generation(self, key):
+        # start from the clock, so a generation evicted from memcached is
+        # never mistaken for one seen before
+        self.client.add(key, int(time.time() * 1000))
+
+
+def get_backend():
+    """Return the backend configured by ``[cache] backend``."""
+    name = CONF.cache.backend
+    if name not in _BACKENDS:
+        _BACKENDS[name] = importutils.import_object(name)
+    return _BACKENDS[name]
+
+
+def check_workers():
+    """Refuse a per process backend when keystone-all runs several workers.
+
+    Each worker would keep its own cache and only see writes made through
+    the others, such as disabling a user, once the cached values expire.
+
+    :raises: keystone.common.cache.ConfigurationError
+
+    """
+    if not CONF.cache.enabled or CONF.workers <= 0:
+        return
+    # only the class is needed; a backend built here would be inherited
+    # by every worker
+    if issubclass(importutils.import_class(CONF.cache.backend),
+                  MemoryBackend):
+        raise ConfigurationError(
+            _('%(backend)s is kept in each process, so it can not be used '
+              'with workers = %(workers)d. Use the MemcacheBackend or leave '
+              'the cache disabled.') %
+            {'backend': CONF.cache.backend, 'workers': CONF.workers})
+
+
+def reset():
+    """Drop the backends, so they are rebuilt from the current configuration.
+
+    Whatever a MemoryBackend held is forgotten with it.
+
+    """
+    _BACKENDS.clear()
+
+
+def is_enabled(namespace):
+    """Whether lookups of a namespace, e.g. ``identity``, are cached."""
+    return CONF.cache.enabled and getattr(CONF, namespace).caching
+
+
+def cache_time(namespace, method):
+    """Seconds the result of a cached method is kept.
+
+    ``[cache] method_cache_times`` entries such as ``identity.get_role:3600``
+    override the ``cache_time`` of the namespace's section.
+
+    """
+    name = '%s.%s' % (namespace, method)
+    for entry in CONF.cache.method_cache_times:
+        key, _sep, seconds = entry.rpartition(':')
+        if key.strip() == name:
+            return int(seconds)
+    return getattr(CONF, namespace).cache_time
+
+
+class CachedDriver(object):
+    """Wraps a driver, caching the results of the given methods.
+
+    Calls returning None and calls raising exceptions are not cached. Methods
+    that are neither cached nor writes are passed straight to the driver.
+
+    """
+
+    def __init__(self, driver, namespace, cached_methods):
+        self.driver = driver
+        self.namespace = namespace
+        self.cached_methods = frozenset(cached_methods)
+
+    def _key(self, generation, name, args, kwargs):
+        digest = hashlib.sha1(jsonutils.dumps([args, kwargs], sort_keys=True))
+        return '%s-%s-%s-%s' % (self.namespace,
+                                generation,
+                                name,
+                                digest.hexdigest())
+
+    def _read_through(self, name, f):
+        @functools.wraps(f)
+        def _wrapper(*args, **kwargs):
+            ttl = cache_time(self.namespace, name)
+            if ttl <= 0:
+                return f(*args, **kwargs)
+            backend = get_backend()
+            key = self._key(backend.get_generation(self.namespace),
+                            name,
+                            args,
+                            kwargs)
+            value = backend.get(key)
+            if value is None:
+                value = f(*args, **kwargs)
+                if value is not None:
+                    backend.set(key, value, ttl)
+            return value
+        return _wrapper
+
+    def _invalidating(self, f):
+        @functools.wraps(f)
+        def _wrapper(*args, **kwargs):
+            try:
+                return f(*args, **kwargs)
+            finally:
+                # even a failed write may have changed something
+                get_backend().bump_generation(self.namespace)
+        return _wrapper
+
+    def __getattr__(self, name):
+        f = getattr(self.driver, name)
+        if not callable(f):
+            return f
+        if name in self.cached_methods:
+            f = self._read_through(name, f)
+        elif name.startswith(WRITE_PREFIXES):
+            f = self._invalidating(f)
+        setattr(self, name, f)
+        return f
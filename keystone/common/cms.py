@@ -49,20 +49,13 @@ def cms_verify(formatted, signing_cert_file_name, ca_file_name):
 def token_to_cms(signed_text):
     copy_of_text = signed_text.replace('-', '/')
 
-    formatted = "-----BEGIN CMS-----\n"
     line_length = 64
-    while len(copy_of_text) > 0:
-        if (len(copy_of_text) > line_length):
-            formatted += copy_of_text[:line_length]
-            copy_of_text = copy_of_text[line_length:]
-        else:
-            formatted += copy_of_text
-            copy_of_text = ""
-        formatted += "\n"
-
-    formatted += "-----END CMS-----\n"
+    lines = ["-----BEGIN CMS-----"]
+    lines.extend(copy_of_text[i:i + line_length]
+                 for i in xrange(0, len(copy_of_text), line_length))
+    lines.append("-----END CMS-----\n")
 
-    return formatted
+    return "\n".join(lines)
 
 
 def verify_token(token, signing_cert_file_name, ca_file_name):
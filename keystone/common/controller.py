@@ -1,9 +1,11 @@
 import collections
 import functools
+import urllib
 import uuid
 
 from keystone.common import dependency
 from keystone.common import logging
+from keystone.common import utils
 from keystone.common import wsgi
 from keystone import config
 from keystone import exception
@@ -61,13 +63,17 @@ def _build_policy_check_credentials(self, action, context, kwargs):
             creds['project_id'] = token_ref['tenant'].get('id')
         except AttributeError:
             LOG.debug(_('RBAC: Proceeding without tenant'))
-        # NOTE(vish): this is pretty inefficient
-        creds['roles'] = [self.identity_api.get_role(context, role)['name']
-                          for role in creds.get('roles', [])]
+        creds['roles'] = [role_ref['name'] for role_ref in
+                          self.identity_api.get_roles_by_ids(
+                              context, creds.get('roles', []))]
 
     return creds
 
 
+def _query_bool(value):
+    return (value or '').lower() in ('1', 'true', 'yes', 'on')
+
+
 def flatten(d, parent_key=''):
     """Flatten a nested dictionary
 
@@ -214,39 +220,105 @@ class V3Controller(V2Controller):
         return {cls.member_name: ref}
 
     @classmethod
-    def wrap_collection(cls, context, refs, filters=[]):
-        for f in filters:
-            refs = cls.filter_by_attribute(context, refs, f)
+    def wrap_collection(cls, context, refs, filters=[], hints=None):
+        """Wraps one page of a list of references.
 
-        refs = cls.paginate(context, refs)
+        If the driver already filtered and paged the list, pass the ``hints``
+        it was given by :meth:`list_hints`; otherwise the list is filtered
+        and paged here.
+
+        """
+        if hints is None:
+            hints = cls.list_hints(context, filters)
+            refs = utils.page_refs(refs, **hints)
 
+        refs, links = cls._page_links(context, refs, hints)
         for ref in refs:
             cls.wrap_member(context, ref)
 
         container = {cls.collection_name: refs}
-        container['links'] = {
-            'next': None,
-            'self': cls.base_url(path=context['path']),
-            'previous': None}
+        container['links'] = links
         return container
 
     @classmethod
-    def paginate(cls, context, refs):
-        """Paginates a list of references by page & per_page query strings."""
-        # FIXME(dolph): client needs to support pagination first
-        return refs
+    def list_hints(cls, context, filters=[]):
+        """Returns the filters and page asked for by the query string.
 
-        page = context['query_string'].get('page', 1)
-        per_page = context['query_string'].get('per_page', 30)
-        return refs[per_page * (page - 1):per_page * page]
+        The result is meant as keyword arguments of the list_* driver
+        methods. One reference more than the page holds is asked for, which
+        tells :meth:`wrap_collection` whether the list goes on.
+
+        """
+        query = context['query_string']
+        hints = {'filters': dict((f, cls._filter_value(f, query[f]))
+                                 for f in filters if f in query)}
+        limit = cls._page_size(context)
+        if limit is not None:
+            hints['limit'] = limit + 1
+        if query.get('marker'):
+            hints['marker'] = query['marker']
+        if _query_bool(query.get('page_reverse')):
+            hints['page_reverse'] = True
+        return hints
 
     @classmethod
-    def filter_by_attribute(cls, context, refs, attr):
-        """Filters a list of references by query string value."""
-        if attr in context['query_string']:
-            value = context['query_string'][attr]
-            return [r for r in refs if r[attr] == value]
-        return refs
+    def _filter_value(cls, attr, value):
+        if attr == 'enabled':
+            return _query_bool(value)
+        return value
+
+    @classmethod
+    def _page_size(cls, context):
+        """Returns the requested page size, capped at max_page_size."""
+        limit = context['query_string'].get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                msg = 'limit must be a positive integer'
+                raise exception.ValidationError(message=msg)
+        if CONF.max_page_size and (limit is None or
+                                   limit > CONF.max_page_size):
+            limit = CONF.max_page_size
+        return limit
+
+    @classmethod
+    def _page_url(cls, context, **params):
+        query = dict(context['query_string'])
+        query.pop('page_reverse', None)
+        query.update(params)
+        query = [(k, unicode(v).encode('utf-8'))
+                 for k, v in sorted(query.iteritems())]
+        return '%s?%s' % (cls.base_url(path=context['path']),
+                          urllib.urlencode(query))
+
+    @classmethod
+    def _page_links(cls, context, refs, hints):
+        """Trims the look-ahead reference and links the adjacent pages."""
+        limit = hints.get('limit')
+        marker = hints.get('marker')
+        page_reverse = hints.get('page_reverse', False)
+
+        more = limit is not None and len(refs) >= limit
+        if more:
+            refs = refs[1:] if page_reverse else refs[:-1]
+        if page_reverse:
+            has_next, has_previous = marker is not None, more
+        else:
+            has_next, has_previous = more, marker is not None
+
+        links = {'next': None,
+                 'self': cls.base_url(path=context['path']),
+                 'previous': None}
+        if refs and has_next:
+            links['next'] = cls._page_url(context, marker=refs[-1]['id'])
+        if refs and has_previous:
+            links['previous'] = cls._page_url(context,
+                                              marker=refs[0]['id'],
+                                              page_reverse='true')
+        return refs, links
 
     def _require_matching_id(self, value, ref):
         """Ensures the value matches the reference's ID, if any."""
@@ -14,11 +14,16 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import Queue
+import threading
+import time
+
 import ldap
 from ldap import filter as ldap_filter
 
 from keystone.common.ldap import fakeldap
 from keystone.common import logging
+from keystone.common import utils
 from keystone import exception
 
 
@@ -87,6 +92,8 @@ class BaseLdap(object):
     tree_dn = None
 
     def __init__(self, conf):
+        self.conf = conf
+        self.use_pool = conf.ldap.use_pool
         self.LDAP_URL = conf.ldap.url
         self.LDAP_USER = conf.ldap.user
         self.LDAP_PASSWORD = conf.ldap.password
@@ -131,6 +138,22 @@ class BaseLdap(object):
         self.subtree_delete_enabled = getattr(conf.ldap,
                                               'allow_subtree_delete')
 
+    @property
+    def entry_cache(self):
+        # subclasses finish their attribute mapping after __init__ here
+        if not hasattr(self, '_entry_cache'):
+            if self.options_name is None:
+                self._entry_cache = None
+            else:
+                self._entry_cache = get_entry_cache(
+                    self.conf,
+                    (self.options_name,
+                     self.tree_dn,
+                     self.object_class,
+                     self.filter,
+                     tuple(sorted(self.attribute_mapping.values()))))
+        return self._entry_cache
+
     def _not_found(self, object_id):
         if self.NotFound is None:
             return exception.NotFound(target=object_id)
@@ -138,11 +161,11 @@ class BaseLdap(object):
             return self.NotFound(**{self.notfound_arg: object_id})
 
     def get_connection(self, user=None, password=None):
-        if self.LDAP_URL.startswith('fake://'):
-            conn = fakeldap.FakeLdap(self.LDAP_URL)
-        else:
-            conn = LdapWrapper(self.LDAP_URL,
-                               self.page_size)
+        # only the connections bound as the configured user are shared
+        if self.use_pool and user is None and password is None:
+            return get_pool(self.conf)
+
+        conn = connect(self.LDAP_URL, self.page_size)
 
         if user is None:
             user = self.LDAP_USER
@@ -165,6 +188,10 @@ class BaseLdap(object):
     def _id_to_dn(self, id):
         if self.LDAP_SCOPE == ldap.SCOPE_ONELEVEL:
             return self._id_to_dn_string(id)
+        if self.entry_cache is not None:
+            dn = self.entry_cache.get_dn(id)
+            if dn is not None:
+                return dn
         conn = self.get_connection()
         search_result = conn.search_s(
             self.tree_dn, self.LDAP_SCOPE,
@@ -174,10 +201,17 @@ class BaseLdap(object):
              'objclass': self.object_class})
         if search_result:
             dn, attrs = search_result[0]
+            if self.entry_cache is not None:
+                self.entry_cache.set_dn(id, dn)
             return dn
         else:
             return self._id_to_dn_string(id)
 
+    def _forget(self, id):
+        """Drops what is cached about an entry this process is changing."""
+        if self.entry_cache is not None:
+            self.entry_cache.forget(id)
+
     @staticmethod
     def _dn_to_id(dn):
         return ldap.dn.str2dn(dn)[0][0][1]
@@ -240,9 +274,17 @@ class BaseLdap(object):
             attrs.append(('member', [self.dumb_member]))
 
         conn.add_s(self._id_to_dn(values['id']), attrs)
+        self._forget(values['id'])
         return values
 
     def _ldap_get(self, id, filter=None):
+        # entries found with a filter of the caller's are not cached
+        cache = self.entry_cache if filter is None else None
+        if cache is not None:
+            res = cache.get_entry(id)
+            if res is not None:
+                return res
+
         conn = self.get_connection()
         query = ('(&(%(id_attr)s=%(id)s)'
                  '%(filter)s'
@@ -256,22 +298,71 @@ class BaseLdap(object):
                                 self.attribute_mapping.values())
         except ldap.NO_SUCH_OBJECT:
             return None
-        try:
-            return res[0]
-        except IndexError:
+        if not res:
             return None
-
-    def _ldap_get_all(self, filter=None):
+        if cache is not None:
+            cache.set_entry(id, res[0])
+        return res[0]
+
+    def _ldap_get_by_ids(self, ids, filter=None):
+        """Returns the entries with the given ids, keyed by id.
+
+        Entries not cached are found with searches for ``[ldap]
+        ids_per_search`` ids at a time, all sent over one connection.
+
+        """
+        cache = self.entry_cache if filter is None else None
+        entries = {}
+        missing = set()
+        for object_id in ids:
+            res = cache.get_entry(object_id) if cache is not None else None
+            if res is None:
+                missing.add(object_id)
+            else:
+                entries[object_id] = res
+        if missing:
+            # bounded filters keep each search, and its response, small
+            missing = sorted(missing)
+            chunk_size = max(self.conf.ldap.ids_per_search, 1)
+            queries = []
+            for i in range(0, len(missing), chunk_size):
+                id_filter = ''.join('(%s=%s)' % (
+                    self.id_attr, ldap.filter.escape_filter_chars(str(x)))
+                    for x in missing[i:i + chunk_size])
+                queries.append('(&%s(|%s)(objectClass=%s))' % (
+                    filter or self.filter or '',
+                    id_filter,
+                    self.object_class))
+            conn = self.get_connection()
+            try:
+                found = conn.search_many(self.tree_dn,
+                                         self.LDAP_SCOPE,
+                                         queries,
+                                         self.attribute_mapping.values())
+            except ldap.NO_SUCH_OBJECT:
+                found = []
+            for res in found:
+                object_id = self._dn_to_id(res[0])
+                entries[object_id] = res
+                if cache is not None:
+                    cache.set_entry(object_id, res)
+        return entries
+
+    def _ldap_iter_all(self, filter=None):
         conn = self.get_connection()
         query = '(&%s(objectClass=%s))' % (filter or self.filter or '',
                                            self.object_class)
         try:
-            return conn.search_s(self.tree_dn,
-                                 self.LDAP_SCOPE,
-                                 query,
-                                 self.attribute_mapping.values())
+            for res in conn.search_iter(self.tree_dn,
+                                        self.LDAP_SCOPE,
+                                        query,
+                                        self.attribute_mapping.values()):
+                yield res
         except ldap.NO_SUCH_OBJECT:
-            return []
+            return
+
+    def _ldap_get_all(self, filter=None):
+        return list(self._ldap_iter_all(filter))
 
     def get(self, id, filter=None):
         res = self._ldap_get(id, filter)
@@ -289,9 +380,57 @@ class BaseLdap(object):
         except IndexError:
             raise self._not_found(name)
 
+    def iter_all(self, filter=None):
+        """Yields the objects found as the directory returns them.
+
+        The next object is only read once the caller asks for it, so no more
+        than a page of results is held at a time.
+
+        """
+        for x in self._ldap_iter_all(filter):
+            yield self._ldap_res_to_model(x)
+
     def get_all(self, filter=None):
-        return [self._ldap_res_to_model(x)
-                for x in self._ldap_get_all(filter)]
+        return list(self.iter_all(filter))
+
+    def get_page(self, filters=None, marker=None, limit=None,
+                 page_reverse=False):
+        """Returns one page of the objects matching filters.
+
+        String filters on mapped attributes become part of the search; the
+        results are then checked and paged as described by
+        :func:`keystone.common.utils.page_refs`.
+
+        """
+        terms = ''.join(
+            '(%s=%s)' % (self.attribute_mapping[k],
+                         ldap_filter.escape_filter_chars(v))
+            for k, v in sorted((filters or {}).iteritems())
+            if (k in self.attribute_mapping and
+                k not in self.attribute_ignore and
+                k not in ('enabled', 'password') and
+                isinstance(v, basestring)))
+        query = '(&%s%s)' % (self.filter or '', terms) if terms else None
+        return utils.page_refs(self.iter_all(query),
+                               filters,
+                               marker,
+                               limit,
+                               page_reverse)
+
+    def get_by_ids(self, ids, filter=None):
+        """Returns the objects with the given ids, found in bulk.
+
+        :raises: the NotFound of this class for the first missing id
+
+        """
+        ids = list(ids)
+        refs = dict((object_id, self._ldap_res_to_model(res))
+                    for object_id, res
+                    in self._ldap_get_by_ids(set(ids), filter).iteritems())
+        for object_id in ids:
+            if object_id not in refs:
+                raise self._not_found(object_id)
+        return [refs[object_id] for object_id in ids]
 
     def update(self, id, values, old_obj=None):
         if not self.allow_update:
@@ -323,6 +462,8 @@ class BaseLdap(object):
                 conn.modify_s(self._id_to_dn(id), modlist)
             except ldap.NO_SUCH_OBJECT:
                 raise self._not_found(id)
+            finally:
+                self._forget(id)
 
     def delete(self, id):
         if not self.allow_delete:
@@ -334,6 +475,8 @@ class BaseLdap(object):
             conn.delete_s(self._id_to_dn(id))
         except ldap.NO_SUCH_OBJECT:
             raise self._not_found(id)
+        finally:
+            self._forget(id)
 
     def deleteTree(self, id):
         conn = self.get_connection()
@@ -345,6 +488,8 @@ class BaseLdap(object):
                               serverctrls=[tree_delete_control])
         except ldap.NO_SUCH_OBJECT:
             raise self._not_found(id)
+        finally:
+            self._forget(id)
 
 
 class LdapWrapper(object):
@@ -369,6 +514,16 @@ class LdapWrapper(object):
         return self.conn.add_s(dn, ldap_attrs)
 
     def search_s(self, dn, scope, query, attrlist=None):
+        return list(self.search_iter(dn, scope, query, attrlist))
+
+    def search_iter(self, dn, scope, query, attrlist=None):
+        """Yields the entries found, each converted as it is reached.
+
+        With paging a page is read at a time, otherwise an entry at a time,
+        so a large result is never held in full. A search left before its
+        end is abandoned.
+
+        """
         if LOG.isEnabledFor(logging.DEBUG):
             LOG.debug(_('LDAP search: dn=%s, scope=%s, query=%s, attrs=%s'),
                       dn,
@@ -376,10 +531,62 @@ class LdapWrapper(object):
                       query,
                       attrlist)
         if self.page_size:
-            res = self.paged_search_s(dn, scope, query, attrlist)
+            pages = self._paged_search(dn, scope, query, attrlist)
         else:
-            res = self.conn.search_s(dn, scope, query, attrlist)
+            pages = self._async_search(dn, scope, query, attrlist)
+        for page in pages:
+            for res in self._results_to_py(page):
+                yield res
+
+    def _async_search(self, dn, scope, query, attrlist=None):
+        msgid = self.conn.search(dn, scope, query, attrlist)
+        done = False
+        try:
+            while not done:
+                # one entry at a time
+                rtype, rdata = self.conn.result(msgid, 0)
+                done = rtype == ldap.RES_SEARCH_RESULT
+                yield rdata
+        finally:
+            if not done:
+                self.conn.abandon(msgid)
+
+    def search_many(self, dn, scope, queries, attrlist=None):
+        """Runs several searches, sent together over this connection.
+
+        All the searches are sent before waiting for the first results, so
+        they cost a single round trip; their results are returned together.
+
+        """
+        if self.page_size:
+            res = []
+            for query in queries:
+                res.extend(self.search_s(dn, scope, query, attrlist))
+            return res
+
+        msgids = []
+        for query in queries:
+            if LOG.isEnabledFor(logging.DEBUG):
+                LOG.debug(_('LDAP search: dn=%s, scope=%s, query=%s, '
+                            'attrs=%s'),
+                          dn,
+                          scope,
+                          query,
+                          attrlist)
+            msgids.append(self.conn.search(dn, scope, query, attrlist))
 
+        res = []
+        try:
+            while msgids:
+                rtype, rdata = self.conn.result(msgids.pop(0))
+                res.extend(rdata)
+        finally:
+            # don't leave the server answering searches nobody reads
+            for msgid in msgids:
+                self.conn.abandon(msgid)
+        return self._results_to_py(res)
+
+    def _results_to_py(self, res):
         o = []
         for dn, attrs in res:
             o.append((dn, dict((kind, [ldap2py(x) for x in values])
@@ -388,6 +595,11 @@ class LdapWrapper(object):
 
     def paged_search_s(self, dn, scope, query, attrlist=None):
         res = []
+        for page in self._paged_search(dn, scope, query, attrlist):
+            res.extend(page)
+        return res
+
+    def _paged_search(self, dn, scope, query, attrlist=None):
         lc = ldap.controls.SimplePagedResultsControl(
             controlType=ldap.LDAP_CONTROL_PAGE_OID,
             criticality=True,
@@ -402,7 +614,7 @@ class LdapWrapper(object):
             # Request to the ldap server a page with 'page_size' entries
             rtype, rdata, rmsgid, serverctrls = self.conn.result3(msgid)
             # Receive the data
-            res.extend(rdata)
+            yield rdata
             pctrls = [c for c in serverctrls
                       if c.controlType == ldap.LDAP_CONTROL_PAGE_OID]
             if pctrls:
@@ -426,7 +638,6 @@ class LdapWrapper(object):
                               'avoid this message'))
                 self._disable_paging()
                 break
-        return res
 
     def modify_s(self, dn, modlist):
         ldap_modlist = [
@@ -455,6 +666,278 @@ class LdapWrapper(object):
         self.page_size = 0
 
 
+def connect(url, page_size):
+    """Open an unbound connection to the directory at url."""
+    if url.startswith('fake://'):
+        return fakeldap.FakeLdap(url)
+    return LdapWrapper(url, page_size)
+
+
+class ConnectionPool(object):
+    """Spreads LDAP operations over at most ``size`` bound connections.
+
+    Every operation of a connection is available and runs on a connection
+    checked out for the duration of the call, so one pool is shared by all
+    the ``*Api`` objects and by any number of threads or green threads.
+    When every connection is busy, callers wait up to ``checkout_timeout``
+    seconds before giving up.
+
+    A connection is replaced once it is ``lifetime`` seconds old. One that
+    fails with SERVER_DOWN is dropped and the operation is retried on a new
+    connection, up to ``retry_max`` times ``retry_delay`` seconds apart, so
+    a directory server restart or a load balancer dropping idle connections
+    is not seen by callers.
+
+    """
+
+    def __init__(self, url, user=None, password=None, page_size=0, size=10,
+                 checkout_timeout=10, lifetime=600, retry_max=3,
+                 retry_delay=0.1):
+        self.url = url
+        self.user = user
+        self.password = password
+        self.page_size = page_size
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.lifetime = lifetime
+        self.retry_max = retry_max
+        self.retry_delay = retry_delay
+        # (connection, time it was opened)
+        self._idle = Queue.Queue()
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def _create(self):
+        conn = connect(self.url, self.page_size)
+        # not all LDAP servers require authentication, so we don't bind
+        # if we don't have any user/pass
+        if self.user and self.password:
+            conn.simple_bind_s(self.user, self.password)
+        return conn, time.time()
+
+    def _close(self, conn):
+        try:
+            conn.unbind_s()
+        except ldap.LDAPError:
+            pass
+
+    def _checkout(self):
+        try:
+            item = self._idle.get_nowait()
+        except Queue.Empty:
+            item = None
+
+        if item is None:
+            with self._lock:
+                create = self._count < self.size
+                if create:
+                    self._count += 1
+            if not create:
+                try:
+                    item = self._idle.get(timeout=self.checkout_timeout)
+                except Queue.Empty:
+                    raise exception.UnexpectedError(
+                        _('Timed out waiting for an LDAP connection'))
+
+        if item is not None:
+            conn, opened = item
+            if time.time() - opened < self.lifetime:
+                return item
+            self._close(conn)
+
+        try:
+            return self._create()
+        except BaseException:
+            with self._lock:
+                self._count -= 1
+            raise
+
+    def _discard(self, conn):
+        self._close(conn)
+        with self._lock:
+            self._count -= 1
+
+    def _wait_to_retry(self, retries):
+        """Waits before retry number ``retries``, unless they are used up."""
+        if retries > self.retry_max:
+            return False
+        LOG.warning(_('LDAP server %(url)s is down, retrying '
+                      '(%(retries)s of %(retry_max)s)'),
+                    {'url': self.url,
+                     'retries': retries,
+                     'retry_max': self.retry_max})
+        time.sleep(self.retry_delay)
+        return True
+
+    def _call(self, name, *args, **kwargs):
+        retries = 0
+        while True:
+            conn = None
+            try:
+                conn, opened = self._checkout()
+                result = getattr(conn, name)(*args, **kwargs)
+            except ldap.SERVER_DOWN:
+                # either the bind of a new connection or the call failed
+                if conn is not None:
+                    self._discard(conn)
+                retries += 1
+                if not self._wait_to_retry(retries):
+                    raise
+                continue
+            except BaseException:
+                # including a GreenletExit or an outer timeout, which would
+                # otherwise keep the connection from the pool for good
+                if conn is not None:
+                    self._idle.put((conn, opened))
+                raise
+            self._idle.put((conn, opened))
+            return result
+
+    def search_iter(self, dn, scope, query, attrlist=None):
+        """Yields what a search finds, over one connection until it ends.
+
+        The search is only retried when the server goes down before the
+        first entry is returned.
+
+        """
+        retries = 0
+        while True:
+            conn = None
+            started = False
+            try:
+                conn, opened = self._checkout()
+                for res in conn.search_iter(dn, scope, query, attrlist):
+                    started = True
+                    yield res
+            except ldap.SERVER_DOWN:
+                if conn is not None:
+                    self._discard(conn)
+                retries += 1
+                if started or not self._wait_to_retry(retries):
+                    raise
+                continue
+            except BaseException:
+                # including the GeneratorExit of a search left early
+                if conn is not None:
+                    self._idle.put((conn, opened))
+                raise
+            self._idle.put((conn, opened))
+            return
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def _call(*args, **kwargs):
+            return self._call(name, *args, **kwargs)
+        return _call
+
+    def stats(self):
+        """Returns how busy the pool is."""
+        idle = self._idle.qsize()
+        return {'size': self.size,
+                'connections': self._count,
+                'idle': idle,
+                'in_use': self._count - idle}
+
+
+_POOLS = {}
+
+
+def get_pool(conf):
+    """Returns the pool of connections bound as the ``[ldap] user``."""
+    key = (conf.ldap.url, conf.ldap.user, conf.ldap.password,
+           conf.ldap.page_size)
+    if key not in _POOLS:
+        _POOLS[key] = ConnectionPool(
+            conf.ldap.url,
+            user=conf.ldap.user,
+            password=conf.ldap.password,
+            page_size=conf.ldap.page_size,
+            size=conf.ldap.pool_size,
+            checkout_timeout=conf.ldap.pool_checkout_timeout,
+            lifetime=conf.ldap.pool_connection_lifetime,
+            retry_max=conf.ldap.pool_retry_max,
+            retry_delay=conf.ldap.pool_retry_delay)
+    return _POOLS[key]
+
+
+class EntryCache(object):
+    """Remembers the DNs and entries of one kind of object.
+
+    Ids map to DNs, which saves the search finding the DN of an id when
+    objects may live anywhere under their tree, DNs map to the entries
+    found there and group DNs to the members of the group. All are bounded
+    by ``maxsize`` and forgotten after ``ttl`` seconds; an object changed
+    through this process is forgotten straight away, while changes made
+    elsewhere go unnoticed until then.
+
+    """
+
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.dns = utils.LRUCache(maxsize, ttl)
+        self.entries = utils.LRUCache(maxsize, ttl)
+        # members of groups such as the enabled emulation group
+        self.members = utils.LRUCache(maxsize, ttl)
+
+    def get_dn(self, object_id):
+        return self.dns.get(object_id)
+
+    def set_dn(self, object_id, dn):
+        self.dns.set(object_id, dn)
+
+    def get_entry(self, object_id):
+        dn = self.dns.get(object_id)
+        if dn is None:
+            return None
+        return self.entries.get(dn)
+
+    def set_entry(self, object_id, res):
+        self.dns.set(object_id, res[0])
+        self.entries.set(res[0], res)
+
+    def forget(self, object_id):
+        dn = self.dns.get(object_id, count=False)
+        self.dns.delete(object_id)
+        if dn is not None:
+            self.entries.delete(dn)
+
+    def get_members(self, group_dn):
+        return self.members.get(group_dn)
+
+    def set_members(self, group_dn, members):
+        self.members.set(group_dn, members)
+
+    def forget_members(self, group_dn):
+        self.members.delete(group_dn)
+
+    def clear(self):
+        self.dns.clear()
+        self.entries.clear()
+        self.members.clear()
+
+
+_CACHES = {}
+
+
+def get_entry_cache(conf, search):
+    """Returns the cache shared by every API searching for the same entries.
+
+    :param search: tuple of whatever decides which entries and attributes
+                   the API's searches return
+    :returns: None unless ``[ldap] cache_time`` is set
+
+    """
+    ttl = conf.ldap.cache_time
+    if ttl <= 0:
+        return None
+    key = (conf.ldap.url, search, ttl, conf.ldap.cache_size)
+    if key not in _CACHES:
+        _CACHES[key] = EntryCache(ttl, conf.ldap.cache_size)
+    return _CACHES[key]
+
+
 class EnabledEmuMixIn(BaseLdap):
     """Emulates boolean 'enabled' attribute if turned on.
 
@@ -482,7 +965,39 @@ class EnabledEmuMixIn(BaseLdap):
             self.enabled_emulation_dn = ('cn=enabled_%ss,%s' %
                                          (self.options_name, self.tree_dn))
 
+    def _get_enabled_ids(self):
+        """Returns the ids of every enabled object, found in one search.
+
+        The ids are lowercased, as the directory matches the member DNs
+        without regard to case.
+
+        """
+        cache = self.entry_cache
+        if cache is not None:
+            enabled_ids = cache.get_members(self.enabled_emulation_dn)
+            if enabled_ids is not None:
+                return enabled_ids
+
+        conn = self.get_connection()
+        try:
+            res = conn.search_s(self.enabled_emulation_dn,
+                                ldap.SCOPE_BASE,
+                                '(objectClass=*)',
+                                ['member'])
+        except ldap.NO_SUCH_OBJECT:
+            res = []
+        enabled_ids = frozenset(self._dn_to_id(dn).lower()
+                                for _dn, attrs in res
+                                for dn in attrs.get('member', [])
+                                if dn != self.dumb_member)
+        if cache is not None:
+            cache.set_members(self.enabled_emulation_dn, enabled_ids)
+        return enabled_ids
+
     def _get_enabled(self, object_id):
+        if self.entry_cache is not None:
+            return object_id.lower() in self._get_enabled_ids()
+
         conn = self.get_connection()
         dn = self._id_to_dn(object_id)
         query = '(member=%s)' % dn
@@ -495,6 +1010,10 @@ class EnabledEmuMixIn(BaseLdap):
         else:
             return bool(enabled_value)
 
+    def _forget_enabled(self):
+        if self.entry_cache is not None:
+            self.entry_cache.forget_members(self.enabled_emulation_dn)
+
     def _add_enabled(self, object_id):
         conn = self.get_connection()
         modlist = [(ldap.MOD_ADD,
@@ -509,6 +1028,8 @@ class EnabledEmuMixIn(BaseLdap):
             if self.use_dumb_member:
                 attr_list[1][1].append(self.dumb_member)
             conn.add_s(self.enabled_emulation_dn, attr_list)
+        finally:
+            self._forget_enabled()
 
     def _remove_enabled(self, object_id):
         conn = self.get_connection()
@@ -519,6 +1040,8 @@ class EnabledEmuMixIn(BaseLdap):
             conn.modify_s(self.enabled_emulation_dn, modlist)
         except (ldap.NO_SUCH_OBJECT, ldap.NO_SUCH_ATTRIBUTE):
             pass
+        finally:
+            self._forget_enabled()
 
     def create(self, values):
         if self.enabled_emulation:
@@ -538,17 +1061,29 @@ class EnabledEmuMixIn(BaseLdap):
             ref['enabled'] = self._get_enabled(object_id)
         return ref
 
-    def get_all(self, filter=None):
+    def get_by_ids(self, ids, filter=None):
+        refs = super(EnabledEmuMixIn, self).get_by_ids(ids, filter)
+        if 'enabled' not in self.attribute_ignore and self.enabled_emulation:
+            enabled_ids = self._get_enabled_ids()
+            for ref in refs:
+                ref['enabled'] = ref['id'].lower() in enabled_ids
+        return refs
+
+    def iter_all(self, filter=None):
         if 'enabled' not in self.attribute_ignore and self.enabled_emulation:
-            # had to copy BaseLdap.get_all here to filter by DN
-            tenant_list = [self._ldap_res_to_model(x)
-                           for x in self._ldap_get_all(filter)
-                           if x[0] != self.enabled_emulation_dn]
-            for tenant_ref in tenant_list:
-                tenant_ref['enabled'] = self._get_enabled(tenant_ref['id'])
-            return tenant_list
+            # the enabled objects are found before the search starts, so
+            # nothing else is asked of the directory while it streams
+            enabled_ids = self._get_enabled_ids()
+            # had to copy BaseLdap.iter_all here to filter by DN
+            for x in self._ldap_iter_all(filter):
+                if x[0] == self.enabled_emulation_dn:
+                    continue
+                ref = self._ldap_res_to_model(x)
+                ref['enabled'] = ref['id'].lower() in enabled_ids
+                yield ref
         else:
-            return super(EnabledEmuMixIn, self).get_all(filter)
+            for ref in super(EnabledEmuMixIn, self).iter_all(filter):
+                yield ref
 
     def update(self, object_id, values, old_obj=None):
         if 'enabled' not in self.attribute_ignore and self.enabled_emulation:
@@ -56,7 +56,10 @@ def _match_query(query, attrs):
     if inner.startswith(('&', '|')):
         # cut off the & or |
         groups = _paren_groups(inner[1:])
-        return all(_match_query(group, attrs) for group in groups)
+        matches = (_match_query(group, attrs) for group in groups)
+        if inner.startswith('&'):
+            return all(matches)
+        return any(matches)
     if inner.startswith('!'):
         # cut off the ! and the nested parentheses
         return not _match_query(query[2:-1], attrs)
@@ -330,3 +333,15 @@ class FakeLdap(object):
 
         LOG.debug('FakeLdap search result: %s', objects)
         return objects
+
+    def search_iter(self, dn, scope, query=None, fields=None):
+        """Yield the objects search_s would return."""
+        for res in self.search_s(dn, scope, query, fields):
+            yield res
+
+    def search_many(self, dn, scope, queries, fields=None):
+        """Run several searches, returning all of their results."""
+        objects = []
+        for query in queries:
+            objects.extend(self.search_s(dn, scope, query, fields))
+        return objects
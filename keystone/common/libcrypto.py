@@ -0,0 +1,292 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Minimal ctypes bindings to the CMS routines of OpenSSL's libcrypto.
+
+These let keystone produce the same CMS documents as the ``openssl cms``
+command line tool without forking a process for every document.
+
+"""
+
+import ctypes
+import ctypes.util
+
+from keystone.common import logging
+
+
+LOG = logging.getLogger(__name__)
+
+# flags from openssl/cms.h
+CMS_NOCERTS = 0x2
+CMS_NOATTR = 0x100
+CMS_NOSMIMECAP = 0x200
+
+# ``openssl cms -sign -nodetach -nocerts -noattr -nosmimecap``
+SIGN_FLAGS = CMS_NOCERTS | CMS_NOATTR | CMS_NOSMIMECAP
+
+# from openssl/bio.h
+_BIO_CTRL_INFO = 3
+
+_libcrypto = None
+
+
+class Error(Exception):
+    """Raised when a libcrypto call fails or libcrypto is unavailable."""
+    pass
+
+
+def _prototype(lib, name, restype, *argtypes):
+    func = getattr(lib, name)
+    func.restype = restype
+    func.argtypes = list(argtypes)
+
+
+def _load():
+    global _libcrypto
+    if _libcrypto is not None:
+        return _libcrypto
+
+    path = ctypes.util.find_library('crypto')
+    if not path:
+        raise Error(_('Unable to locate libcrypto'))
+    try:
+        lib = ctypes.CDLL(path)
+        p = ctypes.c_void_p
+        _prototype(lib, 'BIO_s_mem', p)
+        _prototype(lib, 'BIO_new', p, p)
+        _prototype(lib, 'BIO_new_mem_buf', p, ctypes.c_char_p,
+                   ctypes.c_int)
+        _prototype(lib, 'BIO_ctrl', ctypes.c_long, p, ctypes.c_int,
+                   ctypes.c_long, p)
+        _prototype(lib, 'BIO_free', ctypes.c_int, p)
+        _prototype(lib, 'PEM_read_bio_X509', p, p, p, p, p)
+        _prototype(lib, 'PEM_read_bio_PrivateKey', p, p, p, p, p)
+        _prototype(lib, 'X509_free', None, p)
+        _prototype(lib, 'EVP_PKEY_free', None, p)
+        _prototype(lib, 'CMS_sign', p, p, p, p, p, ctypes.c_uint)
+        _prototype(lib, 'PEM_write_bio_CMS', ctypes.c_int, p, p)
+        _prototype(lib, 'CMS_ContentInfo_free', None, p)
+        _prototype(lib, 'PEM_read_bio_CMS', p, p, p, p, p)
+        _prototype(lib, 'CMS_verify', ctypes.c_int, p, p, p, p, p,
+                   ctypes.c_uint)
+        _prototype(lib, 'X509_STORE_new', p)
+        _prototype(lib, 'X509_STORE_free', None, p)
+        _prototype(lib, 'X509_STORE_load_locations', ctypes.c_int, p,
+                   ctypes.c_char_p, ctypes.c_char_p)
+        # OpenSSL 1.1 renamed the generic stack functions
+        for name in ('new_null', 'push', 'free'):
+            try:
+                func = getattr(lib, 'OPENSSL_sk_' + name)
+            except AttributeError:
+                func = getattr(lib, 'sk_' + name)
+            setattr(lib, 'stack_' + name, func)
+        _prototype(lib, 'stack_new_null', p)
+        _prototype(lib, 'stack_push', ctypes.c_int, p, p)
+        _prototype(lib, 'stack_free', None, p)
+        _prototype(lib, 'ERR_clear_error', None)
+        _prototype(lib, 'ERR_get_error', ctypes.c_ulong)
+        _prototype(lib, 'ERR_error_string_n', None, ctypes.c_ulong,
+                   ctypes.c_char_p, ctypes.c_size_t)
+    except (OSError, AttributeError) as e:
+        raise Error(_('Unable to load libcrypto: %s') % e)
+
+    LOG.debug(_('Loaded CMS support from %s'), path)
+    _libcrypto = lib
+    return lib
+
+
+def is_available():
+    try:
+        _load()
+    except Error:
+        return False
+    return True
+
+
+def _raise_error(message):
+    lib = _load()
+    errors = []
+    code = lib.ERR_get_error()
+    while code:
+        buf = ctypes.create_string_buffer(256)
+        lib.ERR_error_string_n(code, buf, len(buf))
+        errors.append(buf.value)
+        code = lib.ERR_get_error()
+    if errors:
+        message = '%s: %s' % (message, '; '.join(errors))
+    lib.ERR_clear_error()
+    raise Error(message)
+
+
+def _mem_bio(data=None):
+    lib = _load()
+    if data is None:
+        bio = lib.BIO_new(lib.BIO_s_mem())
+    else:
+        bio = lib.BIO_new_mem_buf(data, len(data))
+    if not bio:
+        _raise_error(_('Unable to allocate BIO'))
+    return bio
+
+
+def _read_bio(bio):
+    lib = _load()
+    buf = ctypes.c_void_p()
+    length = lib.BIO_ctrl(bio, _BIO_CTRL_INFO, 0, ctypes.byref(buf))
+    return ctypes.string_at(buf, length)
+
+
+class _Handle(object):
+    """Owns a pointer to a libcrypto object and frees it when collected."""
+
+    _free = None
+
+    def __init__(self, ptr):
+        self.ptr = ptr
+
+    def __del__(self):
+        if self.ptr and _libcrypto is not None:
+            getattr(_libcrypto, self._free)(self.ptr)
+            self.ptr = None
+
+
+class Certificate(_Handle):
+    _free = 'X509_free'
+
+
+class PrivateKey(_Handle):
+    _free = 'EVP_PKEY_free'
+
+
+class CertificateStore(_Handle):
+    _free = 'X509_STORE_free'
+
+
+def _read_pem(reader, pem, handle_cls, what):
+    lib = _load()
+    bio = _mem_bio(pem)
+    try:
+        ptr = getattr(lib, reader)(bio, None, None, None)
+    finally:
+        lib.BIO_free(bio)
+    if not ptr:
+        _raise_error(_('Unable to load %s') % what)
+    return handle_cls(ptr)
+
+
+def load_certificate(pem):
+    """Parse a PEM encoded X509 certificate."""
+    return _read_pem('PEM_read_bio_X509', pem, Certificate, 'certificate')
+
+
+def load_certificates(pem):
+    """Parse every PEM encoded X509 certificate in a bundle."""
+    lib = _load()
+    bio = _mem_bio(pem)
+    certificates = []
+    try:
+        while True:
+            ptr = lib.PEM_read_bio_X509(bio, None, None, None)
+            if not ptr:
+                break
+            certificates.append(Certificate(ptr))
+    finally:
+        lib.BIO_free(bio)
+    # reading past the last certificate leaves a "no start line" error
+    lib.ERR_clear_error()
+    if not certificates:
+        _raise_error(_('Unable to load certificate'))
+    return certificates
+
+
+def load_certificate_store(ca_file_name):
+    """Build a trust store from a file of PEM encoded CA certificates."""
+    lib = _load()
+    ptr = lib.X509_STORE_new()
+    if not ptr:
+        _raise_error(_('Unable to allocate certificate store'))
+    store = CertificateStore(ptr)
+    if not lib.X509_STORE_load_locations(ptr, ca_file_name, None):
+        _raise_error(_('Unable to load CA certificates'))
+    return store
+
+
+def load_private_key(pem):
+    """Parse an unencrypted PEM encoded private key."""
+    return _read_pem('PEM_read_bio_PrivateKey', pem, PrivateKey,
+                     'private key')
+
+
+def cms_sign(text, certificate, private_key, flags=SIGN_FLAGS):
+    """Sign text, returning a PEM encoded CMS document.
+
+    With the default flags the output is byte for byte what
+    ``openssl cms -sign -outform PEM -nosmimecap -nodetach -nocerts
+    -noattr`` writes for the same input.
+
+    """
+    lib = _load()
+    data = _mem_bio(text)
+    out = None
+    cms = None
+    try:
+        cms = lib.CMS_sign(certificate.ptr, private_key.ptr, None, data,
+                           flags)
+        if not cms:
+            _raise_error(_('Unable to sign'))
+        out = _mem_bio()
+        if not lib.PEM_write_bio_CMS(out, cms):
+            _raise_error(_('Unable to encode CMS document'))
+        return _read_bio(out)
+    finally:
+        if cms:
+            lib.CMS_ContentInfo_free(cms)
+        if out:
+            lib.BIO_free(out)
+        lib.BIO_free(data)
+
+
+def cms_verify(formatted, certificates, store):
+    """Verify a PEM encoded CMS document, returning the signed content.
+
+    This matches ``openssl cms -verify -certfile <certificates>
+    -CAfile <store> -inform PEM -nodetach``.
+
+    """
+    lib = _load()
+    data = _mem_bio(formatted)
+    certs = None
+    cms = None
+    out = None
+    try:
+        cms = lib.PEM_read_bio_CMS(data, None, None, None)
+        if not cms:
+            _raise_error(_('Unable to decode CMS document'))
+        certs = lib.stack_new_null()
+        for certificate in certificates:
+            lib.stack_push(certs, certificate.ptr)
+        out = _mem_bio()
+        if not lib.CMS_verify(cms, certs, store.ptr, None, out, 0):
+            _raise_error(_('Verification failed'))
+        return _read_bio(out)
+    finally:
+        if out:
+            lib.BIO_free(out)
+        if certs:
+            lib.stack_free(certs)
+        if cms:
+            lib.CMS_ContentInfo_free(cms)
+        lib.BIO_free(data)
@@ -16,6 +16,7 @@
 
 import functools
 
+from keystone.common import cache
 from keystone.openstack.common import importutils
 
 
@@ -30,10 +31,21 @@ class Manager(object):
 
     An example of a probable use case is logging all the calls.
 
+    Managers naming a ``cache_namespace`` have the results of their
+    ``cached_methods`` cached when ``[cache] enabled`` is set, see
+    :mod:`keystone.common.cache`.
+
     """
 
+    cache_namespace = None
+    cached_methods = ()
+
     def __init__(self, driver_name):
         self.driver = importutils.import_object(driver_name)
+        if self.cache_namespace and cache.is_enabled(self.cache_namespace):
+            self.driver = cache.CachedDriver(self.driver,
+                                             self.cache_namespace,
+                                             self.cached_methods)
 
     def __getattr__(self, name):
         """Forward calls to the underlying driver."""
@@ -0,0 +1,189 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""A bounded pool of memcache connections shared by threads or greenlets."""
+
+from __future__ import absolute_import
+import contextlib
+import Queue
+import threading
+import time
+
+import memcache
+
+from keystone.common import logging
+from keystone import config
+from keystone import exception
+
+
+CONF = config.CONF
+config.register_str('servers', group='memcache', default='localhost:11211')
+config.register_int('pool_size', group='memcache', default=10)
+config.register_int('pool_checkout_timeout', group='memcache', default=10)
+config.register_int('dead_retry', group='memcache', default=30)
+config.register_int('socket_timeout', group='memcache', default=3)
+
+LOG = logging.getLogger(__name__)
+
+
+class _MemcacheClient(memcache.Client):
+    """A memcache client that can be handed from one thread to another.
+
+    memcache.Client keeps its sockets in a threading.local, so every thread
+    (or, once eventlet patches threading, every greenlet) using it would
+    open connections of its own. Restoring the plain object behaviour makes
+    the connections belong to the client again.
+
+    """
+
+    __delattr__ = object.__delattr__
+    __getattribute__ = object.__getattribute__
+    __new__ = object.__new__
+    __setattr__ = object.__setattr__
+
+    def __del__(self):
+        pass
+
+
+class PooledClient(object):
+    """Spreads memcache calls over at most ``size`` connections.
+
+    Every method of memcache.Client is available and runs on a connection
+    checked out for the duration of the call. Callers that need several
+    calls on one connection, such as gets() followed by cas(), use
+    :meth:`reserve`. When every connection is busy, callers wait up to
+    ``checkout_timeout`` seconds before giving up.
+
+    The pool relies on the standard threading primitives, so it is shared
+    safely by real threads and, once eventlet has patched them, by green
+    threads.
+
+    """
+
+    def __init__(self, servers, size=10, checkout_timeout=10,
+                 dead_retry=30, socket_timeout=3):
+        self.servers = servers
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.dead_retry = dead_retry
+        self.socket_timeout = socket_timeout
+        self._idle = Queue.Queue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._count = 0
+        self._waiting = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+
+    def _create_client(self):
+        return _MemcacheClient(self.servers,
+                               debug=0,
+                               cache_cas=True,
+                               dead_retry=self.dead_retry,
+                               socket_timeout=self.socket_timeout)
+
+    def _checkout(self):
+        self.checkouts += 1
+        try:
+            return self._idle.get_nowait()
+        except Queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._count < self.size
+            if create:
+                self._count += 1
+        if create:
+            try:
+                return self._create_client()
+            except Exception:
+                with self._lock:
+                    self._count -= 1
+                raise
+
+        self.waits += 1
+        self._waiting += 1
+        start = time.time()
+        try:
+            client = self._idle.get(timeout=self.checkout_timeout)
+        except Queue.Empty:
+            self.timeouts += 1
+            LOG.warning(_('Timed out waiting for a memcache connection: '
+                          '%s'), self.stats())
+            raise exception.UnexpectedError(
+                _('Timed out waiting for a memcache connection'))
+        finally:
+            self._waiting -= 1
+        LOG.debug(_('Waited %.3f seconds for a memcache connection'),
+                  time.time() - start)
+        return client
+
+    @contextlib.contextmanager
+    def reserve(self):
+        """Checks out one connection for a sequence of calls.
+
+        Nested reservations by the same thread share the connection.
+
+        """
+        client = getattr(self._local, 'client', None)
+        if client is not None:
+            yield client
+            return
+
+        client = self._checkout()
+        self._local.client = client
+        try:
+            yield client
+        except BaseException:
+            # the connection may be left half way through a command, also
+            # when a GreenletExit or an outer timeout interrupts it
+            client.disconnect_all()
+            raise
+        finally:
+            self._local.client = None
+            client.reset_cas()
+            self._idle.put(client)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def _call(*args, **kwargs):
+            with self.reserve() as client:
+                return getattr(client, name)(*args, **kwargs)
+        return _call
+
+    def stats(self):
+        """Returns how busy the pool is."""
+        idle = self._idle.qsize()
+        return {'size': self.size,
+                'connections': self._count,
+                'idle': idle,
+                'in_use': self._count - idle,
+                'waiting': self._waiting,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts}
+
+
+def get_client():
+    """Returns a pool of connections to the ``[memcache]`` servers."""
+    return PooledClient(CONF.memcache.servers.split(','),
+                        size=CONF.memcache.pool_size,
+                        checkout_timeout=CONF.memcache.pool_checkout_timeout,
+                        dead_retry=CONF.memcache.dead_retry,
+                        socket_timeout=CONF.memcache.socket_timeout)
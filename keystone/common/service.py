@@ -0,0 +1,203 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Serve the same listening sockets from several worker processes."""
+
+import errno
+import os
+import signal
+import time
+
+import eventlet
+from eventlet import event
+from eventlet import hubs
+
+from keystone.common import logging
+from keystone import config
+
+
+CONF = config.CONF
+
+LOG = logging.getLogger(__name__)
+
+# a worker exiting sooner than this after starting is restarted only after
+# the same delay, so a worker failing on start does not fork in a tight loop
+RESTART_DELAY = 1
+
+# seconds between checks on the workers
+POLL_INTERVAL = 0.5
+
+
+class ProcessLauncher(object):
+    """Forks and supervises workers serving a set of wsgi.Servers.
+
+    The servers' sockets are opened in this process and shared by every
+    worker. Each worker calls ``prepare_worker(index)`` first, which gives
+    the servers their applications; building them after the fork means no
+    worker shares a database engine or memcache connection with another.
+    Worker ``index`` runs from 0 to ``workers - 1`` and is kept by the
+    process replacing a worker.
+
+    SIGTERM and SIGINT stop the workers: they stop accepting connections,
+    answer the requests they have accepted for at most
+    ``graceful_shutdown_timeout`` seconds and exit. SIGHUP calls
+    ``reload_config()``, if given, and replaces every worker with a fresh
+    one while the old ones finish their requests.
+
+    """
+
+    def __init__(self, servers, workers, prepare_worker, reload_config=None):
+        self.servers = servers
+        self.workers = workers
+        self.prepare_worker = prepare_worker
+        self.reload_config = reload_config
+        self.children = {}
+        self.running = True
+        self.restarting = False
+
+    def listen(self):
+        for server in self.servers:
+            if server.socket is None:
+                server.listen()
+
+    def _handle_stop(self, signo, frame):
+        self.running = False
+
+    def _handle_restart(self, signo, frame):
+        self.restarting = True
+
+    def _start_child(self, index):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                self._child_main(index)
+            except BaseException:
+                LOG.exception(_('Worker %s failed'), index)
+                status = 1
+            # never return into the parent's code
+            os._exit(status)
+        LOG.info(_('Started worker %(index)s as process %(pid)s'),
+                 {'index': index, 'pid': pid})
+        self.children[pid] = (index, time.time())
+        return pid
+
+    def _child_main(self, index):
+        # a hub of our own, so no epoll set is shared with the parent or
+        # with the other workers
+        hubs.use_hub()
+
+        stopping = event.Event()
+
+        def _stop(signo, frame):
+            if not stopping.ready():
+                stopping.send(signo)
+
+        signal.signal(signal.SIGTERM, _stop)
+        signal.signal(signal.SIGINT, _stop)
+        # restarts are up to the parent
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        # a signal arriving between the fork and the lines above went to the
+        # handler inherited from the parent, which only cleared self.running
+        if not self.running:
+            _stop(signal.SIGTERM, None)
+
+        self.prepare_worker(index)
+        for server in self.servers:
+            server.start()
+
+        stopping.wait()
+        LOG.info(_('Worker %s stopping'), index)
+        for server in self.servers:
+            server.kill()
+        with eventlet.Timeout(CONF.graceful_shutdown_timeout, False):
+            for server in self.servers:
+                server.wait()
+
+    def _signal_children(self, pids, signo):
+        for pid in pids:
+            try:
+                os.kill(pid, signo)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+
+    def _restart_all(self):
+        LOG.info(_('Restarting workers'))
+        if self.reload_config is not None:
+            try:
+                self.reload_config()
+            except Exception:
+                LOG.exception(_('Unable to reload the configuration, '
+                                'keeping the running workers'))
+                return
+        old = dict(self.children)
+        for pid, (index, started) in old.items():
+            if index is not None:
+                # the replacement is running before the worker is told to
+                # stop, and the worker is not replaced again when it exits
+                self._start_child(index)
+                self.children[pid] = (None, started)
+        self._signal_children(old, signal.SIGTERM)
+
+    def _wait_child(self):
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except OSError as e:
+            if e.errno == errno.ECHILD:
+                self.children.clear()
+            elif e.errno != errno.EINTR:
+                raise
+            return
+        if not pid:
+            # polling rather than blocking in wait() means a signal arriving
+            # just before it is never left unhandled until a worker exits
+            time.sleep(POLL_INTERVAL)
+            return
+        if pid not in self.children:
+            return
+        index, started = self.children.pop(pid)
+        if index is None or not self.running:
+            return
+        LOG.warning(_('Worker %(index)s (process %(pid)s) exited with '
+                      'status %(status)s'),
+                    {'index': index, 'pid': pid, 'status': status})
+        if time.time() - started < RESTART_DELAY:
+            time.sleep(RESTART_DELAY)
+        if self.running:
+            self._start_child(index)
+
+    def start(self):
+        """Open the sockets and fork the workers."""
+        self.listen()
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_restart)
+        for index in range(self.workers):
+            self._start_child(index)
+
+    def wait(self):
+        """Supervise the workers until told to stop."""
+        while self.running:
+            if self.restarting:
+                self.restarting = False
+                self._restart_all()
+            self._wait_child()
+
+        LOG.info(_('Stopping workers'))
+        self._signal_children(list(self.children), signal.SIGTERM)
+        while self.children:
+            self._wait_child()
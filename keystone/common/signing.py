@@ -0,0 +1,299 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Pluggable CMS signers used to issue PKI tokens and revocation lists.
+
+The signer is selected with ``[signing] signer``. Every signer produces the
+same PEM encoded CMS document that ``openssl cms -sign`` would.
+
+PKI tokens are verified in-process by a :class:`Verifier`, which remembers
+tokens it has already verified.
+
+"""
+
+import os
+import subprocess
+import time
+
+from keystone.common import cms
+from keystone.common import libcrypto
+from keystone.common import logging
+from keystone.common import utils
+from keystone.common import worker_pool
+from keystone import config
+from keystone import exception
+from keystone.openstack.common import importutils
+
+
+CONF = config.CONF
+LOG = logging.getLogger(__name__)
+
+_SIGNERS = {}
+_VERIFIER = None
+
+
+class SigningError(Exception):
+    """Raised when a document could not be signed."""
+    pass
+
+
+class VerificationError(Exception):
+    """Raised when a document's signature could not be verified."""
+    pass
+
+
+class Signer(object):
+    """Interface description for a CMS signer."""
+
+    def sign_text(self, text, certfile, keyfile):
+        """Sign text with the given certificate and private key.
+
+        :returns: PEM encoded CMS document
+        :raises: keystone.common.signing.SigningError
+
+        """
+        raise exception.NotImplemented()
+
+
+class SubprocessSigner(Signer):
+    """Runs ``openssl cms -sign`` for every document."""
+
+    def sign_text(self, text, certfile, keyfile):
+        try:
+            return cms.cms_sign_text(text, certfile, keyfile)
+        except subprocess.CalledProcessError as e:
+            raise SigningError(e)
+
+
+class InProcessSigner(Signer):
+    """Signs through libcrypto, loading the certificate and key only once.
+
+    The parsed certificate and key are kept until the files change on disk.
+    If libcrypto cannot be loaded, every request is handed to the
+    subprocess signer instead.
+
+    """
+
+    def __init__(self):
+        self.fallback = SubprocessSigner()
+        self._credentials = {}
+
+    def _stat(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError as e:
+            raise SigningError(_('Unable to load signing credentials: %s') %
+                               e)
+
+    def _read(self, path):
+        try:
+            with open(path) as f:
+                return f.read()
+        except IOError as e:
+            raise SigningError(_('Unable to load signing credentials: %s') %
+                               e)
+
+    def _load_credentials(self, certfile, keyfile):
+        key = (certfile, keyfile)
+        mtimes = (self._stat(certfile), self._stat(keyfile))
+        cached = self._credentials.get(key)
+        if cached is not None and cached[0] == mtimes:
+            return cached[1]
+
+        try:
+            credentials = (libcrypto.load_certificate(self._read(certfile)),
+                           libcrypto.load_private_key(self._read(keyfile)))
+        except libcrypto.Error as e:
+            LOG.error(_('Signing error: %s') % e)
+            raise SigningError(e)
+        self._credentials[key] = (mtimes, credentials)
+        return credentials
+
+    def sign_text(self, text, certfile, keyfile):
+        if not libcrypto.is_available():
+            return self.fallback.sign_text(text, certfile, keyfile)
+
+        certificate, private_key = self._load_credentials(certfile, keyfile)
+        try:
+            return libcrypto.cms_sign(text, certificate, private_key)
+        except libcrypto.Error as e:
+            LOG.error(_('Signing error: %s') % e)
+            raise SigningError(e)
+
+
+def worker_main(stdin=None, stdout=None):
+    """Serve signing requests from a WorkerPoolSigner until stdin closes."""
+    signer = InProcessSigner()
+
+    def _sign(request):
+        try:
+            return {'signed': signer.sign_text(request['text'].encode('utf-8'),
+                                               request['certfile'],
+                                               request['keyfile'])}
+        except SigningError as e:
+            return {'error': str(e)}
+
+    worker_pool.serve(_sign, stdin, stdout)
+
+
+class WorkerPoolSigner(Signer, worker_pool.WorkerPool):
+    """Hands documents to a bounded pool of long-lived signing processes.
+
+    Workers are started on demand up to ``[signing] worker_pool_size``. When
+    all of them are busy, callers wait up to ``worker_checkout_timeout``
+    seconds for one to become free rather than starting more processes. A
+    worker that dies or exceeds ``worker_timeout`` while signing is killed
+    and replaced.
+
+    """
+
+    worker_main = 'from keystone.common import signing; signing.worker_main()'
+    description = 'signing worker'
+    error = SigningError
+
+    def __init__(self):
+        super(WorkerPoolSigner, self).__init__(
+            CONF.signing.worker_pool_size,
+            CONF.signing.worker_checkout_timeout,
+            CONF.signing.worker_timeout)
+
+    def sign_text(self, text, certfile, keyfile):
+        response = self.call({'text': text,
+                              'certfile': certfile,
+                              'keyfile': keyfile})
+        return response['signed'].encode('utf-8')
+
+
+class Verifier(object):
+    """Verifies CMS documents through libcrypto.
+
+    The signing certificate and CA store are loaded once and kept until the
+    files change on disk, which is checked at most every
+    ``[signing] credentials_check_interval`` seconds. Verified tokens are
+    remembered, keyed by their hash and the modification times of the
+    credentials they were verified with, for up to ``verified_cache_ttl``
+    seconds in an LRU of at most ``verified_cache_size`` entries. If
+    libcrypto cannot be loaded, ``openssl cms -verify`` is run instead.
+
+    """
+
+    def __init__(self):
+        self.cache = utils.LRUCache(CONF.signing.verified_cache_size,
+                                    CONF.signing.verified_cache_ttl)
+        self._credentials = None
+        self._checked = None
+
+    def _credential_mtimes(self, certfile, ca_certs):
+        now = time.time()
+        interval = CONF.signing.credentials_check_interval
+        if self._checked is not None:
+            paths, checked_at, mtimes = self._checked
+            if paths == (certfile, ca_certs) and now - checked_at < interval:
+                return mtimes
+
+        try:
+            mtimes = (os.stat(certfile).st_mtime,
+                      os.stat(ca_certs).st_mtime)
+        except OSError as e:
+            raise VerificationError(
+                _('Unable to load verification credentials: %s') % e)
+        self._checked = ((certfile, ca_certs), now, mtimes)
+        return mtimes
+
+    def _load_credentials(self, certfile, ca_certs):
+        key = (certfile, ca_certs, self._credential_mtimes(certfile, ca_certs))
+        if self._credentials is not None and self._credentials[0] == key:
+            return self._credentials[1]
+
+        try:
+            with open(certfile) as f:
+                certificates = libcrypto.load_certificates(f.read())
+            store = libcrypto.load_certificate_store(ca_certs)
+        except (IOError, libcrypto.Error) as e:
+            raise VerificationError(
+                _('Unable to load verification credentials: %s') % e)
+        # results verified against other credentials are no longer trusted
+        self.cache.clear()
+        self._credentials = (key, (certificates, store))
+        return certificates, store
+
+    def verify_text(self, formatted, certfile, ca_certs):
+        """Verify a PEM encoded CMS document, returning its content.
+
+        :raises: keystone.common.signing.VerificationError
+
+        """
+        if not libcrypto.is_available():
+            try:
+                return cms.cms_verify(formatted, certfile, ca_certs)
+            except subprocess.CalledProcessError as e:
+                raise VerificationError(e)
+
+        certificates, store = self._load_credentials(certfile, ca_certs)
+        try:
+            return libcrypto.cms_verify(formatted, certificates, store)
+        except libcrypto.Error as e:
+            LOG.error(_('Verify error: %s') % e)
+            raise VerificationError(e)
+
+    def verify_token(self, token_id, certfile, ca_certs):
+        """Verify a PKI token, returning the signed token data."""
+        # tokens verified with credentials that have since changed miss
+        key = (cms.cms_hash_token(token_id),
+               certfile,
+               ca_certs,
+               self._credential_mtimes(certfile, ca_certs))
+        data = self.cache.get(key)
+        if data is None:
+            data = self.verify_text(cms.token_to_cms(token_id),
+                                    certfile,
+                                    ca_certs)
+            self.cache.set(key, data)
+        return data
+
+
+def get_signer():
+    """Return the signer configured by ``[signing] signer``."""
+    name = CONF.signing.signer
+    if name not in _SIGNERS:
+        _SIGNERS[name] = importutils.import_object(name)
+    return _SIGNERS[name]
+
+
+def sign_text(text):
+    """Sign text with the configured signing certificate and key."""
+    return get_signer().sign_text(text,
+                                  CONF.signing.certfile,
+                                  CONF.signing.keyfile)
+
+
+def sign_token(text):
+    """Sign token data, returning the token id."""
+    return cms.cms_to_token(sign_text(text))
+
+
+def get_verifier():
+    global _VERIFIER
+    if _VERIFIER is None:
+        _VERIFIER = Verifier()
+    return _VERIFIER
+
+
+def verify_token(token_id):
+    """Verify a PKI token against the configured certificates."""
+    return get_verifier().verify_token(token_id,
+                                       CONF.signing.certfile,
+                                       CONF.signing.ca_certs)
@@ -52,6 +52,8 @@ NotFound = sql.orm.exc.NoResultFound
 Boolean = sql.Boolean
 Text = sql.Text
 UniqueConstraint = sql.UniqueConstraint
+and_ = sql.and_
+or_ = sql.or_
 
 
 def initialize_decorator(init):
@@ -274,3 +276,47 @@ def handle_conflicts(type='object'):
                 raise exception.Conflict(type=type, details=str(e.orig))
         return wrapper
     return decorator
+
+
+def filter_and_page(query, model, filters=None, marker=None, limit=None,
+                    page_reverse=False):
+    """Returns the rows of a query for one page of a list_* driver call.
+
+    Filters on the model's columns, the marker and the limit become part of
+    the query. Filters on attributes kept in the ``extra`` blob are checked
+    as rows are read, and reading stops once the page is full. See
+    :func:`keystone.common.utils.page_refs` for the arguments.
+
+    """
+    extra_filters = {}
+    for attr, value in (filters or {}).iteritems():
+        if attr in model.attributes:
+            query = query.filter(getattr(model, attr) == value)
+        else:
+            extra_filters[attr] = value
+
+    if page_reverse:
+        if marker is not None:
+            query = query.filter(model.id < marker)
+        query = query.order_by(model.id.desc())
+    else:
+        if marker is not None:
+            query = query.filter(model.id > marker)
+        query = query.order_by(model.id)
+
+    if not extra_filters:
+        if limit is not None:
+            query = query.limit(limit)
+        refs = query.all()
+    else:
+        refs = []
+        for ref in query.yield_per(100):
+            ref_dict = ref.to_dict()
+            if all(ref_dict.get(k) == v for k, v in extra_filters.iteritems()):
+                refs.append(ref)
+                if len(refs) == limit:
+                    break
+
+    if page_reverse:
+        refs.reverse()
+    return refs
@@ -0,0 +1,67 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+import migrate
+import sqlalchemy as sql
+
+
+INDEXED_COLUMNS = ['user_id', 'tenant_id', 'trust_id']
+
+
+def _ref_id(extra, key):
+    ref = extra.get(key)
+    if isinstance(ref, dict):
+        return ref.get('id')
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    token_table = sql.Table('token', meta, autoload=True)
+    for name in INDEXED_COLUMNS:
+        column = sql.Column(name, sql.String(64), nullable=True)
+        column.create(token_table)
+        sql.Index('ix_token_%s' % name, column).create(migrate_engine)
+
+    # backfill the new columns from the JSON blob they used to live in
+    conn = migrate_engine.connect()
+    for token_id, extra in conn.execute(sql.select([token_table.c.id,
+                                                    token_table.c.extra])):
+        extra = json.loads(extra) if extra else {}
+        user_id = _ref_id(extra, 'user')
+        tenant_id = _ref_id(extra, 'tenant')
+        trust_id = extra.get('trust_id')
+        if user_id or tenant_id or trust_id:
+            conn.execute(token_table.update()
+                         .where(token_table.c.id == token_id)
+                         .values(user_id=user_id,
+                                 tenant_id=tenant_id,
+                                 trust_id=trust_id))
+    conn.close()
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    token_table = sql.Table('token', meta, autoload=True)
+    for name in INDEXED_COLUMNS:
+        sql.Index('ix_token_%s' % name,
+                  token_table.c[name]).drop(migrate_engine)
+        token_table.c[name].drop()
@@ -0,0 +1,121 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+import sqlalchemy as sql
+
+
+# assignment type, metadata table, actor column, target column
+GRANT_TABLES = [
+    ('UserProject', 'user_project_metadata', 'user_id', 'project_id'),
+    ('GroupProject', 'group_project_metadata', 'group_id', 'project_id'),
+    ('UserDomain', 'user_domain_metadata', 'user_id', 'domain_id'),
+    ('GroupDomain', 'group_domain_metadata', 'group_id', 'domain_id'),
+]
+
+INDEXED_COLUMNS = ['actor_id', 'target_id', 'role_id']
+
+
+def _load(data):
+    return json.loads(data) if data else {}
+
+
+def _grant_table(meta, table_name, actor, target):
+    # not reflected: sqlite may still carry foreign keys to renamed tables
+    return sql.Table(table_name,
+                     meta,
+                     sql.Column(actor, sql.String(64), primary_key=True),
+                     sql.Column(target, sql.String(64), primary_key=True),
+                     sql.Column('data', sql.Text()))
+
+
+def upgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    role_table = sql.Table('role', meta, autoload=True)
+    assignment_table = sql.Table(
+        'role_assignment',
+        meta,
+        sql.Column('type', sql.String(64), primary_key=True),
+        sql.Column('actor_id', sql.String(64), primary_key=True),
+        sql.Column('target_id', sql.String(64), primary_key=True),
+        sql.Column('role_id', sql.String(64), sql.ForeignKey('role.id'),
+                   primary_key=True))
+    assignment_table.create(migrate_engine, checkfirst=True)
+    for name in INDEXED_COLUMNS:
+        sql.Index('ix_role_assignment_%s' % name,
+                  assignment_table.c[name]).create(migrate_engine)
+
+    # move the roles out of the JSON blobs, one row per role
+    conn = migrate_engine.connect()
+    role_ids = set(row[0] for row in
+                   conn.execute(sql.select([role_table.c.id])))
+    for assignment_type, table_name, actor, target in GRANT_TABLES:
+        table = _grant_table(meta, table_name, actor, target)
+        for row in conn.execute(table.select()).fetchall():
+            data = _load(row['data'])
+            if 'roles' not in data:
+                continue
+            # roles that no longer exist are dropped with the blob
+            for role_id in set(data.pop('roles')) & role_ids:
+                conn.execute(assignment_table.insert().values(
+                    type=assignment_type,
+                    actor_id=row[actor],
+                    target_id=row[target],
+                    role_id=role_id))
+            conn.execute(table.update()
+                         .where(table.c[actor] == row[actor])
+                         .where(table.c[target] == row[target])
+                         .values(data=json.dumps(data)))
+    conn.close()
+
+
+def downgrade(migrate_engine):
+    meta = sql.MetaData()
+    meta.bind = migrate_engine
+
+    assignment_table = sql.Table('role_assignment', meta, autoload=True)
+
+    # fold the assignments back into the JSON blobs
+    conn = migrate_engine.connect()
+    for assignment_type, table_name, actor, target in GRANT_TABLES:
+        table = _grant_table(meta, table_name, actor, target)
+        grants = {}
+        query = assignment_table.select().where(
+            assignment_table.c.type == assignment_type)
+        for row in conn.execute(query).fetchall():
+            key = (row['actor_id'], row['target_id'])
+            grants.setdefault(key, []).append(row['role_id'])
+        for (actor_id, target_id), roles in grants.iteritems():
+            where = sql.and_(table.c[actor] == actor_id,
+                             table.c[target] == target_id)
+            row = conn.execute(table.select().where(where)).fetchone()
+            if row is None:
+                conn.execute(table.insert().values(
+                    {actor: actor_id,
+                     target: target_id,
+                     'data': json.dumps({'roles': roles})}))
+            else:
+                data = _load(row['data'])
+                data['roles'] = roles
+                conn.execute(table.update()
+                             .where(where)
+                             .values(data=json.dumps(data)))
+    conn.close()
+
+    assignment_table.drop()
@@ -19,25 +19,40 @@
 #    under the License.
 
 import hashlib
+import heapq
+import hmac
 import json
 import os
+import struct
 import subprocess
 import time
 
+import eventlet.patcher
+from eventlet import semaphore
+from eventlet import tpool
 import passlib.hash
 
 from keystone.common import logging
+from keystone.common import worker_pool
 from keystone import config
 from keystone import exception
 
 
 CONF = config.CONF
 config.register_int('crypt_strength', default=40000)
+config.register_str('password_hash_pool', default='process')
+config.register_int('password_hash_workers', default=4)
+config.register_int('password_hash_queue_size', default=100)
+config.register_int('password_hash_timeout', default=30)
+config.register_int('password_cache_time', default=0)
+config.register_int('password_cache_size', default=1000)
 
 LOG = logging.getLogger(__name__)
 
 MAX_PASSWORD_LENGTH = 4096
 
+_MISSING = object()
+
 
 def read_cached_file(filename, cache_info, reload_func=None):
     """Read from a file if it has been modified.
@@ -98,14 +113,162 @@ def hash_ldap_user_password(user):
         return dict(user, password=ldap_hash_password(password))
 
 
+def _sha512_crypt_encrypt(password_utf8, rounds):
+    return passlib.hash.sha512_crypt.encrypt(password_utf8, rounds=rounds)
+
+
+def _sha512_crypt_verify(password_utf8, hashed):
+    return passlib.hash.sha512_crypt.verify(password_utf8, hashed)
+
+
+_PASSWORD_OPS = {'encrypt': _sha512_crypt_encrypt,
+                 'verify': _sha512_crypt_verify}
+
+
+def password_worker_main(stdin=None, stdout=None):
+    """Serve requests from a PasswordWorkerPool until stdin closes."""
+    def _run(request):
+        args = [arg.encode('utf-8') if isinstance(arg, unicode) else arg
+                for arg in request['args']]
+        try:
+            return {'result': _PASSWORD_OPS[request['op']](*args)}
+        except Exception as e:
+            return {'error': str(e)}
+
+    worker_pool.serve(_run, stdin, stdout)
+
+
+class PasswordWorkerPool(worker_pool.WorkerPool):
+    """Hashes and verifies passwords in separate processes."""
+
+    worker_main = ('from keystone.common import utils; '
+                   'utils.password_worker_main()')
+    description = 'password hashing worker'
+    error = exception.UnexpectedError
+
+    def run(self, op, *args):
+        result = self.call({'op': op, 'args': args})['result']
+        if isinstance(result, unicode):
+            # hashes are plain ascii
+            result = result.encode('utf-8')
+        return result
+
+
+class PasswordHasher(object):
+    """Runs password hashing off the eventlet hub.
+
+    ``[DEFAULT] password_hash_pool`` selects where: ``process`` uses a
+    PasswordWorkerPool, ``thread`` the native threads of eventlet.tpool and
+    ``none`` the calling green thread. At most ``password_hash_workers``
+    passwords are hashed at once; once ``password_hash_queue_size`` callers
+    are waiting for a turn, further callers are refused.
+
+    Without eventlet's patched threads every request already runs in its
+    own native thread, so passwords are hashed in place.
+
+    """
+
+    def __init__(self):
+        self.mode = CONF.password_hash_pool
+        self.workers = CONF.password_hash_workers
+        self.queue_size = CONF.password_hash_queue_size
+        self.waiting = 0
+        self._semaphore = semaphore.Semaphore(self.workers)
+        self._pool = None
+        if self.mode == 'process':
+            self._pool = PasswordWorkerPool(self.workers,
+                                            CONF.password_hash_timeout,
+                                            CONF.password_hash_timeout)
+
+    def _execute(self, op, *args):
+        if self._pool is not None:
+            return self._pool.run(op, *args)
+        return tpool.execute(_PASSWORD_OPS[op], *args)
+
+    def run(self, op, *args):
+        if (self.mode == 'none' or
+                not eventlet.patcher.is_monkey_patched('thread')):
+            return _PASSWORD_OPS[op](*args)
+
+        if self._semaphore.locked() and self.waiting >= self.queue_size:
+            LOG.warning(_('Too many passwords waiting to be hashed'))
+            raise exception.UnexpectedError(
+                _('Too many passwords waiting to be hashed'))
+        self.waiting += 1
+        try:
+            self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return self._execute(op, *args)
+        finally:
+            self._semaphore.release()
+
+
+_PASSWORD_HASHER = None
+
+
+def get_password_hasher():
+    global _PASSWORD_HASHER
+    if _PASSWORD_HASHER is None:
+        _PASSWORD_HASHER = PasswordHasher()
+    return _PASSWORD_HASHER
+
+
+class VerifiedPasswordCache(object):
+    """Remembers successful password checks for a short time.
+
+    Entries are keyed by an HMAC of the user id, the stored hash and the
+    password under a key that never leaves this process, so nothing cached
+    helps to recover a password. Setting a new password stores a new hash,
+    which leaves the entries made for the old one unreachable. Failed checks
+    are not remembered: a wrong password always pays for the full hash.
+
+    """
+
+    def __init__(self, ttl, maxsize):
+        self._secret = os.urandom(32)
+        self._verified = LRUCache(maxsize, ttl)
+
+    def _key(self, user_id, password_utf8, hashed):
+        mac = hmac.new(self._secret, digestmod=hashlib.sha256)
+        for part in (user_id, hashed, password_utf8):
+            if isinstance(part, unicode):
+                part = part.encode('utf-8')
+            # length prefixed, so no two triples run together the same way
+            mac.update(struct.pack('!I', len(part)) + part)
+        return mac.digest()
+
+    def is_verified(self, user_id, password_utf8, hashed):
+        key = self._key(user_id, password_utf8, hashed)
+        return self._verified.get(key, False)
+
+    def remember(self, user_id, password_utf8, hashed):
+        self._verified.set(self._key(user_id, password_utf8, hashed), True)
+
+
+_PASSWORD_CACHE = None
+
+
+def get_password_cache():
+    """Return the VerifiedPasswordCache, or None when it is disabled."""
+    global _PASSWORD_CACHE
+    if CONF.password_cache_time <= 0:
+        return None
+    if _PASSWORD_CACHE is None:
+        _PASSWORD_CACHE = VerifiedPasswordCache(CONF.password_cache_time,
+                                                CONF.password_cache_size)
+    return _PASSWORD_CACHE
+
+
 def hash_password(password):
     """Hash a password. Hard."""
     password_utf8 = trunc_password(password).encode('utf-8')
     if passlib.hash.sha512_crypt.identify(password_utf8):
         return password_utf8
-    h = passlib.hash.sha512_crypt.encrypt(password_utf8,
-                                          rounds=CONF.crypt_strength)
-    return h
+    return get_password_hasher().run('encrypt',
+                                     password_utf8,
+                                     CONF.crypt_strength)
 
 
 def ldap_hash_password(password):
@@ -122,17 +285,27 @@ def ldap_check_password(password, hashed):
     return passlib.hash.ldap_salted_sha1.verify(password_utf8, hashed)
 
 
-def check_password(password, hashed):
+def check_password(password, hashed, user_id=None):
     """Check that a plaintext password matches hashed.
 
     hashpw returns the salt value concatenated with the actual hash value.
     It extracts the actual salt if this value is then passed as the salt.
 
+    When the user_id owning hashed is given and ``password_cache_time`` is
+    set, a match found within that many seconds is not hashed again.
+
     """
     if password is None:
         return False
     password_utf8 = trunc_password(password).encode('utf-8')
-    return passlib.hash.sha512_crypt.verify(password_utf8, hashed)
+    cache = get_password_cache() if user_id and hashed else None
+    if cache is not None and cache.is_verified(user_id, password_utf8, hashed):
+        return True
+    if not get_password_hasher().run('verify', password_utf8, hashed):
+        return False
+    if cache is not None:
+        cache.remember(user_id, password_utf8, hashed)
+    return True
 
 
 # From python 2.7
@@ -233,6 +406,112 @@ def setup_remote_pydev_debug():
             raise
 
 
+def page_refs(refs, filters=None, marker=None, limit=None,
+              page_reverse=False):
+    """Filters and pages references the way the list_* drivers do.
+
+    References whose attributes equal every value in ``filters`` are sorted
+    by id. Only those with an id after ``marker`` are kept, or before it when
+    ``page_reverse`` is set, and of those the ``limit`` nearest the marker.
+    The result is always in ascending id order. ``refs`` may be any
+    iterable; with a ``limit`` only that many references are held at once.
+
+    """
+    def _id(ref):
+        return ref['id']
+
+    refs = (ref for ref in refs
+            if all(ref.get(k) == v for k, v in (filters or {}).iteritems()))
+    if marker is not None:
+        if page_reverse:
+            refs = (ref for ref in refs if ref['id'] < marker)
+        else:
+            refs = (ref for ref in refs if ref['id'] > marker)
+    if limit is None:
+        return sorted(refs, key=_id)
+    if page_reverse:
+        return sorted(heapq.nlargest(limit, refs, key=_id), key=_id)
+    return heapq.nsmallest(limit, refs, key=_id)
+
+
+class LRUCache(object):
+    """A size and age bounded mapping that evicts least recently used keys.
+
+    :param maxsize: maximum number of entries kept
+    :param ttl: seconds an entry stays valid, or None to keep it until evicted
+
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        # circular doubly linked list of [prev, next, key, value, expires],
+        # most recently used first
+        self._root = root = []
+        root[:] = [root, root, None, None, None]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def _unlink(self, link):
+        prev, next_ = link[0], link[1]
+        prev[1] = next_
+        next_[0] = prev
+
+    def _push_front(self, link):
+        root = self._root
+        first = root[1]
+        link[0] = root
+        link[1] = first
+        first[0] = link
+        root[1] = link
+
+    def get(self, key, default=None, count=True):
+        link = self._entries.get(key)
+        if link is not None and link[4] is not None and link[4] < time.time():
+            self.delete(key)
+            link = None
+        if link is None:
+            if count:
+                self.misses += 1
+            return default
+        self._unlink(link)
+        self._push_front(link)
+        if count:
+            self.hits += 1
+        return link[3]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl is not None else None
+        link = self._entries.get(key)
+        if link is not None:
+            self._unlink(link)
+            link[3] = value
+            link[4] = expires
+        else:
+            link = [None, None, key, value, expires]
+            self._entries[key] = link
+        self._push_front(link)
+        while len(self._entries) > self.maxsize:
+            self.delete(self._root[0][2])
+
+    def delete(self, key):
+        link = self._entries.pop(key, None)
+        if link is not None:
+            self._unlink(link)
+
+    def clear(self):
+        self._entries.clear()
+        self._root[:] = [self._root, self._root, None, None, None]
+
+
 class LimitingReader(object):
     """Reader to limit the size of an incoming request."""
     def __init__(self, data, limit):
@@ -0,0 +1,197 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Bounded pools of long-lived worker processes.
+
+Workers are python processes fed JSON requests over their stdin and
+answering over their stdout, so CPU bound work runs without blocking the
+eventlet hub of the process handing it out.
+
+"""
+
+import json
+import os
+import struct
+import sys
+
+import eventlet
+from eventlet.green import subprocess as green_subprocess
+from eventlet import queue
+
+from keystone.common import logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+def write_message(stream, message):
+    data = json.dumps(message)
+    stream.write(struct.pack('!I', len(data)) + data)
+    stream.flush()
+
+
+def _read_exact(stream, size):
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            raise EOFError(_('Unexpected end of stream'))
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+
+def read_message(stream):
+    (size,) = struct.unpack('!I', _read_exact(stream, 4))
+    return json.loads(_read_exact(stream, size))
+
+
+def serve(handler, stdin=None, stdout=None):
+    """Answer requests with handler until stdin closes.
+
+    The handler returns the response to each request; a response with an
+    ``error`` is raised as the pool's error by the caller.
+
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    while True:
+        try:
+            request = read_message(stdin)
+        except EOFError:
+            return
+        write_message(stdout, handler(request))
+
+
+class Worker(object):
+    """A long-lived worker process fed over its stdin/stdout pipes.
+
+    :param main: python statement the worker runs, typically a call to
+                 :func:`serve`
+
+    """
+
+    def __init__(self, main):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        self.process = green_subprocess.Popen(
+            [sys.executable, '-c', main],
+            stdin=green_subprocess.PIPE,
+            stdout=green_subprocess.PIPE,
+            env=env,
+            close_fds=True)
+
+    def call(self, request):
+        write_message(self.process.stdin, request)
+        return read_message(self.process.stdout)
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait()
+        except OSError:
+            pass
+
+
+class WorkerPool(object):
+    """Hands requests to a bounded pool of worker processes.
+
+    Workers are started on demand up to ``size``. When all of them are busy,
+    callers wait up to ``checkout_timeout`` seconds for one to become free
+    rather than starting more processes. A worker that dies or exceeds
+    ``call_timeout`` while answering is killed and replaced.
+
+    Subclasses name the ``worker_main`` statement their workers run, a
+    ``description`` for log messages and the ``error`` they raise.
+
+    """
+
+    worker_main = None
+    description = 'worker'
+    error = Exception
+
+    def __init__(self, size, checkout_timeout, call_timeout):
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.call_timeout = call_timeout
+        self._idle = queue.LightQueue()
+        self._count = 0
+
+    def _start_worker(self):
+        return Worker(self.worker_main)
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        if self._count < self.size:
+            self._count += 1
+            try:
+                return self._start_worker()
+            except OSError as e:
+                self._count -= 1
+                raise self.error(_('Unable to start %(worker)s: %(error)s') %
+                                 {'worker': self.description, 'error': e})
+            except BaseException:
+                self._count -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise self.error(_('Timed out waiting for a %s') %
+                             self.description)
+
+    def _replace(self, worker):
+        LOG.warning(_('Restarting %(worker)s %(pid)s'),
+                    {'worker': self.description, 'pid': worker.process.pid})
+        worker.kill()
+        try:
+            self._idle.put(self._start_worker())
+        except OSError as e:
+            self._count -= 1
+            LOG.error(_('Unable to restart %(worker)s: %(error)s') %
+                      {'worker': self.description, 'error': e})
+
+    def call(self, request):
+        """Send a request to an idle worker, returning its response."""
+        worker = self._checkout()
+        timeout = eventlet.Timeout(self.call_timeout)
+        try:
+            try:
+                response = worker.call(request)
+            finally:
+                timeout.cancel()
+        except BaseException as e:
+            # a worker interrupted mid request, even by a GreenletExit or
+            # an outer timeout, can't be trusted with the next one
+            self._replace(worker)
+            if e is timeout or isinstance(e, (EOFError, IOError, ValueError)):
+                raise self.error(_('%(worker)s failed: %(error)s') %
+                                 {'worker': self.description.capitalize(),
+                                  'error': e})
+            raise
+        self._idle.put(worker)
+        if 'error' in response:
+            raise self.error(response['error'])
+        return response
+
+    def stats(self):
+        return {'size': self.size,
+                'workers': self._count,
+                'idle': self._idle.qsize(),
+                'waiting': self._idle.getting()}
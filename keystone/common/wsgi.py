@@ -23,7 +23,9 @@
 import socket
 import sys
 
+from eventlet import event
 import eventlet.wsgi
+import greenlet
 import routes.middleware
 import ssl
 import webob.dec
@@ -59,6 +61,58 @@ class WritableLogger(object):
         self.logger.log(self.level, msg)
 
 
+class _Stopped(Exception):
+    pass
+
+
+class _Listener(object):
+    """The listening socket of an accept loop, until the loop is stopped.
+
+    eventlet.wsgi.server cuts off the connections it has accepted when its
+    accept loop ends. A stopped listener instead never returns from accept()
+    again, leaving the loop waiting while those connections are answered.
+
+    """
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._stopped = False
+        self._accepting = False
+        self._parked = event.Event()
+
+    def accept(self):
+        if not self._stopped:
+            self._accepting = True
+            try:
+                return self._sock.accept()
+            except _Stopped:
+                pass
+            finally:
+                self._accepting = False
+        # never sent; waits for the loop to be killed
+        self._parked.wait()
+
+    def stop(self, greenthread):
+        """Make the accept loop run by greenthread stop accepting.
+
+        The loop is only interrupted while it waits in accept(); anywhere
+        else, such as while it waits for room in the pool to handle the
+        connection it just accepted, it parks on its next call to accept().
+
+        """
+        self._stopped = True
+        if not greenthread:
+            # the loop never ran, or has ended already
+            if greenthread is not None:
+                greenthread.kill()
+            self._sock.close()
+        elif self._accepting:
+            greenthread.kill(_Stopped)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
 class Server(object):
     """Server class to manage multiple WSGI sockets and applications."""
 
@@ -68,12 +122,19 @@ class Server(object):
         self.port = port or 0
         self.pool = eventlet.GreenPool(threads)
         self.socket_info = {}
+        self.socket = None
         self.greenthread = None
         self.do_ssl = False
         self.cert_required = False
+        self._listener = None
 
-    def start(self, key=None, backlog=128):
-        """Run a WSGI server with the given application."""
+    def listen(self, key=None, backlog=128):
+        """Open the listening socket without serving it yet.
+
+        Worker processes forked afterwards share the socket, and the kernel
+        hands each new connection to one of them.
+
+        """
         LOG.debug(_('Starting %(arg0)s on %(host)s:%(port)s') %
                   {'arg0': sys.argv[0],
                    'host': self.host,
@@ -91,6 +152,16 @@ class Server(object):
                                   backlog=backlog)
         if key:
             self.socket_info[key] = _socket.getsockname()
+        self.socket = _socket
+
+    def start(self, key=None, backlog=128):
+        """Run a WSGI server with the given application."""
+        if self.socket is None:
+            self.listen(key, backlog)
+
+        # the accept loop closes its socket when it ends, so it is given a
+        # copy: the listening socket itself stays open for reload()
+        _socket = self.socket.dup()
         # SSL is enabled
         if self.do_ssl:
             if self.cert_required:
@@ -104,9 +175,12 @@ class Server(object):
                                           ca_certs=self.ca_certs)
             _socket = sslsocket
 
-        self.greenthread = self.pool.spawn(self._run,
-                                           self.application,
-                                           _socket)
+        self._listener = _Listener(_socket)
+        # the accept loop stays out of the pool, so that stopping it leaves
+        # the pool to drain the requests in flight
+        self.greenthread = eventlet.spawn(self._run,
+                                          self.application,
+                                          self._listener)
 
     def set_ssl(self, certfile, keyfile=None, ca_certs=None,
                 cert_required=True):
@@ -116,13 +190,66 @@ class Server(object):
         self.cert_required = cert_required
         self.do_ssl = True
 
+    def _retire(self, timeout):
+        """Stop the running accept loop once its requests are answered.
+
+        Requests still running after timeout seconds are cut off. Returns
+        the green thread doing so.
+
+        """
+        greenthread, listener, pool = (self.greenthread,
+                                       self._listener,
+                                       self.pool)
+        if listener is not None:
+            listener.stop(greenthread)
+
+        def _drain():
+            with eventlet.Timeout(timeout, False):
+                pool.waitall()
+            for request in list(pool.coroutines_running):
+                request.kill()
+            if greenthread is not None:
+                greenthread.kill()
+
+        return eventlet.spawn(_drain)
+
+    def reload(self, application, timeout=None):
+        """Serve new connections with another application.
+
+        The listening socket stays open throughout, so no connection is
+        refused. Requests accepted before the switch are answered by the old
+        application for at most timeout seconds, and cut off after that.
+
+        """
+        draining = self._retire(timeout)
+        self.application = application
+        self.pool = eventlet.GreenPool(self.pool.size)
+        self.start()
+        draining.wait()
+
     def kill(self):
+        """Stop accepting connections.
+
+        Requests already accepted are still answered; wait() returns once
+        they all have been.
+
+        """
         if self.greenthread:
-            self.greenthread.kill()
+            self._retire(None)
+        if self.socket is not None:
+            self.socket.close()
 
     def wait(self):
         """Wait until all servers have completed running."""
         try:
+            # follow the accept loops started by reload()
+            greenthread = None
+            while greenthread is not self.greenthread:
+                greenthread = self.greenthread
+                try:
+                    greenthread.wait()
+                except (greenlet.GreenletExit, _Stopped):
+                    pass
             self.pool.waitall()
         except KeyboardInterrupt:
             pass
@@ -293,9 +420,9 @@ class Application(BaseApplication):
                 logging.debug('Invalid tenant')
                 raise exception.Unauthorized()
 
-            # NOTE(vish): this is pretty inefficient
-            creds['roles'] = [self.identity_api.get_role(context, role)['name']
-                              for role in creds.get('roles', [])]
+            creds['roles'] = [role_ref['name'] for role_ref in
+                              self.identity_api.get_roles_by_ids(
+                                  context, creds.get('roles', []))]
             # Accept either is_admin or the admin role
             self.policy_api.enforce(context, creds, 'admin_required', {})
 
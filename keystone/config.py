@@ -172,6 +172,12 @@ def register_cli_int(*args, **kw):
     return conf.register_cli_opt(cfg.IntOpt(*args, **kw), group=group)
 
 
+def register_float(*args, **kw):
+    conf = kw.pop('conf', CONF)
+    group = kw.pop('group', None)
+    return conf.register_opt(cfg.FloatOpt(*args, **kw), group=group)
+
+
 register_cli_bool('standard-threads', default=False)
 
 register_cli_str('pydev-debug-host', default=None)
@@ -185,6 +191,8 @@ register_int('public_port', default=5000)
 register_str('public_endpoint', default='http://localhost:%(public_port)d/')
 register_str('admin_endpoint', default='http://localhost:%(admin_port)d/')
 register_str('onready')
+register_int('workers', default=0)
+register_int('graceful_shutdown_timeout', default=60)
 register_str('auth_admin_prefix', default='')
 register_str('policy_file', default='policy.json')
 register_str('policy_default_rule', default=None)
@@ -193,6 +201,8 @@ register_int('max_request_body_size', default=114688)
 register_int('max_param_size', default=64)
 # we allow tokens to be a bit larger to accommodate PKI
 register_int('max_token_size', default=8192)
+# v3 list calls never return more entries than this at once (0 for no limit)
+register_int('max_page_size', default=0)
 register_str('member_role_id',
              default='9fe2ff9ee4384b1894a90878d3e92bab')
 register_str('member_role_name', default='_member_')
@@ -201,6 +211,16 @@ register_str('member_role_name', default='_member_')
 # identity
 register_str('default_domain_id', group='identity', default='default')
 
+# cache
+register_bool('enabled', group='cache', default=False)
+register_str('backend', group='cache',
+             default='keystone.common.cache.MemoryBackend')
+register_int('max_size', group='cache', default=10000)
+register_list('method_cache_times', group='cache', default=[])
+for section in ('identity', 'catalog', 'trust'):
+    register_bool('caching', group=section, default=True)
+    register_int('cache_time', group=section, default=600)
+
 # ssl
 register_bool('enable', group='ssl', default=False)
 register_str('certfile', group='ssl', default=None)
@@ -220,6 +240,14 @@ register_str('ca_certs', group='signing',
 register_int('key_size', group='signing', default=1024)
 register_int('valid_days', group='signing', default=3650)
 register_str('ca_password', group='signing', default=None)
+register_str('signer', group='signing',
+             default='keystone.common.signing.InProcessSigner')
+register_int('worker_pool_size', group='signing', default=4)
+register_int('worker_checkout_timeout', group='signing', default=10)
+register_int('worker_timeout', group='signing', default=30)
+register_int('verified_cache_size', group='signing', default=1000)
+register_int('verified_cache_ttl', group='signing', default=300)
+register_int('credentials_check_interval', group='signing', default=5)
 
 
 # sql
@@ -253,6 +281,15 @@ register_str('dumb_member', group='ldap', default='cn=dumb,dc=nonexistent')
 register_bool('allow_subtree_delete', group='ldap', default=False)
 register_str('query_scope', group='ldap', default='one')
 register_int('page_size', group='ldap', default=0)
+register_bool('use_pool', group='ldap', default=False)
+register_int('pool_size', group='ldap', default=10)
+register_int('pool_checkout_timeout', group='ldap', default=10)
+register_int('pool_connection_lifetime', group='ldap', default=600)
+register_int('pool_retry_max', group='ldap', default=3)
+register_float('pool_retry_delay', group='ldap', default=0.1)
+register_int('cache_time', group='ldap', default=0)
+register_int('cache_size', group='ldap', default=1000)
+register_int('ids_per_search', group='ldap', default=100)
 
 register_str('user_tree_dn', group='ldap', default=None)
 register_str('user_filter', group='ldap', default=None)
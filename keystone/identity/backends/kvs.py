@@ -39,7 +39,9 @@ class Identity(kvs.Base, identity.Driver):
         except exception.UserNotFound:
             raise AssertionError('Invalid user / password')
 
-        if not utils.check_password(password, user_ref.get('password')):
+        if not utils.check_password(password,
+                                    user_ref.get('password'),
+                                    user_id):
             raise AssertionError('Invalid user / password')
 
         if tenant_id is not None:
@@ -63,10 +65,18 @@ class Identity(kvs.Base, identity.Driver):
         except exception.NotFound:
             raise exception.ProjectNotFound(project_id=tenant_id)
 
-    def list_projects(self):
+    def get_projects_by_ids(self, tenant_ids):
+        return [self.get_project(x) for x in tenant_ids]
+
+    def list_projects(self, filters=None, marker=None, limit=None,
+                      page_reverse=False):
         tenant_keys = filter(lambda x: x.startswith("tenant-"),
                              self.db.keys())
-        return [self.db.get(key) for key in tenant_keys]
+        return utils.page_refs([self.db.get(key) for key in tenant_keys],
+                               filters,
+                               marker,
+                               limit,
+                               page_reverse)
 
     def get_project_by_name(self, tenant_name, domain_id):
         try:
@@ -96,6 +106,9 @@ class Identity(kvs.Base, identity.Driver):
     def get_user(self, user_id):
         return identity.filter_user(self._get_user(user_id))
 
+    def get_users_by_ids(self, user_ids):
+        return [self.get_user(x) for x in user_ids]
+
     def get_user_by_name(self, user_name, domain_id):
         return identity.filter_user(
             self._get_user_by_name(user_name, domain_id))
@@ -126,9 +139,17 @@ class Identity(kvs.Base, identity.Driver):
         except exception.NotFound:
             raise exception.RoleNotFound(role_id=role_id)
 
-    def list_users(self):
+    def get_roles_by_ids(self, role_ids):
+        return [self.get_role(x) for x in role_ids]
+
+    def list_users(self, filters=None, marker=None, limit=None,
+                   page_reverse=False):
         user_ids = self.db.get('user_list', [])
-        return [self.get_user(x) for x in user_ids]
+        return utils.page_refs([self.get_user(x) for x in user_ids],
+                               filters,
+                               marker,
+                               limit,
+                               page_reverse)
 
     def list_roles(self):
         role_ids = self.db.get('role_list', [])
@@ -139,13 +160,21 @@ class Identity(kvs.Base, identity.Driver):
         return user_ref.get('tenants', [])
 
     def get_roles_for_user_and_project(self, user_id, tenant_id):
-        self.get_user(user_id)
+        user_ref = self._get_user(user_id)
         self.get_project(tenant_id)
-        try:
-            metadata_ref = self.get_metadata(user_id, tenant_id)
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-        return metadata_ref.get('roles', [])
+        roles = set()
+        grants = [(user_id, None)]
+        grants.extend((None, group_id)
+                      for group_id in user_ref.get('groups', []))
+        for grant_user_id, group_id in grants:
+            try:
+                metadata_ref = self.get_metadata(user_id=grant_user_id,
+                                                 tenant_id=tenant_id,
+                                                 group_id=group_id)
+            except exception.MetadataNotFound:
+                continue
+            roles.update(metadata_ref.get('roles', []))
+        return list(roles)
 
     def add_role_to_user_and_project(self, user_id, tenant_id, role_id):
         self.get_user(user_id)
@@ -273,8 +302,7 @@ class Identity(kvs.Base, identity.Driver):
 
     def list_groups_for_user(self, user_id):
         user_ref = self._get_user(user_id)
-        group_ids = user_ref.get('groups', [])
-        return [self.get_group(x) for x in group_ids]
+        return self.get_groups_by_ids(user_ref.get('groups', []))
 
     def delete_user(self, user_id):
         try:
@@ -595,9 +623,14 @@ class Identity(kvs.Base, identity.Driver):
         self.db.set('group_list', list(group_list))
         return group
 
-    def list_groups(self):
+    def list_groups(self, filters=None, marker=None, limit=None,
+                    page_reverse=False):
         group_ids = self.db.get('group_list', [])
-        return [self.get_group(x) for x in group_ids]
+        return utils.page_refs([self.get_group(x) for x in group_ids],
+                               filters,
+                               marker,
+                               limit,
+                               page_reverse)
 
     def get_group(self, group_id):
         try:
@@ -605,6 +638,9 @@ class Identity(kvs.Base, identity.Driver):
         except exception.NotFound:
             raise exception.GroupNotFound(group_id=group_id)
 
+    def get_groups_by_ids(self, group_ids):
+        return [self.get_group(x) for x in group_ids]
+
     def update_group(self, group_id, group):
         # First, make sure we are not trying to change the
         # name to one that is already in use
@@ -21,7 +21,6 @@ from ldap import filter as ldap_filter
 
 from keystone import clean
 from keystone.common import ldap as common_ldap
-from keystone.common.ldap import fakeldap
 from keystone.common import models
 from keystone.common import utils
 from keystone import config
@@ -46,16 +45,7 @@ class Identity(identity.Driver):
         self.group = GroupApi(CONF)
 
     def get_connection(self, user=None, password=None):
-        if self.LDAP_URL.startswith('fake://'):
-            conn = fakeldap.FakeLdap(self.LDAP_URL)
-        else:
-            conn = common_ldap.LdapWrapper(self.LDAP_URL)
-        if user is None:
-            user = self.LDAP_USER
-        if password is None:
-            password = self.LDAP_PASSWORD
-        conn.simple_bind_s(user, password)
-        return conn
+        return self.user.get_connection(user, password)
 
     # Identity interface
     def authenticate(self, user_id=None, tenant_id=None, password=None):
@@ -100,8 +90,12 @@ class Identity(identity.Driver):
     def get_project(self, tenant_id):
         return self.project.get(tenant_id)
 
-    def list_projects(self):
-        return self.project.get_all()
+    def get_projects_by_ids(self, tenant_ids):
+        return self.project.get_by_ids(tenant_ids)
+
+    def list_projects(self, filters=None, marker=None, limit=None,
+                      page_reverse=False):
+        return self.project.get_page(filters, marker, limit, page_reverse)
 
     def get_project_by_name(self, tenant_name, domain_id):
         # TODO(henry-nash): Use domain_id once domains are implemented
@@ -114,8 +108,13 @@ class Identity(identity.Driver):
     def get_user(self, user_id):
         return identity.filter_user(self._get_user(user_id))
 
-    def list_users(self):
-        return self.user.get_all()
+    def get_users_by_ids(self, user_ids):
+        return [identity.filter_user(user_ref)
+                for user_ref in self.user.get_by_ids(user_ids)]
+
+    def list_users(self, filters=None, marker=None, limit=None,
+                   page_reverse=False):
+        return self.user.get_page(filters, marker, limit, page_reverse)
 
     def get_user_by_name(self, user_name, domain_id):
         # TODO(henry-nash): Use domain_id once domains are implemented
@@ -134,6 +133,9 @@ class Identity(identity.Driver):
     def get_role(self, role_id):
         return self.role.get(role_id)
 
+    def get_roles_by_ids(self, role_ids):
+        return self.role.get_by_ids(role_ids)
+
     def list_roles(self):
         return self.role.get_all()
 
@@ -224,6 +226,9 @@ class Identity(identity.Driver):
     def get_group(self, group_id):
         return self.group.get(group_id)
 
+    def get_groups_by_ids(self, group_ids):
+        return self.group.get_by_ids(group_ids)
+
     def update_group(self, group_id, group):
         if 'name' in group:
             group['name'] = clean.group_name(group['name'])
@@ -390,7 +395,7 @@ class UserApi(common_ldap.EnabledEmuMixIn, common_ldap.BaseLdap, ApiShimMixin):
 
     def check_password(self, user_id, password):
         user = self.get(user_id)
-        return utils.check_password(password, user.password)
+        return utils.check_password(password, user.password, user_id)
 
 
 # TODO(termie): turn this into a data object and move logic to driver
@@ -439,12 +444,9 @@ class ProjectApi(common_ldap.EnabledEmuMixIn, common_ldap.BaseLdap,
         project_ids = set()
         for assoc in associations:
             project_ids.add(assoc.project_id)
-        projects = []
-        for project_id in project_ids:
-            #slower to get them one at a time, but a huge list could blow out
-            #the connection.  This is the safer way
-            projects.append(self.get(project_id))
-        return projects
+        # fetched [ldap] ids_per_search at a time, so a huge list doesn't
+        # blow out the connection
+        return self.get_by_ids(project_ids)
 
     def get_role_assignments(self, tenant_id):
         return self.role_api.get_role_assignments(tenant_id)
@@ -462,6 +464,8 @@ class ProjectApi(common_ldap.EnabledEmuMixIn, common_ldap.BaseLdap,
             # places, and is not part of the exposed API, it's easier for us to
             # just ignore this instead of raising exception.Conflict.
             pass
+        finally:
+            self._forget(tenant_id)
 
     def remove_user(self, tenant_id, user_id):
         conn = self.get_connection()
@@ -472,23 +476,27 @@ class ProjectApi(common_ldap.EnabledEmuMixIn, common_ldap.BaseLdap,
                             self.user_api._id_to_dn(user_id))])
         except ldap.NO_SUCH_ATTRIBUTE:
             raise exception.NotFound(user_id)
+        finally:
+            self._forget(tenant_id)
 
     def get_users(self, tenant_id, role_id=None):
         tenant = self._ldap_get(tenant_id)
-        res = set()
+        user_ids = set()
         if not role_id:
             # Get users who have default tenant mapping
             for user_dn in tenant[1].get(self.member_attribute, []):
                 if self.use_dumb_member and user_dn == self.dumb_member:
                     continue
-                res.add(self.user_api.get(self.user_api._dn_to_id(user_dn)))
+                user_ids.add(self.user_api._dn_to_id(user_dn))
 
         # Get users who are explicitly mapped via a tenant
         rolegrants = self.role_api.get_role_assignments(tenant_id)
         for rolegrant in rolegrants:
             if role_id is None or rolegrant.role_id == role_id:
-                res.add(self.user_api.get(rolegrant.user_id))
-        return list(res)
+                user_ids.add(rolegrant.user_id)
+
+        # all of them are fetched at once rather than one search per member
+        return self.user_api.get_by_ids(user_ids)
 
     def delete(self, id):
         if self.subtree_delete_enabled:
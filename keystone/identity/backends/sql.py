@@ -97,6 +97,13 @@ class Role(sql.ModelBase, sql.DictBase):
     extra = sql.Column(sql.JsonBlob())
 
 
+# role assignment types
+USER_PROJECT = 'UserProject'
+GROUP_PROJECT = 'GroupProject'
+USER_DOMAIN = 'UserDomain'
+GROUP_DOMAIN = 'GroupDomain'
+
+
 class BaseGrant(sql.DictBase):
     def to_dict(self):
         """Override parent to_dict() method with a simpler implementation.
@@ -139,6 +146,18 @@ class GroupDomainGrant(sql.ModelBase, BaseGrant):
     data = sql.Column(sql.JsonBlob())
 
 
+class RoleAssignment(sql.ModelBase, BaseGrant):
+    """A role granted to a user or group on a project or domain."""
+    __tablename__ = 'role_assignment'
+    type = sql.Column(sql.String(64), primary_key=True)
+    actor_id = sql.Column(sql.String(64), primary_key=True, index=True)
+    target_id = sql.Column(sql.String(64), primary_key=True, index=True)
+    role_id = sql.Column(sql.String(64),
+                         sql.ForeignKey('role.id'),
+                         primary_key=True,
+                         index=True)
+
+
 class UserGroupMembership(sql.ModelBase, sql.DictBase):
     """Group membership join table."""
     __tablename__ = 'user_group_membership'
@@ -150,6 +169,32 @@ class UserGroupMembership(sql.ModelBase, sql.DictBase):
                           primary_key=True)
 
 
+def _assignment(user_id=None, group_id=None, project_id=None,
+                domain_id=None):
+    """Returns the type, actor and target of a role assignment."""
+    if project_id:
+        if user_id:
+            return USER_PROJECT, user_id, project_id
+        return GROUP_PROJECT, group_id, project_id
+    if user_id:
+        return USER_DOMAIN, user_id, domain_id
+    return GROUP_DOMAIN, group_id, domain_id
+
+
+def _grant_model(user_id=None, group_id=None, project_id=None,
+                 domain_id=None):
+    """Returns the metadata model of a grant and the columns keying it."""
+    if user_id:
+        if project_id:
+            return UserProjectGrant, {'user_id': user_id,
+                                      'project_id': project_id}
+        return UserDomainGrant, {'user_id': user_id, 'domain_id': domain_id}
+    if project_id:
+        return GroupProjectGrant, {'group_id': group_id,
+                                   'project_id': project_id}
+    return GroupDomainGrant, {'group_id': group_id, 'domain_id': domain_id}
+
+
 class Identity(sql.Base, identity.Driver):
     # Internal interface to manage the database
     def db_sync(self):
@@ -167,7 +212,9 @@ class Identity(sql.Base, identity.Driver):
         https://blueprints.launchpad.net/keystone/+spec/sql-identiy-pam
 
         """
-        return utils.check_password(password, user_ref.get('password'))
+        return utils.check_password(password,
+                                    user_ref.get('password'),
+                                    user_ref.get('id'))
 
     # Identity interface
     def authenticate(self, user_id=None, tenant_id=None, password=None):
@@ -204,6 +251,24 @@ class Identity(sql.Base, identity.Driver):
                 metadata_ref = {}
         return (identity.filter_user(user_ref), tenant_ref, metadata_ref)
 
+    def _get_refs_by_ids(self, model, ids, not_found):
+        """Returns the refs of several entities, fetched in a single query.
+
+        :param not_found: called with the first id that does not exist, to
+                          build the exception raised for it
+
+        """
+        ids = list(ids)
+        refs = {}
+        if ids:
+            session = self.get_session()
+            query = session.query(model).filter(model.id.in_(set(ids)))
+            refs = dict((ref.id, ref.to_dict()) for ref in query)
+        for ref_id in ids:
+            if ref_id not in refs:
+                raise not_found(ref_id)
+        return [refs[ref_id] for ref_id in ids]
+
     def get_project(self, tenant_id):
         session = self.get_session()
         tenant_ref = session.query(Project).filter_by(id=tenant_id).first()
@@ -211,6 +276,11 @@ class Identity(sql.Base, identity.Driver):
             raise exception.ProjectNotFound(project_id=tenant_id)
         return tenant_ref.to_dict()
 
+    def get_projects_by_ids(self, tenant_ids):
+        return self._get_refs_by_ids(
+            Project, tenant_ids,
+            lambda x: exception.ProjectNotFound(project_id=x))
+
     def get_project_by_name(self, tenant_name, domain_id):
         session = self.get_session()
         query = session.query(Project)
@@ -226,37 +296,55 @@ class Identity(sql.Base, identity.Driver):
         session = self.get_session()
         self.get_project(tenant_id)
         query = session.query(User)
-        query = query.join(UserProjectGrant)
-        query = query.filter(UserProjectGrant.project_id == tenant_id)
-        user_refs = query.all()
+        query = query.join(RoleAssignment,
+                           RoleAssignment.actor_id == User.id)
+        query = query.filter(RoleAssignment.type == USER_PROJECT)
+        query = query.filter(RoleAssignment.target_id == tenant_id)
+        user_refs = query.distinct().all()
         return [identity.filter_user(user_ref.to_dict())
                 for user_ref in user_refs]
 
+    def _assignments(self, session, user_id=None, group_id=None,
+                     project_id=None, domain_id=None):
+        """Returns a query for the roles assigned by one grant."""
+        assignment_type, actor_id, target_id = _assignment(
+            user_id, group_id, project_id, domain_id)
+        query = session.query(RoleAssignment)
+        query = query.filter_by(type=assignment_type)
+        query = query.filter_by(actor_id=actor_id)
+        return query.filter_by(target_id=target_id)
+
+    def _set_assignments(self, session, role_ids, **grant):
+        """Makes role_ids the roles assigned by a grant."""
+        query = self._assignments(session, **grant)
+        existing = set(x.role_id for x in query)
+        role_ids = set(role_ids)
+        stale = existing - role_ids
+        if stale:
+            query.filter(RoleAssignment.role_id.in_(stale)).delete(False)
+        assignment_type, actor_id, target_id = _assignment(**grant)
+        for role_id in role_ids - existing:
+            session.add(RoleAssignment(type=assignment_type,
+                                       actor_id=actor_id,
+                                       target_id=target_id,
+                                       role_id=role_id))
+
     def get_metadata(self, user_id=None, tenant_id=None,
                      domain_id=None, group_id=None):
         session = self.get_session()
-
-        if user_id:
-            if tenant_id:
-                q = session.query(UserProjectGrant)
-                q = q.filter_by(project_id=tenant_id)
-            elif domain_id:
-                q = session.query(UserDomainGrant)
-                q = q.filter_by(domain_id=domain_id)
-            q = q.filter_by(user_id=user_id)
-        elif group_id:
-            if tenant_id:
-                q = session.query(GroupProjectGrant)
-                q = q.filter_by(project_id=tenant_id)
-            elif domain_id:
-                q = session.query(GroupDomainGrant)
-                q = q.filter_by(domain_id=domain_id)
-            q = q.filter_by(group_id=group_id)
-        try:
-            return q.one().data
-        except sql.NotFound:
+        grant = dict(user_id=user_id, group_id=group_id,
+                     project_id=tenant_id, domain_id=domain_id)
+        model, keys = _grant_model(**grant)
+        metadata_ref = session.query(model).filter_by(**keys).first()
+        role_ids = [x.role_id for x in self._assignments(session, **grant)]
+        if metadata_ref is None and not role_ids:
             raise exception.MetadataNotFound()
 
+        data = dict(metadata_ref.data or {}) if metadata_ref else {}
+        if role_ids:
+            data['roles'] = role_ids
+        return data
+
     def create_grant(self, role_id, user_id=None, group_id=None,
                      domain_id=None, project_id=None):
 
@@ -270,22 +358,15 @@ class Identity(sql.Base, identity.Driver):
         if project_id:
             self.get_project(project_id)
 
-        try:
-            metadata_ref = self.get_metadata(user_id, project_id,
-                                             domain_id, group_id)
-            is_new = False
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-            is_new = True
-        roles = set(metadata_ref.get('roles', []))
-        roles.add(role_id)
-        metadata_ref['roles'] = list(roles)
-        if is_new:
-            self.create_metadata(user_id, project_id, metadata_ref,
-                                 domain_id, group_id)
-        else:
-            self.update_metadata(user_id, project_id, metadata_ref,
-                                 domain_id, group_id)
+        session = self.get_session()
+        assignment_type, actor_id, target_id = _assignment(
+            user_id, group_id, project_id, domain_id)
+        with session.begin():
+            session.merge(RoleAssignment(type=assignment_type,
+                                         actor_id=actor_id,
+                                         target_id=target_id,
+                                         role_id=role_id))
+            session.flush()
 
     def list_grants(self, user_id=None, group_id=None,
                     domain_id=None, project_id=None):
@@ -298,12 +379,14 @@ class Identity(sql.Base, identity.Driver):
         if project_id:
             self.get_project(project_id)
 
-        try:
-            metadata_ref = self.get_metadata(user_id, project_id,
-                                             domain_id, group_id)
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-        return [self.get_role(x) for x in metadata_ref.get('roles', [])]
+        session = self.get_session()
+        assignment_type, actor_id, target_id = _assignment(
+            user_id, group_id, project_id, domain_id)
+        query = session.query(Role).join(RoleAssignment)
+        query = query.filter(RoleAssignment.type == assignment_type)
+        query = query.filter(RoleAssignment.actor_id == actor_id)
+        query = query.filter(RoleAssignment.target_id == target_id)
+        return [role_ref.to_dict() for role_ref in query]
 
     def get_grant(self, role_id, user_id=None, group_id=None,
                   domain_id=None, project_id=None):
@@ -317,13 +400,10 @@ class Identity(sql.Base, identity.Driver):
         if project_id:
             self.get_project(project_id)
 
-        try:
-            metadata_ref = self.get_metadata(user_id, project_id,
-                                             domain_id, group_id)
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-        role_ids = set(metadata_ref.get('roles', []))
-        if role_id not in role_ids:
+        session = self.get_session()
+        query = self._assignments(session, user_id, group_id,
+                                  project_id, domain_id)
+        if query.filter_by(role_id=role_id).first() is None:
             raise exception.RoleNotFound(role_id=role_id)
         return self.get_role(role_id)
 
@@ -339,132 +419,105 @@ class Identity(sql.Base, identity.Driver):
         if project_id:
             self.get_project(project_id)
 
-        try:
-            metadata_ref = self.get_metadata(user_id, project_id,
-                                             domain_id, group_id)
-            is_new = False
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-            is_new = True
-        roles = set(metadata_ref.get('roles', []))
-        try:
-            roles.remove(role_id)
-        except KeyError:
-            raise exception.RoleNotFound(role_id=role_id)
-        metadata_ref['roles'] = list(roles)
-        if is_new:
-            self.create_metadata(user_id, project_id, metadata_ref,
-                                 domain_id, group_id)
-        else:
-            self.update_metadata(user_id, project_id, metadata_ref,
-                                 domain_id, group_id)
+        session = self.get_session()
+        with session.begin():
+            query = self._assignments(session, user_id, group_id,
+                                      project_id, domain_id)
+            if not query.filter_by(role_id=role_id).delete(False):
+                raise exception.RoleNotFound(role_id=role_id)
+            session.flush()
 
-    def list_projects(self):
+    def list_projects(self, filters=None, marker=None, limit=None,
+                      page_reverse=False):
         session = self.get_session()
-        tenant_refs = session.query(Project).all()
+        tenant_refs = sql.filter_and_page(session.query(Project),
+                                          Project,
+                                          filters,
+                                          marker,
+                                          limit,
+                                          page_reverse)
         return [tenant_ref.to_dict() for tenant_ref in tenant_refs]
 
     def get_projects_for_user(self, user_id):
         session = self.get_session()
         self.get_user(user_id)
-        query = session.query(UserProjectGrant)
-        query = query.filter_by(user_id=user_id)
-        membership_refs = query.all()
-        return [x.project_id for x in membership_refs]
-
-    def _get_user_group_project_roles(self, metadata_ref, user_id, project_id):
-        group_refs = self.list_groups_for_user(user_id=user_id)
-        for x in group_refs:
-            try:
-                metadata_ref.update(
-                    self.get_metadata(group_id=x['id'],
-                                      tenant_id=project_id))
-            except exception.MetadataNotFound:
-                # no group grant, skip
-                pass
+        query = session.query(RoleAssignment.target_id)
+        query = query.filter_by(type=USER_PROJECT)
+        query = query.filter_by(actor_id=user_id)
+        return [x.target_id for x in query.distinct()]
 
-    def _get_user_project_roles(self, metadata_ref, user_id, project_id):
-        try:
-            metadata_ref.update(self.get_metadata(user_id, project_id))
-        except exception.MetadataNotFound:
-            pass
+    def _get_roles_for_user(self, user_id, user_type, group_type, target_id):
+        """Returns the union of the roles granted to a user on a target.
 
-    def _get_user_group_domain_roles(self, metadata_ref, user_id, domain_id):
-        group_refs = self.list_groups_for_user(user_id=user_id)
-        for x in group_refs:
-            try:
-                metadata_ref.update(
-                    self.get_metadata(group_id=x['id'],
-                                      domain_id=domain_id))
-            except exception.MetadataNotFound:
-                # no group grant, skip
-                pass
+        The roles assigned to the user and to every group the user belongs
+        to are fetched together in a single query.
 
-    def _get_user_domain_roles(self, metadata_ref, user_id, domain_id):
-        try:
-            metadata_ref.update(self.get_metadata(user_id,
-                                                  domain_id=domain_id))
-        except exception.MetadataNotFound:
-            pass
+        """
+        session = self.get_session()
+        group_ids = session.query(UserGroupMembership.group_id)
+        group_ids = group_ids.filter_by(user_id=user_id)
+        query = session.query(RoleAssignment.role_id)
+        query = query.filter(RoleAssignment.target_id == target_id)
+        query = query.filter(sql.or_(
+            sql.and_(RoleAssignment.type == user_type,
+                     RoleAssignment.actor_id == user_id),
+            sql.and_(RoleAssignment.type == group_type,
+                     RoleAssignment.actor_id.in_(group_ids.subquery()))))
+        return [x.role_id for x in query.distinct()]
 
     def get_roles_for_user_and_project(self, user_id, tenant_id):
-        self.get_user(user_id)
-        self.get_project(tenant_id)
-        metadata_ref = {}
-        self._get_user_project_roles(metadata_ref, user_id, tenant_id)
-        self._get_user_group_project_roles(metadata_ref, user_id, tenant_id)
-        return list(set(metadata_ref.get('roles', [])))
+        roles = self._get_roles_for_user(user_id,
+                                         USER_PROJECT,
+                                         GROUP_PROJECT,
+                                         tenant_id)
+        if not roles:
+            # assignments are removed along with their user and project,
+            # so only an empty result needs to tell them apart from missing
+            # ones
+            self.get_user(user_id)
+            self.get_project(tenant_id)
+        return roles
 
     def get_roles_for_user_and_domain(self, user_id, domain_id):
-        self.get_user(user_id)
-        self.get_domain(domain_id)
-        metadata_ref = {}
-        self._get_user_domain_roles(metadata_ref, user_id, domain_id)
-        self._get_user_group_domain_roles(metadata_ref, user_id, domain_id)
-        return list(set(metadata_ref.get('roles', [])))
+        roles = self._get_roles_for_user(user_id,
+                                         USER_DOMAIN,
+                                         GROUP_DOMAIN,
+                                         domain_id)
+        if not roles:
+            self.get_user(user_id)
+            self.get_domain(domain_id)
+        return roles
 
     def add_role_to_user_and_project(self, user_id, tenant_id, role_id):
         self.get_user(user_id)
         self.get_project(tenant_id)
         self.get_role(role_id)
-        try:
-            metadata_ref = self.get_metadata(user_id, tenant_id)
-            is_new = False
-        except exception.MetadataNotFound:
-            metadata_ref = {}
-            is_new = True
-        roles = set(metadata_ref.get('roles', []))
-        if role_id in roles:
+        session = self.get_session()
+        query = self._assignments(session,
+                                  user_id=user_id,
+                                  project_id=tenant_id)
+        if query.filter_by(role_id=role_id).first() is not None:
             msg = ('User %s already has role %s in tenant %s'
                    % (user_id, role_id, tenant_id))
             raise exception.Conflict(type='role grant', details=msg)
-        roles.add(role_id)
-        metadata_ref['roles'] = list(roles)
-        if is_new:
-            self.create_metadata(user_id, tenant_id, metadata_ref)
-        else:
-            self.update_metadata(user_id, tenant_id, metadata_ref)
+        with session.begin():
+            session.add(RoleAssignment(type=USER_PROJECT,
+                                       actor_id=user_id,
+                                       target_id=tenant_id,
+                                       role_id=role_id))
+            session.flush()
 
     def remove_role_from_user_and_project(self, user_id, tenant_id, role_id):
-        try:
-            metadata_ref = self.get_metadata(user_id, tenant_id)
-            roles = set(metadata_ref.get('roles', []))
-            if role_id not in roles:
+        session = self.get_session()
+        with session.begin():
+            query = self._assignments(session,
+                                      user_id=user_id,
+                                      project_id=tenant_id)
+            if not query.filter_by(role_id=role_id).delete(False):
                 msg = _('Cannot remove role that has not been granted, %s' %
                         role_id)
                 raise exception.RoleNotFound(message=msg)
-            roles.remove(role_id)
-            metadata_ref['roles'] = list(roles)
-            if len(roles):
-                self.update_metadata(user_id, tenant_id, metadata_ref)
-            else:
-                session = self.get_session()
-                q = session.query(UserProjectGrant)
-                q = q.filter_by(project_id=tenant_id)
-                q.delete()
-        except exception.MetadataNotFound:
-            msg = 'Cannot remove role that has not been granted, %s' % role_id
-            raise exception.RoleNotFound(message=msg)
+            session.flush()
 
     # CRUD
     @sql.handle_conflicts(type='project')
@@ -510,8 +563,10 @@ class Identity(sql.Base, identity.Driver):
             raise exception.ProjectNotFound(project_id=tenant_id)
 
         with session.begin():
-            q = session.query(UserProjectGrant)
-            q = q.filter_by(project_id=tenant_id)
+            q = session.query(RoleAssignment)
+            q = q.filter(RoleAssignment.type.in_([USER_PROJECT,
+                                                  GROUP_PROJECT]))
+            q = q.filter_by(target_id=tenant_id)
             q.delete(False)
 
             q = session.query(UserProjectGrant)
@@ -532,55 +587,35 @@ class Identity(sql.Base, identity.Driver):
     @sql.handle_conflicts(type='metadata')
     def create_metadata(self, user_id, tenant_id, metadata,
                         domain_id=None, group_id=None):
+        grant = dict(user_id=user_id, group_id=group_id,
+                     project_id=tenant_id, domain_id=domain_id)
+        model, keys = _grant_model(**grant)
+        # roles are kept as role assignments, everything else as is
+        data = dict((k, v) for k, v in metadata.iteritems() if k != 'roles')
         session = self.get_session()
         with session.begin():
-            if user_id:
-                if tenant_id:
-                    session.add(UserProjectGrant(user_id=user_id,
-                                                 project_id=tenant_id,
-                                                 data=metadata))
-                elif domain_id:
-                    session.add(UserDomainGrant(user_id=user_id,
-                                                domain_id=domain_id,
-                                                data=metadata))
-            elif group_id:
-                if tenant_id:
-                    session.add(GroupProjectGrant(group_id=group_id,
-                                                  project_id=tenant_id,
-                                                  data=metadata))
-                elif domain_id:
-                    session.add(GroupDomainGrant(group_id=group_id,
-                                                 domain_id=domain_id,
-                                                 data=metadata))
+            session.add(model(data=data, **keys))
+            if 'roles' in metadata:
+                self._set_assignments(session, metadata['roles'], **grant)
             session.flush()
         return metadata
 
     @sql.handle_conflicts(type='metadata')
     def update_metadata(self, user_id, tenant_id, metadata,
                         domain_id=None, group_id=None):
+        grant = dict(user_id=user_id, group_id=group_id,
+                     project_id=tenant_id, domain_id=domain_id)
+        model, keys = _grant_model(**grant)
         session = self.get_session()
         with session.begin():
-            if user_id:
-                if tenant_id:
-                    q = session.query(UserProjectGrant)
-                    q = q.filter_by(user_id=user_id)
-                    q = q.filter_by(project_id=tenant_id)
-                elif domain_id:
-                    q = session.query(UserDomainGrant)
-                    q = q.filter_by(user_id=user_id)
-                    q = q.filter_by(domain_id=domain_id)
-            elif group_id:
-                if tenant_id:
-                    q = session.query(GroupProjectGrant)
-                    q = q.filter_by(group_id=group_id)
-                    q = q.filter_by(project_id=tenant_id)
-                elif domain_id:
-                    q = session.query(GroupDomainGrant)
-                    q = q.filter_by(group_id=group_id)
-                    q = q.filter_by(domain_id=domain_id)
-            metadata_ref = q.first()
-            data = metadata_ref.data.copy()
+            metadata_ref = session.query(model).filter_by(**keys).first()
+            if metadata_ref is None:
+                metadata_ref = model(data={}, **keys)
+                session.add(metadata_ref)
+            data = dict(metadata_ref.data or {})
             data.update(metadata)
+            if 'roles' in data:
+                self._set_assignments(session, data.pop('roles'), **grant)
             metadata_ref.data = data
             session.flush()
         return metadata_ref
@@ -641,17 +676,21 @@ class Identity(sql.Base, identity.Driver):
         if not ref:
             raise exception.DomainNotFound(domain_id=domain_id)
         with session.begin():
+            q = session.query(RoleAssignment)
+            q = q.filter(RoleAssignment.type.in_([USER_DOMAIN, GROUP_DOMAIN]))
+            q = q.filter_by(target_id=domain_id)
+            q.delete(False)
+
             session.delete(ref)
             session.flush()
 
     def list_user_projects(self, user_id):
         session = self.get_session()
         user = self.get_user(user_id)
-        metadata_refs = session\
-            .query(UserProjectGrant)\
-            .filter_by(user_id=user_id)
-        project_ids = set([x.project_id for x in metadata_refs
-                           if x.data.get('roles')])
+        query = session.query(RoleAssignment.target_id)
+        query = query.filter_by(type=USER_PROJECT)
+        query = query.filter_by(actor_id=user_id)
+        project_ids = set([x.target_id for x in query])
         if user.get('project_id'):
             project_ids.add(user['project_id'])
 
@@ -659,7 +698,7 @@ class Identity(sql.Base, identity.Driver):
         if user.get('tenant_id'):
             project_ids.add(user['tenant_id'])
 
-        return [self.get_project(x) for x in project_ids]
+        return self.get_projects_by_ids(project_ids)
 
     # user crud
 
@@ -674,9 +713,15 @@ class Identity(sql.Base, identity.Driver):
             session.flush()
         return identity.filter_user(user_ref.to_dict())
 
-    def list_users(self):
+    def list_users(self, filters=None, marker=None, limit=None,
+                   page_reverse=False):
         session = self.get_session()
-        user_refs = session.query(User)
+        user_refs = sql.filter_and_page(session.query(User),
+                                        User,
+                                        filters,
+                                        marker,
+                                        limit,
+                                        page_reverse)
         return [identity.filter_user(x.to_dict()) for x in user_refs]
 
     def _get_user(self, user_id):
@@ -700,6 +745,11 @@ class Identity(sql.Base, identity.Driver):
     def get_user(self, user_id):
         return identity.filter_user(self._get_user(user_id))
 
+    def get_users_by_ids(self, user_ids):
+        user_refs = self._get_refs_by_ids(
+            User, user_ids, lambda x: exception.UserNotFound(user_id=x))
+        return [identity.filter_user(user_ref) for user_ref in user_refs]
+
     def get_user_by_name(self, user_name, domain_id):
         return identity.filter_user(
             self._get_user_by_name(user_name, domain_id))
@@ -774,7 +824,7 @@ class Identity(sql.Base, identity.Driver):
         query = session.query(UserGroupMembership)
         query = query.filter_by(user_id=user_id)
         membership_refs = query.all()
-        return [self.get_group(x.group_id) for x in membership_refs]
+        return self.get_groups_by_ids([x.group_id for x in membership_refs])
 
     def list_users_in_group(self, group_id):
         session = self.get_session()
@@ -782,7 +832,7 @@ class Identity(sql.Base, identity.Driver):
         query = session.query(UserGroupMembership)
         query = query.filter_by(group_id=group_id)
         membership_refs = query.all()
-        return [self.get_user(x.user_id) for x in membership_refs]
+        return self.get_users_by_ids([x.user_id for x in membership_refs])
 
     def delete_user(self, user_id):
         session = self.get_session()
@@ -793,6 +843,10 @@ class Identity(sql.Base, identity.Driver):
             raise exception.UserNotFound(user_id=user_id)
 
         with session.begin():
+            q = session.query(RoleAssignment)
+            q = q.filter(RoleAssignment.type.in_([USER_PROJECT, USER_DOMAIN]))
+            q = q.filter_by(actor_id=user_id)
+            q.delete(False)
 
             q = session.query(UserProjectGrant)
             q = q.filter_by(user_id=user_id)
@@ -823,9 +877,15 @@ class Identity(sql.Base, identity.Driver):
             session.flush()
         return ref.to_dict()
 
-    def list_groups(self):
+    def list_groups(self, filters=None, marker=None, limit=None,
+                    page_reverse=False):
         session = self.get_session()
-        refs = session.query(Group).all()
+        refs = sql.filter_and_page(session.query(Group),
+                                   Group,
+                                   filters,
+                                   marker,
+                                   limit,
+                                   page_reverse)
         return [ref.to_dict() for ref in refs]
 
     def _get_group(self, group_id):
@@ -838,6 +898,10 @@ class Identity(sql.Base, identity.Driver):
     def get_group(self, group_id):
         return self._get_group(group_id)
 
+    def get_groups_by_ids(self, group_ids):
+        return self._get_refs_by_ids(
+            Group, group_ids, lambda x: exception.GroupNotFound(group_id=x))
+
     @sql.handle_conflicts(type='group')
     def update_group(self, group_id, group):
         session = self.get_session()
@@ -866,6 +930,12 @@ class Identity(sql.Base, identity.Driver):
             raise exception.GroupNotFound(group_id=group_id)
 
         with session.begin():
+            q = session.query(RoleAssignment)
+            q = q.filter(RoleAssignment.type.in_([GROUP_PROJECT,
+                                                  GROUP_DOMAIN]))
+            q = q.filter_by(actor_id=group_id)
+            q.delete(False)
+
             q = session.query(GroupProjectGrant)
             q = q.filter_by(group_id=group_id)
             q.delete(False)
@@ -895,9 +965,15 @@ class Identity(sql.Base, identity.Driver):
             session.flush()
         return ref.to_dict()
 
-    def list_credentials(self):
+    def list_credentials(self, filters=None, marker=None, limit=None,
+                         page_reverse=False):
         session = self.get_session()
-        refs = session.query(Credential).all()
+        refs = sql.filter_and_page(session.query(Credential),
+                                   Credential,
+                                   filters,
+                                   marker,
+                                   limit,
+                                   page_reverse)
         return [ref.to_dict() for ref in refs]
 
     def get_credential(self, credential_id):
@@ -960,6 +1036,10 @@ class Identity(sql.Base, identity.Driver):
             raise exception.RoleNotFound(role_id=role_id)
         return ref.to_dict()
 
+    def get_roles_by_ids(self, role_ids):
+        return self._get_refs_by_ids(
+            Role, role_ids, lambda x: exception.RoleNotFound(role_id=x))
+
     @sql.handle_conflicts(type='role')
     def update_role(self, role_id, role):
         session = self.get_session()
@@ -987,15 +1067,9 @@ class Identity(sql.Base, identity.Driver):
             raise exception.RoleNotFound(role_id=role_id)
 
         with session.begin():
-            for metadata_ref in session.query(UserProjectGrant):
-                metadata = metadata_ref.to_dict()
-                try:
-                    self.remove_role_from_user_and_project(
-                        metadata['user_id'], metadata['project_id'], role_id)
-                except exception.RoleNotFound:
-                    pass
-
-            # FIXME(dolph): user-domain metadata needs to be updated
+            q = session.query(RoleAssignment)
+            q = q.filter_by(role_id=role_id)
+            q.delete(False)
 
             if not session.query(Role).filter_by(id=role_id).delete():
                 raise exception.RoleNotFound(role_id=role_id)
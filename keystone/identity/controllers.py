@@ -164,14 +164,12 @@ class Tenant(controller.V2Controller):
 def delete_tokens_for_user(context, token_api, trust_api, user_id):
     try:
         #First delete tokens that could get other tokens.
-        for token_id in token_api.list_tokens(context, user_id):
-            token_api.delete_token(context, token_id)
+        token_api.revoke_tokens(context, user_id=user_id)
         #now delete trust tokens
         for trust in trust_api.list_trusts_for_trustee(context, user_id):
-            token_list = token_api.list_tokens(context, user_id,
-                                               trust_id=trust['id'])
-            for token in token_list:
-                token_api.delete_token(context, token)
+            token_api.revoke_tokens(context,
+                                    user_id=user_id,
+                                    trust_id=trust['id'])
     except exception.NotImplemented:
         # The users status has been changed but tokens remain valid for
         # backends that can't list tokens for users
@@ -275,8 +273,7 @@ class Role(controller.V2Controller):
 
         roles = self.identity_api.get_roles_for_user_and_project(
             context, user_id, tenant_id)
-        return {'roles': [self.identity_api.get_role(context, x)
-                          for x in roles]}
+        return {'roles': self.identity_api.get_roles_by_ids(context, roles)}
 
     # CRUD extension
     def get_role(self, context, role_id):
@@ -441,31 +438,28 @@ class DomainV3(controller.V3Controller):
 
         # disable owned users & projects when the API user specifically set
         #     enabled=False
-        # FIXME(dolph): need a driver call to directly revoke all tokens by
-        #               project or domain, regardless of user
         if not domain.get('enabled', True):
             projects = [x for x in self.identity_api.list_projects(context)
                         if x.get('domain_id') == domain_id]
-            for user in self.identity_api.list_users(context):
-                # TODO(dolph): disable domain-scoped tokens
-                """
-                self.token_api.revoke_tokens(
-                    context,
-                    user_id=user['id'],
-                    domain_id=domain_id)
-                """
-                # revoke all tokens for users owned by this domain
+            users = self.identity_api.list_users(context)
+            # TODO(dolph): disable domain-scoped tokens
+            # revoke all tokens for users owned by this domain
+            for user in users:
                 if user.get('domain_id') == domain_id:
-                    self.token_api.revoke_tokens(
-                        context,
-                        user_id=user['id'])
-                else:
-                    # only revoke tokens on projects owned by this domain
-                    for project in projects:
-                        self.token_api.revoke_tokens(
-                            context,
-                            user_id=user['id'],
-                            tenant_id=project['id'])
+                    self.token_api.revoke_tokens(context, user_id=user['id'])
+            # only revoke other users' tokens on projects owned by this domain
+            for project in projects:
+                try:
+                    self.token_api.revoke_tokens(context,
+                                                 tenant_id=project['id'])
+                except exception.NotImplemented:
+                    # the backend can only find tokens through their user
+                    for user in users:
+                        if user.get('domain_id') != domain_id:
+                            self.token_api.revoke_tokens(
+                                context,
+                                user_id=user['id'],
+                                tenant_id=project['id'])
 
         return DomainV3.wrap_member(context, ref)
 
@@ -504,8 +498,9 @@ class ProjectV3(controller.V3Controller):
 
     @controller.filterprotected('domain_id', 'enabled', 'name')
     def list_projects(self, context, filters):
-        refs = self.identity_api.list_projects(context)
-        return ProjectV3.wrap_collection(context, refs, filters)
+        hints = ProjectV3.list_hints(context, filters)
+        refs = self.identity_api.list_projects(context, **hints)
+        return ProjectV3.wrap_collection(context, refs, hints=hints)
 
     @controller.filterprotected('enabled', 'name')
     def list_user_projects(self, context, filters, user_id):
@@ -542,8 +537,9 @@ class UserV3(controller.V3Controller):
 
     @controller.filterprotected('domain_id', 'email', 'enabled', 'name')
     def list_users(self, context, filters):
-        refs = self.identity_api.list_users(context)
-        return UserV3.wrap_collection(context, refs, filters)
+        hints = UserV3.list_hints(context, filters)
+        refs = self.identity_api.list_users(context, **hints)
+        return UserV3.wrap_collection(context, refs, hints=hints)
 
     @controller.filterprotected('domain_id', 'email', 'enabled', 'name')
     def list_users_in_group(self, context, filters, group_id):
@@ -601,8 +597,9 @@ class GroupV3(controller.V3Controller):
 
     @controller.filterprotected('domain_id', 'name')
     def list_groups(self, context, filters):
-        refs = self.identity_api.list_groups(context)
-        return GroupV3.wrap_collection(context, refs, filters)
+        hints = GroupV3.list_hints(context, filters)
+        refs = self.identity_api.list_groups(context, **hints)
+        return GroupV3.wrap_collection(context, refs, hints=hints)
 
     @controller.filterprotected('name')
     def list_groups_for_user(self, context, filters, user_id):
@@ -636,10 +633,11 @@ class CredentialV3(controller.V3Controller):
         ref = self.identity_api.create_credential(context, ref['id'], ref)
         return CredentialV3.wrap_member(context, ref)
 
-    @controller.protected
-    def list_credentials(self, context):
-        refs = self.identity_api.list_credentials(context)
-        return CredentialV3.wrap_collection(context, refs)
+    @controller.filterprotected('user_id')
+    def list_credentials(self, context, filters):
+        hints = CredentialV3.list_hints(context, filters)
+        refs = self.identity_api.list_credentials(context, **hints)
+        return CredentialV3.wrap_collection(context, refs, hints=hints)
 
     @controller.protected
     def get_credential(self, context, credential_id):
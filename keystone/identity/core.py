@@ -58,6 +58,24 @@ class Manager(manager.Manager):
 
     """
 
+    cache_namespace = 'identity'
+    cached_methods = ('get_user',
+                      'get_user_by_name',
+                      'get_users_by_ids',
+                      'get_project',
+                      'get_project_by_name',
+                      'get_projects_by_ids',
+                      'get_projects_for_user',
+                      'get_domain',
+                      'get_domain_by_name',
+                      'get_group',
+                      'get_groups_by_ids',
+                      'get_role',
+                      'get_roles_by_ids',
+                      'get_roles_for_user_and_project',
+                      'get_roles_for_user_and_domain',
+                      'get_metadata')
+
     def __init__(self):
         super(Manager, self).__init__(CONF.identity.driver)
 
@@ -81,6 +99,29 @@ class Manager(manager.Manager):
             tenant['description'] = ''
         return self.driver.create_project(tenant_id, tenant)
 
+    def _get_by_ids(self, name, get, ids):
+        if not ids:
+            return []
+        try:
+            return getattr(self.driver, name)(ids)
+        except exception.NotImplemented:
+            # drivers without batch lookups are asked for one at a time
+            return [getattr(self.driver, get)(x) for x in ids]
+
+    def get_users_by_ids(self, context, user_ids):
+        return self._get_by_ids('get_users_by_ids', 'get_user', user_ids)
+
+    def get_projects_by_ids(self, context, tenant_ids):
+        return self._get_by_ids('get_projects_by_ids',
+                                'get_project',
+                                tenant_ids)
+
+    def get_groups_by_ids(self, context, group_ids):
+        return self._get_by_ids('get_groups_by_ids', 'get_group', group_ids)
+
+    def get_roles_by_ids(self, context, role_ids):
+        return self._get_by_ids('get_roles_by_ids', 'get_role', role_ids)
+
 
 class Driver(object):
     """Interface description for an Identity driver."""
@@ -103,6 +144,15 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def get_projects_by_ids(self, tenant_ids):
+        """Get several projects by ID at once.
+
+        :returns: a list of tenant_refs, in the order of tenant_ids.
+        :raises: keystone.exception.ProjectNotFound
+
+        """
+        raise exception.NotImplemented()
+
     def get_project_by_name(self, tenant_name, domain_id):
         """Get a tenant by name.
 
@@ -166,6 +216,8 @@ class Driver(object):
     def get_roles_for_user_and_project(self, user_id, tenant_id):
         """Get the roles associated with a user within given tenant.
 
+        Roles granted to any group the user belongs to are included.
+
         :returns: a list of role ids.
         :raises: keystone.exception.UserNotFound,
                  keystone.exception.ProjectNotFound
@@ -176,6 +228,8 @@ class Driver(object):
     def get_roles_for_user_and_domain(self, user_id, domain_id):
         """Get the roles associated with a user within given domain.
 
+        Roles granted to any group the user belongs to are included.
+
         :returns: a list of role ids.
         :raises: keystone.exception.UserNotFound,
                  keystone.exception.ProjectNotFound
@@ -318,8 +372,12 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_projects(self):
-        """List all projects in the system.
+    def list_projects(self, filters=None, marker=None, limit=None,
+                      page_reverse=False):
+        """List projects in the system.
+
+        Only the page of matching projects described by the filters and page
+        arguments is returned, see :func:`keystone.common.utils.page_refs`.
 
         :returns: a list of project_refs or an empty list.
 
@@ -370,8 +428,12 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_users(self):
-        """List all users in the system.
+    def list_users(self, filters=None, marker=None, limit=None,
+                   page_reverse=False):
+        """List users in the system.
+
+        Only the page of matching users described by the filters and page
+        arguments is returned, see :func:`keystone.common.utils.page_refs`.
 
         :returns: a list of user_refs or an empty list.
 
@@ -395,6 +457,15 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def get_users_by_ids(self, user_ids):
+        """Get several users by ID at once.
+
+        :returns: a list of user_refs, in the order of user_ids.
+        :raises: keystone.exception.UserNotFound
+
+        """
+        raise exception.NotImplemented()
+
     def update_user(self, user_id, user):
         """Updates an existing user.
 
@@ -448,8 +519,12 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_credentials(self):
-        """List all credentials in the system.
+    def list_credentials(self, filters=None, marker=None, limit=None,
+                         page_reverse=False):
+        """List credentials in the system.
+
+        Only the page of matching credentials described by the filters and page
+        arguments is returned, see :func:`keystone.common.utils.page_refs`.
 
         :returns: a list of credential_refs or an empty list.
 
@@ -509,6 +584,15 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def get_roles_by_ids(self, role_ids):
+        """Get several roles by ID at once.
+
+        :returns: a list of role_refs, in the order of role_ids.
+        :raises: keystone.exception.RoleNotFound
+
+        """
+        raise exception.NotImplemented()
+
     def update_role(self, role_id, role):
         """Updates an existing role.
 
@@ -536,8 +620,12 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def list_groups(self):
-        """List all groups in the system.
+    def list_groups(self, filters=None, marker=None, limit=None,
+                    page_reverse=False):
+        """List groups in the system.
+
+        Only the page of matching groups described by the filters and page
+        arguments is returned, see :func:`keystone.common.utils.page_refs`.
 
         :returns: a list of group_refs or an empty list.
 
@@ -561,6 +649,15 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
+    def get_groups_by_ids(self, group_ids):
+        """Get several groups by ID at once.
+
+        :returns: a list of group_refs, in the order of group_ids.
+        :raises: keystone.exception.GroupNotFound
+
+        """
+        raise exception.NotImplemented()
+
     def update_group(self, group_id, group):
         """Updates an existing group.
 
@@ -30,13 +30,26 @@ from keystone import trust
 
 LOG = logging.getLogger(__name__)
 
-DRIVERS = dict(
-    catalog_api=catalog.Manager(),
-    ec2_api=ec2.Manager(),
-    identity_api=identity.Manager(),
-    policy_api=policy.Manager(),
-    token_api=token.Manager(),
-    trust_api=trust.Manager())
+DRIVERS = {}
+
+
+def load_drivers():
+    """Build the managers of every backend from the current configuration.
+
+    Each manager registers itself as a dependency, so applications built
+    afterwards use the new managers while those built before keep theirs.
+
+    """
+    DRIVERS.update(catalog_api=catalog.Manager(),
+                   ec2_api=ec2.Manager(),
+                   identity_api=identity.Manager(),
+                   policy_api=policy.Manager(),
+                   token_api=token.Manager(),
+                   trust_api=trust.Manager())
+    return DRIVERS
+
+
+load_drivers()
 
 
 @logging.fail_gracefully
@@ -59,6 +59,41 @@ class Token(kvs.Base, token.Driver):
         except exception.NotFound:
             raise exception.TokenNotFound(token_id=token_id)
 
+    def revoke_tokens(self, user_id=None, tenant_id=None, trust_id=None,
+                      token_ids=None):
+        def ref_id(ref, key):
+            return ref.get(key) and ref[key].get('id')
+
+        def matches(key, ref):
+            if token_ids is not None:
+                return key in keys
+            if trust_id:
+                return self.trust_matches(trust_id, ref)
+            return ((not user_id or ref_id(ref, 'user') == user_id) and
+                    (not tenant_id or ref_id(ref, 'tenant') == tenant_id))
+
+        if token_ids is not None:
+            keys = set('token-%s' % token.unique_id(x) for x in token_ids)
+        now = timeutils.utcnow()
+        for key, ref in self.db.items():
+            if not key.startswith('token-') or self.is_expired(now, ref):
+                continue
+            if matches(key, ref):
+                self.db.delete(key)
+                self.db.set('revoked-%s' % key, ref)
+
+    def flush_expired_tokens(self):
+        count = 0
+        now = timeutils.utcnow()
+        for key, ref in self.db.items():
+            if not (key.startswith('token-') or
+                    key.startswith('revoked-token-')):
+                continue
+            if self.is_expired(now, ref):
+                self.db.delete(key)
+                count += 1
+        return count
+
     def is_not_expired(self, now, ref):
         return not ref.get('expires') and ref.get('expires') < now
 
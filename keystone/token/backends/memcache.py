@@ -15,36 +15,76 @@
 # under the License.
 
 from __future__ import absolute_import
+import calendar
+import contextlib
 import copy
+import datetime
+import time
 
-import memcache
-
+from keystone.common import memcache_pool
 from keystone.common import utils
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import jsonutils
+from keystone.openstack.common import timeutils
 from keystone import token
 
 
 CONF = config.CONF
-config.register_str('servers', group='memcache', default='localhost:11211')
+config.register_int('user_index_shard_size', group='memcache', default=1000)
+config.register_int('revocation_list_shard_size', group='memcache',
+                    default=1000)
+
+# attempts at a compare-and-set before giving up on an index update
+MAX_CAS_RETRIES = 16
+
+
+def _timestamp(expires):
+    """Returns the UTC unix timestamp of a datetime or ISO 8601 string."""
+    if expires is None:
+        return None
+    if isinstance(expires, basestring):
+        expires = timeutils.normalize_time(timeutils.parse_isotime(expires))
+    return calendar.timegm(expires.utctimetuple())
 
 
 class Token(token.Driver):
+    """Stores tokens in memcached.
+
+    Besides the tokens themselves, two kinds of index are kept: the tokens
+    of each user (``usertokens-<user>``) and the revoked tokens
+    (``revocation-list``). Both are lists of ``[token_id, expires]`` entries
+    split into shards of bounded size: the first shard lives at the base key
+    and records how many shards there are, the others at ``<key>-<n>``.
+    Expired entries are dropped whenever a shard is written.
+
+    """
+
     revocation_key = 'revocation-list'
+    revocation_version_key = 'revocation-list-version'
 
     def __init__(self, client=None):
         self._memcache_client = client
+        self._revoked_cache = None
 
     @property
     def client(self):
         return self._memcache_client or self._get_memcache_client()
 
     def _get_memcache_client(self):
-        memcache_servers = CONF.memcache.servers.split(',')
-        self._memcache_client = memcache.Client(memcache_servers, debug=0)
+        self._memcache_client = memcache_pool.get_client()
         return self._memcache_client
 
+    @contextlib.contextmanager
+    def _reserve_client(self):
+        """Keeps one pooled connection for a sequence of calls."""
+        client = self.client
+        if isinstance(client, memcache_pool.PooledClient):
+            with client.reserve() as client:
+                yield client
+        else:
+            yield client
+
     def _prefix_token_id(self, token_id):
         return 'token-%s' % token_id.encode('utf-8')
 
@@ -72,24 +112,160 @@ class Token(token.Driver):
             kwargs['time'] = expires_ts
         self.client.set(ptk, data_copy, **kwargs)
         if 'id' in data['user']:
-            token_data = jsonutils.dumps(token_id)
-            user_id = data['user']['id']
-            user_key = self._prefix_user_id(user_id)
-            if not self.client.append(user_key, ',%s' % token_data):
-                if not self.client.add(user_key, token_data):
-                    if not self.client.append(user_key, ',%s' % token_data):
-                        msg = _('Unable to add token user list.')
-                        raise exception.UnexpectedError(msg)
+            user_key = self._prefix_user_id(data['user']['id'])
+            entry = [token.unique_id(token_id),
+                     _timestamp(data_copy['expires'])]
+            if not self._add_to_index(user_key,
+                                      [entry],
+                                      CONF.memcache.user_index_shard_size,
+                                      self._parse_legacy_user_index):
+                msg = _('Unable to add token user list.')
+                raise exception.UnexpectedError(msg)
         return copy.deepcopy(data_copy)
 
-    def _add_to_revocation_list(self, data):
-        data_json = jsonutils.dumps(data)
-        if not self.client.append(self.revocation_key, ',%s' % data_json):
-            if not self.client.add(self.revocation_key, data_json):
-                if not self.client.append(self.revocation_key,
-                                          ',%s' % data_json):
-                    msg = _('Unable to add token to revocation list.')
-                    raise exception.UnexpectedError(msg)
+    def _index_key(self, base_key, shard=0):
+        if shard:
+            return '%s-%d' % (base_key, shard)
+        return base_key
+
+    def _parse_legacy_user_index(self, record):
+        # earlier releases appended bare token ids, so look up their expiry
+        token_ids = [token.unique_id(x)
+                     for x in jsonutils.loads('[%s]' % record)]
+        token_refs = self.client.get_multi(
+            [self._prefix_token_id(token_id) for token_id in token_ids])
+        entries = []
+        for token_id in token_ids:
+            token_ref = token_refs.get(self._prefix_token_id(token_id))
+            if token_ref:
+                entries.append([token_id, _timestamp(token_ref['expires'])])
+        return entries
+
+    def _parse_legacy_revocation_list(self, record):
+        # earlier releases appended the complete token data
+        return [[token.unique_id(ref['id']), _timestamp(ref['expires'])]
+                for ref in jsonutils.loads('[%s]' % record)]
+
+    def _parse_index(self, record, parse_legacy):
+        """Returns the shard count and entries of an index's first shard."""
+        if record is None:
+            return 1, []
+        if isinstance(record, basestring):
+            return 1, parse_legacy(record)
+        return record.get('shards', 1), list(record['tokens'])
+
+    def _prune_index(self, entries):
+        now = calendar.timegm(time.gmtime())
+        return [entry for entry in entries
+                if entry[1] is None or entry[1] > now]
+
+    def _write_shard(self, client, key, record, entries):
+        """Updates a shard read with gets(), or adds it if record is None."""
+        if record is None:
+            return client.add(key, {'tokens': entries})
+        return client.cas(key, dict(record, tokens=entries))
+
+    def _fill_index(self, client, base_key, pending, shard_size, parse_legacy):
+        """Moves as many pending entries as possible into the index.
+
+        Entries go to the first shards with room. Once every shard is full,
+        more are reserved by raising the shard count on the first shard;
+        they are only written on the next pass, so entries never land in a
+        shard that readers don't know about. Written entries are removed
+        from pending; anything left over lost a race with another writer.
+
+        """
+        head_key = self._index_key(base_key)
+        head = client.gets(head_key)
+        shards, entries = self._parse_index(head, parse_legacy)
+        for shard in range(shards):
+            key = self._index_key(base_key, shard)
+            if shard:
+                # a shard that already exists is updated with cas(), even
+                # one left behind by a writer that gave up
+                record = client.gets(key)
+                entries = record['tokens'] if record else []
+            else:
+                record = {'shards': shards} if head is not None else None
+            entries = self._prune_index(entries)
+            chunk = pending[:max(shard_size - len(entries), 0)]
+            if not chunk:
+                continue
+            if not self._write_shard(client, key, record, entries + chunk):
+                return
+            del pending[:len(chunk)]
+            if not pending:
+                return
+
+        # every shard is full, so reserve enough new ones for the rest
+        needed = (len(pending) + shard_size - 1) // shard_size
+        self._set_shard_count(client, base_key, shards + needed, parse_legacy)
+
+    def _set_shard_count(self, client, base_key, count, parse_legacy):
+        """Raises the shard count of an index to at least count.
+
+        :returns: True if the index now has at least count shards
+
+        """
+        head_key = self._index_key(base_key)
+        for attempt in range(MAX_CAS_RETRIES):
+            head = client.gets(head_key)
+            shards, entries = self._parse_index(head, parse_legacy)
+            if shards >= count:
+                return True
+            record = {'shards': count, 'tokens': entries}
+            if head is None:
+                if client.add(head_key, record):
+                    return True
+            elif client.cas(head_key, record):
+                return True
+        return False
+
+    def _add_to_index(self, base_key, entries, shard_size, parse_legacy):
+        pending = list(entries)
+        for attempt in range(MAX_CAS_RETRIES):
+            # gets() and cas() have to go through the same connection
+            with self._reserve_client() as client:
+                self._fill_index(client,
+                                 base_key,
+                                 pending,
+                                 shard_size,
+                                 parse_legacy)
+            if not pending:
+                return True
+        return False
+
+    def _read_index(self, base_key, parse_legacy):
+        shards, entries = self._parse_index(
+            self.client.get(self._index_key(base_key)), parse_legacy)
+        if shards > 1:
+            keys = [self._index_key(base_key, shard)
+                    for shard in range(1, shards)]
+            for record in self.client.get_multi(keys).itervalues():
+                entries.extend(record['tokens'])
+        return self._prune_index(entries)
+
+    def _list_user_token_ids(self, user_id):
+        return [token_id for token_id, expires in
+                self._read_index(self._prefix_user_id(user_id),
+                                 self._parse_legacy_user_index)]
+
+    def _add_to_revocation_list(self, *refs):
+        entries = [[token.unique_id(ref['id']),
+                    _timestamp(ref.get('expires'))] for ref in refs]
+        if not self._add_to_index(self.revocation_key,
+                                  entries,
+                                  CONF.memcache.revocation_list_shard_size,
+                                  self._parse_legacy_revocation_list):
+            msg = _('Unable to add token to revocation list.')
+            raise exception.UnexpectedError(msg)
+        # tell every process that its parsed copy of the list is stale
+        if self.client.incr(self.revocation_version_key) is None:
+            # start from the clock, so a version evicted from memcached is
+            # never mistaken for one seen before
+            if not self.client.add(self.revocation_version_key,
+                                   int(time.time() * 1000)):
+                self.client.incr(self.revocation_version_key)
 
     def delete_token(self, token_id):
         # Test for existence
@@ -99,33 +275,70 @@ class Token(token.Driver):
         self._add_to_revocation_list(data)
         return result
 
+    def _token_matches(self, token_ref, tenant_id=None, trust_id=None):
+        if tenant_id is not None:
+            tenant = token_ref.get('tenant')
+            if not tenant:
+                return False
+            if tenant.get('id') != tenant_id:
+                return False
+        if trust_id is not None:
+            trust = token_ref.get('trust_id')
+            if not trust:
+                return False
+            if trust != trust_id:
+                return False
+        return True
+
+    def revoke_tokens(self, user_id=None, tenant_id=None, trust_id=None,
+                      token_ids=None):
+        if token_ids is None:
+            # tokens are only indexed by the user holding them
+            if not user_id:
+                raise exception.NotImplemented()
+            token_ids = self._list_user_token_ids(user_id)
+        else:
+            tenant_id = trust_id = None
+        keys = [self._prefix_token_id(token.unique_id(token_id))
+                for token_id in token_ids]
+        token_refs = dict(
+            (key, token_ref)
+            for key, token_ref in self.client.get_multi(keys).iteritems()
+            if token_ref and self._token_matches(token_ref,
+                                                 tenant_id,
+                                                 trust_id))
+        if not token_refs:
+            return
+        self.client.delete_multi(token_refs.keys())
+        self._add_to_revocation_list(*token_refs.values())
+
     def list_tokens(self, user_id, tenant_id=None, trust_id=None):
+        token_ids = self._list_user_token_ids(user_id)
+        token_refs = self.client.get_multi(
+            [self._prefix_token_id(token_id) for token_id in token_ids])
         tokens = []
-        user_key = self._prefix_user_id(user_id)
-        user_record = self.client.get(user_key) or ""
-        token_list = jsonutils.loads('[%s]' % user_record)
-        for token_id in token_list:
-            ptk = self._prefix_token_id(token_id)
-            token_ref = self.client.get(ptk)
-            if token_ref:
-                if tenant_id is not None:
-                    tenant = token_ref.get('tenant')
-                    if not tenant:
-                        continue
-                    if tenant.get('id') != tenant_id:
-                        continue
-                if trust_id is not None:
-                    trust = token_ref.get('trust_id')
-                    if not trust:
-                        continue
-                    if trust != trust_id:
-                        continue
-
+        for token_id in token_ids:
+            token_ref = token_refs.get(self._prefix_token_id(token_id))
+            if token_ref and self._token_matches(token_ref,
+                                                 tenant_id,
+                                                 trust_id):
                 tokens.append(token_id)
         return tokens
 
     def list_revoked_tokens(self):
-        list_json = self.client.get(self.revocation_key)
-        if list_json:
-            return jsonutils.loads('[%s]' % list_json)
-        return []
+        version = self.client.get(self.revocation_version_key)
+        cached = self._revoked_cache
+        if version is None or cached is None or cached[0] != version:
+            entries = self._read_index(self.revocation_key,
+                                       self._parse_legacy_revocation_list)
+            cached = (version, entries)
+            self._revoked_cache = cached
+        # tokens stored without an expiry are listed without one
+        return [{'id': token_id,
+                 'expires': (datetime.datetime.utcfromtimestamp(expires)
+                             if expires is not None else None)}
+                for token_id, expires in self._prune_index(cached[1])]
+
+    def flush_expired_tokens(self):
+        # memcached drops tokens itself once they expire
+        return 0
@@ -16,21 +16,35 @@
 
 import copy
 import datetime
-
+import time
 
 from keystone.common import sql
+from keystone import config
 from keystone import exception
 from keystone.openstack.common import timeutils
 from keystone import token
 
 
+CONF = config.CONF
+
+
 class TokenModel(sql.ModelBase, sql.DictBase):
     __tablename__ = 'token'
     attributes = ['id', 'expires']
     id = sql.Column(sql.String(64), primary_key=True)
-    expires = sql.Column(sql.DateTime(), default=None)
+    expires = sql.Column(sql.DateTime(), default=None, index=True)
     extra = sql.Column(sql.JsonBlob())
     valid = sql.Column(sql.Boolean(), default=True)
+    # denormalized from extra so tokens can be listed without a full scan
+    user_id = sql.Column(sql.String(64), index=True)
+    tenant_id = sql.Column(sql.String(64), index=True)
+    trust_id = sql.Column(sql.String(64), index=True)
+
+
+def _ref_id(data, key):
+    ref = data.get(key)
+    if ref:
+        return ref.get('id')
 
 
 class Token(sql.Base, token.Driver):
@@ -58,6 +72,9 @@ class Token(sql.Base, token.Driver):
         token_ref = TokenModel.from_dict(data_copy)
         token_ref.id = token.unique_id(token_id)
         token_ref.valid = True
+        token_ref.user_id = _ref_id(data_copy, 'user')
+        token_ref.tenant_id = _ref_id(data_copy, 'tenant')
+        token_ref.trust_id = data_copy.get('trust_id')
         session = self.get_session()
         with session.begin():
             session.add(token_ref)
@@ -75,45 +92,42 @@ class Token(sql.Base, token.Driver):
             token_ref.valid = False
             session.flush()
 
-    def _list_tokens_for_trust(self, trust_id):
-        def trust_matches(trust_id, token_ref_dict):
-            return (token_ref_dict.get('trust_id') and
-                    token_ref_dict['trust_id'] == trust_id)
-
+    def revoke_tokens(self, user_id=None, tenant_id=None, trust_id=None,
+                      token_ids=None):
+        session = self.get_session()
+        with session.begin():
+            query = session.query(TokenModel)
+            query = query.filter(TokenModel.expires > timeutils.utcnow())
+            query = query.filter_by(valid=True)
+            if token_ids is not None:
+                if not token_ids:
+                    return
+                ids = [token.unique_id(x) for x in token_ids]
+                query = query.filter(TokenModel.id.in_(ids))
+            elif trust_id:
+                query = query.filter_by(trust_id=trust_id)
+            else:
+                if user_id:
+                    query = query.filter_by(user_id=user_id)
+                if tenant_id:
+                    query = query.filter_by(tenant_id=tenant_id)
+            query.update({'valid': False}, synchronize_session=False)
+
+    def _list_tokens(self, **filters):
         session = self.get_session()
-        tokens = []
         now = timeutils.utcnow()
-        query = session.query(TokenModel)
+        query = session.query(TokenModel.id)
         query = query.filter(TokenModel.expires > now)
-        token_references = query.filter_by(valid=True)
-        for token_ref in token_references:
-            token_ref_dict = token_ref.to_dict()
-            if trust_matches(trust_id, token_ref_dict):
-                tokens.append(token_ref['id'])
-        return tokens
+        query = query.filter_by(valid=True, **filters)
+        return [token_id for (token_id,) in query]
 
-    def _list_tokens_for_user(self, user_id, tenant_id=None):
-        def user_matches(user_id, token_ref_dict):
-            return (token_ref_dict.get('user') and
-                    token_ref_dict['user'].get('id') == user_id)
-
-        def tenant_matches(tenant_id, token_ref_dict):
-            return ((tenant_id is None) or
-                    (token_ref_dict.get('tenant') and
-                     token_ref_dict['tenant'].get('id') == tenant_id))
+    def _list_tokens_for_trust(self, trust_id):
+        return self._list_tokens(trust_id=trust_id)
 
-        session = self.get_session()
-        tokens = []
-        now = timeutils.utcnow()
-        query = session.query(TokenModel)
-        query = query.filter(TokenModel.expires > now)
-        token_references = query.filter_by(valid=True)
-        for token_ref in token_references:
-            token_ref_dict = token_ref.to_dict()
-            if (user_matches(user_id, token_ref_dict) and
-                    tenant_matches(tenant_id, token_ref_dict)):
-                    tokens.append(token_ref['id'])
-        return tokens
+    def _list_tokens_for_user(self, user_id, tenant_id=None):
+        if tenant_id is None:
+            return self._list_tokens(user_id=user_id)
+        return self._list_tokens(user_id=user_id, tenant_id=tenant_id)
 
     def list_tokens(self, user_id, tenant_id=None, trust_id=None):
         if trust_id:
@@ -135,3 +149,22 @@ class Token(sql.Base, token.Driver):
             }
             tokens.append(record)
         return tokens
+
+    def flush_expired_tokens(self):
+        batch_size = CONF.token.flush_batch_size
+        count = 0
+        while True:
+            # short transactions, so the table is never locked for long
+            session = self.get_session()
+            with session.begin():
+                query = session.query(TokenModel.id)
+                query = query.filter(TokenModel.expires < timeutils.utcnow())
+                ids = [token_id for (token_id,) in query.limit(batch_size)]
+                if ids:
+                    query = session.query(TokenModel)
+                    query = query.filter(TokenModel.id.in_(ids))
+                    query.delete(synchronize_session=False)
+            count += len(ids)
+            if len(ids) < batch_size:
+                return count
+            time.sleep(CONF.token.flush_batch_pause)
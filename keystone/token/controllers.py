@@ -1,12 +1,12 @@
 import json
-import subprocess
 import uuid
 
-from keystone.common import cms
 from keystone.common import controller
 from keystone.common import dependency
 from keystone.common import logging
+from keystone.common import signing
 from keystone.common import utils
+from keystone.common import wsgi
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import timeutils
@@ -102,10 +102,9 @@ class Auth(controller.V2Controller):
 
         auth_token_data['id'] = 'placeholder'
 
-        roles_ref = []
-        for role_id in metadata_ref.get('roles', []):
-            role_ref = self.identity_api.get_role(context, role_id)
-            roles_ref.append(dict(name=role_ref['name']))
+        roles_ref = [dict(name=role_ref['name'])
+                     for role_ref in self.identity_api.get_roles_by_ids(
+                         context, metadata_ref.get('roles', []))]
 
         token_data = Auth.format_token(auth_token_data, roles_ref)
 
@@ -116,10 +115,8 @@ class Auth(controller.V2Controller):
             token_id = uuid.uuid4().hex
         elif CONF.signing.token_format == 'PKI':
             try:
-                token_id = cms.cms_sign_token(json.dumps(token_data),
-                                              CONF.signing.certfile,
-                                              CONF.signing.keyfile)
-            except subprocess.CalledProcessError:
+                token_id = signing.sign_token(json.dumps(token_data))
+            except signing.SigningError:
                 raise exception.UnexpectedError(_(
                     'Unable to sign token.'))
         else:
@@ -214,15 +211,14 @@ class Auth(controller.V2Controller):
         tenant_id = self._get_project_id_from_auth(context, auth)
 
         tenant_ref = self._get_project_ref(context, user_id, tenant_id)
-        metadata_ref = self._get_metadata_ref(context, user_id, tenant_id)
+        # the user's own grants are resolved along with their groups'
+        metadata_ref = self._get_group_metadata_ref(context,
+                                                    user_id,
+                                                    tenant_id)
 
         # TODO (henry-nash) If no tenant was specified, instead check
         # for a domain and find any related user/group roles
 
-        self._append_roles(metadata_ref,
-                           self._get_group_metadata_ref(
-                               context, user_id, tenant_id))
-
         expiry = old_token_ref['expires']
         if 'trust_id' in auth:
             trust_id = auth['trust_id']
@@ -338,15 +334,14 @@ class Auth(controller.V2Controller):
         tenant_id = self._get_project_id_from_auth(context, auth)
 
         tenant_ref = self._get_project_ref(context, user_id, tenant_id)
-        metadata_ref = self._get_metadata_ref(context, user_id, tenant_id)
+        # the user's own grants are resolved along with their groups'
+        metadata_ref = self._get_group_metadata_ref(context,
+                                                    user_id,
+                                                    tenant_id)
 
         # TODO (henry-nash) If no tenant was specified, instead check
         # for a domain and find any related user/group roles
 
-        self._append_roles(metadata_ref,
-                           self._get_group_metadata_ref(
-                               context, user_id, tenant_id))
-
         expiry = core.default_expire_time()
         return (user_ref, tenant_ref, metadata_ref, expiry)
 
@@ -418,32 +413,20 @@ class Auth(controller.V2Controller):
                 exception.Unauthorized(e)
         return tenant_ref
 
-    def _get_metadata_ref(self, context, user_id=None, tenant_id=None,
-                          domain_id=None, group_id=None):
-        """Returns metadata_ref for a user or group in a tenant or domain"""
-
-        metadata_ref = {}
-        if (user_id or group_id) and (tenant_id or domain_id):
-            try:
-                metadata_ref = self.identity_api.get_metadata(
-                    context=context, user_id=user_id, tenant_id=tenant_id,
-                    domain_id=domain_id, group_id=group_id)
-            except exception.MetadataNotFound:
-                pass
-        return metadata_ref
-
     def _get_group_metadata_ref(self, context, user_id,
                                 tenant_id=None, domain_id=None):
-        """Return any metadata for this project/domain due to group grants"""
-        group_refs = self.identity_api.list_groups_for_user(context=context,
-                                                            user_id=user_id)
-        metadata_ref = {}
-        for x in group_refs:
-            metadata_ref.update(self._get_metadata_ref(context,
-                                                       group_id=x['id'],
-                                                       tenant_id=tenant_id,
-                                                       domain_id=domain_id))
-        return metadata_ref
+        """Return the roles on this project/domain, including group grants"""
+        if tenant_id:
+            roles = self.identity_api.get_roles_for_user_and_project(
+                context, user_id, tenant_id)
+        elif domain_id:
+            roles = self.identity_api.get_roles_for_user_and_domain(
+                context, user_id, domain_id)
+        else:
+            # unscoped tokens carry an empty role list, however they were
+            # requested
+            roles = []
+        return {'roles': roles}
 
     def _append_roles(self, metadata, additional_metadata):
         """
@@ -495,9 +478,8 @@ class Auth(controller.V2Controller):
         #               the return for metadata
         # fill out the roles in the metadata
         metadata_ref = token_ref['metadata']
-        roles_ref = []
-        for role_id in metadata_ref.get('roles', []):
-            roles_ref.append(self.identity_api.get_role(context, role_id))
+        roles_ref = self.identity_api.get_roles_by_ids(
+            context, metadata_ref.get('roles', []))
 
         # Get a service catalog if possible
         # This is needed for on-behalf-of requests
@@ -518,19 +500,15 @@ class Auth(controller.V2Controller):
 
     def revocation_list(self, context, auth=None):
         self.assert_admin(context)
-        tokens = self.token_api.list_revoked_tokens(context)
-
-        for t in tokens:
-            expires = t['expires']
-            if not (expires and isinstance(expires, unicode)):
-                    t['expires'] = timeutils.isotime(expires)
-        data = {'revoked': tokens}
-        json_data = json.dumps(data)
-        signed_text = cms.cms_sign_text(json_data,
-                                        CONF.signing.certfile,
-                                        CONF.signing.keyfile)
-
-        return {'signed': signed_text}
+        revocation_list = self.token_api.get_revocation_list(context)
+
+        # pollers that already hold this list get a 304 from webob
+        response = wsgi.render_response(
+            body={'signed': revocation_list.signed})
+        response.etag = revocation_list.etag
+        response.last_modified = revocation_list.last_modified
+        response.conditional_response = True
+        return response
 
     def endpoints(self, context, token_id):
         """Return a list of endpoints available to the token."""
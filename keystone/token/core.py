@@ -17,11 +17,17 @@
 """Main entry point into the Token service."""
 
 import datetime
+import hashlib
+import json
+import time
+
+import eventlet
 
 from keystone.common import cms
 from keystone.common import dependency
 from keystone.common import logging
 from keystone.common import manager
+from keystone.common import signing
 from keystone import config
 from keystone import exception
 from keystone.openstack.common import timeutils
@@ -29,6 +35,10 @@ from keystone.openstack.common import timeutils
 
 CONF = config.CONF
 config.register_int('expiration', group='token', default=86400)
+config.register_int('flush_batch_size', group='token', default=1000)
+config.register_float('flush_batch_pause', group='token', default=0.1)
+config.register_int('flush_interval', group='token', default=0)
+config.register_int('revocation_list_ttl', group='token', default=5)
 LOG = logging.getLogger(__name__)
 
 
@@ -109,6 +119,48 @@ def validate_auth_info(self, context, user_ref, tenant_ref):
                 raise exception.Unauthorized(msg)
 
 
+def flush_expired_tokens_periodically(token_api, interval):
+    """Flush expired tokens every interval seconds, in a green thread.
+
+    Stops if the backend cannot flush tokens; other failures are logged and
+    the next flush is attempted as usual.
+
+    """
+    while True:
+        eventlet.sleep(interval)
+        try:
+            token_api.flush_expired_tokens(None)
+        except exception.NotImplemented:
+            LOG.warning(_('The token backend does not support flushing '
+                          'expired tokens'))
+            return
+        except Exception:
+            LOG.exception(_('Unable to flush expired tokens'))
+
+
+class SignedRevocationList(object):
+    """A signed revocation list and the HTTP validators describing it.
+
+    The ETag is derived from the content, so every process serving the same
+    revoked tokens hands out the same one.
+
+    """
+
+    def __init__(self, data, signed, last_modified):
+        self.data = data
+        self.signed = signed
+        self.etag = hashlib.sha1(data).hexdigest()
+        self.last_modified = last_modified
+        self.checked = None
+        self.valid_until = None
+
+
+def _expiry(expires):
+    if isinstance(expires, basestring):
+        return timeutils.normalize_time(timeutils.parse_isotime(expires))
+    return expires
+
+
 @dependency.provider('token_api')
 class Manager(manager.Manager):
     """Default pivot point for the Token backend.
@@ -120,15 +172,80 @@ class Manager(manager.Manager):
 
     def __init__(self):
         super(Manager, self).__init__(CONF.token.driver)
+        self._revocation_list = None
 
-    def revoke_tokens(self, context, user_id, tenant_id=None):
-        """Invalidates all tokens held by a user (optionally for a tenant).
+    def delete_token(self, context, token_id):
+        self._revocation_list = None
+        return self.driver.delete_token(token_id)
+
+    def revoke_tokens(self, context, user_id=None, tenant_id=None,
+                      trust_id=None, token_ids=None):
+        """Invalidates tokens in bulk.
+
+        See :meth:`Driver.revoke_tokens`. At least one of the filters must
+        be given, so that a missing argument can never revoke every token.
 
-        If a specific tenant ID is not provided, *all* tokens held by user will
-        be revoked.
         """
-        for token_id in self.list_tokens(context, user_id, tenant_id):
-            self.delete_token(context, token_id)
+        if (not (user_id or tenant_id or trust_id) and
+                token_ids is None):
+            raise exception.ValidationError(
+                attribute='user_id, tenant_id, trust_id or token_ids',
+                target='token revocation')
+        self._revocation_list = None
+        return self.driver.revoke_tokens(user_id=user_id,
+                                         tenant_id=tenant_id,
+                                         trust_id=trust_id,
+                                         token_ids=token_ids)
+
+    def get_revocation_list(self, context):
+        """Returns the current revocation list, signed.
+
+        The signed document is kept until a token is revoked through this
+        manager or the first revoked token in it expires. Tokens revoked by
+        other processes are picked up after at most ``[token]
+        revocation_list_ttl`` seconds, and the list is only signed again if
+        its content actually changed.
+
+        :returns: keystone.token.core.SignedRevocationList
+
+        """
+        now = timeutils.utcnow()
+        cached = self._revocation_list
+        ttl = datetime.timedelta(seconds=CONF.token.revocation_list_ttl)
+        if (cached is not None and now < cached.checked + ttl and
+                (cached.valid_until is None or now < cached.valid_until)):
+            return cached
+
+        tokens = self.driver.list_revoked_tokens()
+        # the list changes when the first of its tokens expires
+        expiries = [e for e in (_expiry(t['expires']) for t in tokens)
+                    if e and e > now]
+        for t in tokens:
+            expires = t['expires']
+            if not (expires and isinstance(expires, unicode)):
+                t['expires'] = timeutils.isotime(expires)
+        tokens.sort(key=lambda t: t['id'])
+        data = json.dumps({'revoked': tokens})
+
+        if cached is None or cached.data != data:
+            cached = SignedRevocationList(data, signing.sign_text(data), now)
+        cached.checked = now
+        cached.valid_until = min(expiries) if expiries else None
+        self._revocation_list = cached
+        return cached
+
+    def flush_expired_tokens(self, context):
+        """Removes expired tokens from the backend.
+
+        :returns: the number of tokens removed and the seconds it took
+
+        """
+        start = time.time()
+        count = self.driver.flush_expired_tokens()
+        elapsed = time.time() - start
+        LOG.info(_('Flushed %(count)d expired tokens in %(elapsed).2f '
+                   'seconds'), {'count': count, 'elapsed': elapsed})
+        return count, elapsed
 
 
 class Driver(object):
@@ -201,10 +318,38 @@ class Driver(object):
         """
         raise exception.NotImplemented()
 
-    def revoke_tokens(self, user_id, tenant_id=None):
-        """Invalidates all tokens held by a user (optionally for a tenant).
+    def revoke_tokens(self, user_id=None, tenant_id=None, trust_id=None,
+                      token_ids=None):
+        """Invalidates tokens in bulk.
+
+        If token_ids is given, exactly those tokens are revoked. Otherwise
+        the tokens issued under trust_id are revoked or, without a trust,
+        every token held by user_id and/or scoped to tenant_id.
+
+        Backends that can only find tokens through their user may raise
+        NotImplemented when user_id is not given.
+
+        :param user_id: identity of the user
+        :type user_id: string
+        :param tenant_id: identity of the tenant
+        :type tenant_id: string
+        :param trust_id: identity of the trust
+        :type trust_id: string
+        :param token_ids: identities of the tokens
+        :type token_ids: list
+        :returns: None.
+
+        """
+        raise exception.NotImplemented()
+
+    def flush_expired_tokens(self):
+        """Removes expired tokens, including revoked ones.
+
+        Backends that store many tokens should remove them in batches of
+        ``[token] flush_batch_size``, pausing ``flush_batch_pause`` seconds
+        between batches.
+
+        :returns: the number of tokens removed
 
-        :raises: keystone.exception.UserNotFound,
-                 keystone.exception.ProjectNotFound
         """
         raise exception.NotImplemented()
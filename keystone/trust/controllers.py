@@ -191,11 +191,9 @@ class TrustV3(controller.V3Controller):
         _admin_trustor_only(context, trust, user_id)
         self.trust_api.delete_trust(context, trust_id)
         userid = trust['trustor_user_id']
-        token_list = self.token_api.list_tokens(context,
-                                                userid,
-                                                trust_id=trust_id)
-        for token in token_list:
-            self.token_api.delete_token(context, token)
+        self.token_api.revoke_tokens(context,
+                                     user_id=userid,
+                                     trust_id=trust_id)
 
     @controller.protected
     def list_roles_for_trust(self, context, trust_id):
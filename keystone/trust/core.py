@@ -22,6 +22,7 @@ from keystone.common import manager
 from keystone.common import wsgi
 from keystone import config
 from keystone import exception
+from keystone.openstack.common import timeutils
 
 
 CONF = config.CONF
@@ -38,9 +39,20 @@ class Manager(manager.Manager):
 
     """
 
+    cache_namespace = 'trust'
+    cached_methods = ('get_trust',)
+
     def __init__(self):
         super(Manager, self).__init__(CONF.trust.driver)
 
+    def get_trust(self, context, trust_id):
+        trust = self.driver.get_trust(trust_id)
+        # a cached trust may have expired since it was read
+        if (trust and trust.get('expires_at') is not None and
+                timeutils.utcnow() > trust['expires_at']):
+            return None
+        return trust
+
 
 class Driver(object):
     def create_trust(self, trust_id, trust, roles):
@@ -147,6 +147,17 @@ class IdentityTests(object):
                           self.identity_api.get_project,
                           tenant_id=uuid.uuid4().hex)
 
+    def test_get_projects_by_ids(self):
+        tenant_ids = [self.tenant_mtu['id'], self.tenant_bar['id']]
+        tenant_refs = self.identity_api.get_projects_by_ids(tenant_ids)
+        self.assertEqual(tenant_refs,
+                         [self.identity_api.get_project(x)
+                          for x in tenant_ids])
+        self.assertEqual(self.identity_api.get_projects_by_ids([]), [])
+        self.assertRaises(exception.ProjectNotFound,
+                          self.identity_api.get_projects_by_ids,
+                          [self.tenant_bar['id'], uuid.uuid4().hex])
+
     def test_get_project_by_name(self):
         tenant_ref = self.identity_api.get_project_by_name(
             tenant_name=self.tenant_bar['name'],
@@ -233,6 +244,20 @@ class IdentityTests(object):
                           self.identity_api.get_role,
                           role_id=uuid.uuid4().hex)
 
+    def test_get_users_and_roles_by_ids(self):
+        user_ids = [self.user_two['id'], self.user_foo['id']]
+        self.assertEqual(self.identity_api.get_users_by_ids(user_ids),
+                         [self.identity_api.get_user(x) for x in user_ids])
+        role_ids = ['member', self.role_admin['id']]
+        self.assertEqual(self.identity_api.get_roles_by_ids(role_ids),
+                         [self.identity_api.get_role(x) for x in role_ids])
+        self.assertRaises(exception.UserNotFound,
+                          self.identity_api.get_users_by_ids,
+                          [uuid.uuid4().hex])
+        self.assertRaises(exception.RoleNotFound,
+                          self.identity_api.get_roles_by_ids,
+                          ['member', uuid.uuid4().hex])
+
     def test_create_duplicate_role_name_fails(self):
         role = {'id': 'fake1',
                 'name': 'fake1name'}
@@ -508,6 +533,40 @@ class IdentityTests(object):
                           self.user_foo['id'],
                           uuid.uuid4().hex)
 
+    def test_get_roles_for_user_and_project_includes_groups(self):
+        groups = []
+        for role_id in ('member', 'other'):
+            new_group = {'id': uuid.uuid4().hex,
+                         'domain_id': DEFAULT_DOMAIN_ID,
+                         'name': uuid.uuid4().hex}
+            self.identity_man.create_group({}, new_group['id'], new_group)
+            self.identity_api.add_user_to_group(self.user_foo['id'],
+                                                new_group['id'])
+            self.identity_api.create_grant(group_id=new_group['id'],
+                                           project_id=self.tenant_baz['id'],
+                                           role_id=role_id)
+            groups.append(new_group)
+        self.identity_api.create_grant(user_id=self.user_foo['id'],
+                                       project_id=self.tenant_baz['id'],
+                                       role_id=self.role_admin['id'])
+
+        roles_ref = self.identity_api.get_roles_for_user_and_project(
+            self.user_foo['id'], self.tenant_baz['id'])
+        self.assertEqual(set(roles_ref),
+                         set([self.role_admin['id'], 'member', 'other']))
+
+        # grants on other projects or to other users are not included
+        self.assertEqual(
+            self.identity_api.get_roles_for_user_and_project(
+                self.user_sna['id'], self.tenant_baz['id']),
+            [])
+        self.identity_api.remove_user_from_group(self.user_foo['id'],
+                                                 groups[1]['id'])
+        roles_ref = self.identity_api.get_roles_for_user_and_project(
+            self.user_foo['id'], self.tenant_baz['id'])
+        self.assertEqual(set(roles_ref),
+                         set([self.role_admin['id'], 'member']))
+
     def test_add_role_to_user_and_project_404(self):
         self.assertRaises(exception.UserNotFound,
                           self.identity_api.add_role_to_user_and_project,
@@ -1480,6 +1539,39 @@ class IdentityTests(object):
         for test_user in default_fixtures.USERS:
             self.assertTrue(x for x in users if x['id'] == test_user['id'])
 
+    def test_list_users_filtered_and_paged(self):
+        email = uuid.uuid4().hex
+        user_ids = sorted(uuid.uuid4().hex for i in range(5))
+        for user_id in user_ids:
+            self.identity_api.create_user(user_id, {
+                'id': user_id,
+                'name': user_id,
+                'domain_id': DEFAULT_DOMAIN_ID,
+                'email': email,
+                'password': uuid.uuid4().hex,
+                'enabled': True})
+
+        def list_ids(**kwargs):
+            users = self.identity_api.list_users(
+                filters=dict(kwargs.pop('filters', {}), email=email),
+                **kwargs)
+            return [user['id'] for user in users]
+
+        self.assertEqual(list_ids(), user_ids)
+        self.assertEqual(list_ids(filters={'name': user_ids[2]}),
+                         user_ids[2:3])
+        self.assertEqual(list_ids(limit=2), user_ids[:2])
+        self.assertEqual(list_ids(marker=user_ids[1], limit=2),
+                         user_ids[2:4])
+        self.assertEqual(list_ids(marker=user_ids[3]), user_ids[4:])
+        self.assertEqual(list_ids(marker=user_ids[3],
+                                  limit=2,
+                                  page_reverse=True),
+                         user_ids[1:3])
+        self.assertEqual(list_ids(marker=user_ids[1], page_reverse=True),
+                         user_ids[:1])
+        self.assertEqual(list_ids(limit=2, page_reverse=True), user_ids[3:])
+
     def test_list_groups(self):
         group1 = {'id': uuid.uuid4().hex, 'domain_id': uuid.uuid4().hex,
                   'name': uuid.uuid4().hex}
@@ -1946,6 +2038,55 @@ class TokenTests(object):
         self.assertEquals(len(tokens), 1)
         self.assertIn(token_id5, tokens)
 
+    def assertRevoked(self, token_ids):
+        revoked = [x['id'] for x in self.token_api.list_revoked_tokens()]
+        for token_id in token_ids:
+            self.assertRaises(exception.TokenNotFound,
+                              self.token_api.get_token,
+                              token_id)
+            self.assertIn(token_id, revoked)
+
+    def test_revoke_tokens_for_user(self):
+        tenant_id = uuid.uuid4().hex
+        token_id1 = self.create_token_sample_data()
+        token_id2 = self.create_token_sample_data(tenant_id=tenant_id)
+        self.token_api.revoke_tokens(user_id='testuserid')
+        self.assertEquals(self.token_api.list_tokens('testuserid'), [])
+        self.assertRevoked([token_id1, token_id2])
+
+    def test_revoke_tokens_for_user_and_tenant(self):
+        tenant_id = uuid.uuid4().hex
+        token_id1 = self.create_token_sample_data()
+        token_id2 = self.create_token_sample_data(tenant_id=tenant_id)
+        self.token_api.revoke_tokens(user_id='testuserid',
+                                     tenant_id=tenant_id)
+        self.assertEquals(self.token_api.list_tokens('testuserid'),
+                          [token_id1])
+        self.assertRevoked([token_id2])
+
+    def test_revoke_tokens_for_trust(self):
+        trust_id = uuid.uuid4().hex
+        token_id1 = self.create_token_sample_data()
+        token_id2 = self.create_token_sample_data(trust_id=trust_id)
+        self.token_api.revoke_tokens(user_id='testuserid',
+                                     trust_id=trust_id)
+        self.assertEquals(self.token_api.list_tokens('testuserid'),
+                          [token_id1])
+        self.assertRevoked([token_id2])
+
+    def test_revoke_tokens_by_id(self):
+        token_id1 = self.create_token_sample_data()
+        token_id2 = self.create_token_sample_data()
+        token_id3 = self.create_token_sample_data()
+        self.token_api.revoke_tokens(token_ids=[token_id1, token_id2,
+                                                uuid.uuid4().hex])
+        self.assertEquals(self.token_api.list_tokens('testuserid'),
+                          [token_id3])
+        self.assertRevoked([token_id1, token_id2])
+        self.token_api.revoke_tokens(token_ids=[])
+        self.assertEquals(self.token_api.list_tokens('testuserid'),
+                          [token_id3])
+
     def test_get_token_404(self):
         self.assertRaises(exception.TokenNotFound,
                           self.token_api.get_token,
@@ -1970,6 +2111,19 @@ class TokenTests(object):
         self.assertRaises(exception.TokenNotFound,
                           self.token_api.get_token, token_id)
 
+    def test_flush_expired_tokens(self):
+        token_id = self.create_token_sample_data()
+        expired_id = uuid.uuid4().hex
+        expire_time = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        self.token_api.create_token(expired_id,
+                                    {'id': expired_id,
+                                     'expires': expire_time,
+                                     'user': {'id': 'testuserid'}})
+        self.token_api.flush_expired_tokens()
+        self.token_api.get_token(token_id)
+        self.assertRaises(exception.TokenNotFound,
+                          self.token_api.get_token, expired_id)
+
     def test_null_expires_token(self):
         token_id = uuid.uuid4().hex
         data = {'id': token_id, 'id_hash': token_id, 'a': 'b', 'expires': None,
@@ -2099,6 +2253,19 @@ class CommonHelperTests(test.TestCase):
         with self.assertRaises(exception.MalformedEndpoint):
             core.format_url("http://%(foo)", {"foo": "1"})
 
+    def test_url_template(self):
+        template = core.UrlTemplate(
+            "http://%(foo)s:$(port)d/$(tenant_id)s/$(user_id)s/$(tenant_id)s",
+            {"foo": "host", "port": 80})
+        self.assertEqual(template.format("t", "u"), "http://host:80/t/u/t")
+        self.assertEqual(template.format(None, "u"),
+                         "http://host:80/None/u/None")
+        self.assertIsNone(core.UrlTemplate(None, {}).format("t", "u"))
+
+    def test_url_template_raises_malformed(self):
+        with self.assertRaises(exception.MalformedEndpoint):
+            core.UrlTemplate("http://%(foo)s/$(tenant)s", {"foo": "1"})
+
 
 class CatalogTests(object):
     def test_service_crud(self):
@@ -14,6 +14,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import greenlet
 import ldap
 import uuid
 import nose.exc
@@ -35,6 +36,9 @@ CONF = config.CONF
 def clear_database():
     db = fakeldap.FakeShelve().get_instance()
     db.clear()
+    # nothing cached about the old entries may outlive them
+    for cache in ldap_common.core._CACHES.values():
+        cache.clear()
 
 
 class LDAPIdentity(test.TestCase, test_backend.IdentityTests):
@@ -357,6 +361,35 @@ class LDAPIdentity(test.TestCase, test_backend.IdentityTests):
             'Invalid LDAP scope: %s. *' % CONF.ldap.query_scope,
             identity.backends.ldap.Identity)
 
+    def test_get_user_projects_in_chunks(self):
+        CONF.ldap.ids_per_search = 2
+        self.identity_api = identity.backends.ldap.Identity()
+        project_ids = [self.tenant_bar['id']]
+        for i in range(5):
+            project = {'id': uuid.uuid4().hex,
+                       'name': uuid.uuid4().hex,
+                       'domain_id': test_backend.DEFAULT_DOMAIN_ID}
+            self.identity_api.create_project(project['id'], project)
+            self.identity_api.add_role_to_user_and_project(
+                self.user_foo['id'], project['id'], self.role_member['id'])
+            project_ids.append(project['id'])
+
+        # the projects must be searched for, not found in a cache
+        for cache in ldap_common.core._CACHES.values():
+            cache.clear()
+        calls = []
+        search_many = fakeldap.FakeLdap.search_many
+
+        def _search_many(conn, dn, scope, queries, fields=None):
+            calls.append(queries)
+            return search_many(conn, dn, scope, queries, fields)
+
+        self.stubs.Set(fakeldap.FakeLdap, 'search_many', _search_many)
+        user_projects = self.identity_api.get_projects_for_user(
+            self.user_foo['id'])
+        self.assertEqual(sorted(user_projects), sorted(project_ids))
+        self.assertEqual([len(queries) for queries in calls], [3])
+
 # TODO (henry-nash) These need to be removed when the full LDAP implementation
 # is submitted - see Bugs 1092187, 1101287, 1101276, 1101289
     def test_group_crud(self):
@@ -395,6 +428,9 @@ class LDAPIdentity(test.TestCase, test_backend.IdentityTests):
     def test_remove_role_grant_from_user_and_project(self):
         raise nose.exc.SkipTest('Blocked by bug 1101287')
 
+    def test_get_roles_for_user_and_project_includes_groups(self):
+        raise nose.exc.SkipTest('Blocked by bug 1101287')
+
     def test_get_and_remove_role_grant_by_group_and_project(self):
         raise nose.exc.SkipTest('Blocked by bug 1101287')
 
@@ -545,3 +581,339 @@ class LDAPIdentityEnabledEmulation(LDAPIdentity):
     def test_user_enable_attribute_mask(self):
         raise nose.exc.SkipTest(
             "Enabled emulation conflicts with enabled mask")
+
+    def count_enabled_searches(self):
+        searches = []
+        search_s = fakeldap.FakeLdap.search_s
+
+        def _search_s(conn, dn, scope, query=None, fields=None):
+            if dn.startswith('cn=enabled_'):
+                searches.append(query)
+            return search_s(conn, dn, scope, query, fields)
+
+        self.stubs.Set(fakeldap.FakeLdap, 'search_s', _search_s)
+        return searches
+
+    def test_list_users_searches_enabled_group_once(self):
+        searches = self.count_enabled_searches()
+        users = dict((user_ref['id'], user_ref['enabled'])
+                     for user_ref in self.identity_api.list_users())
+        self.assertEqual(len(searches), 1)
+        self.assertTrue(users[self.user_foo['id']])
+        self.assertFalse(users[self.user_badguy['id']])
+
+    def test_get_users_by_ids_searches_enabled_group_once(self):
+        searches = self.count_enabled_searches()
+        users = self.identity_api.get_users_by_ids([self.user_foo['id'],
+                                                    self.user_badguy['id']])
+        self.assertEqual([user_ref['enabled'] for user_ref in users],
+                         [True, False])
+        self.assertEqual(len(searches), 1)
+
+    def test_enabled_group_is_cached(self):
+        CONF.ldap.cache_time = 600
+        ldap_common.core._CACHES.clear()
+        self.identity_api = identity.backends.ldap.Identity()
+        searches = self.count_enabled_searches()
+        self.identity_api.get_user(self.user_foo['id'])
+        self.identity_api.list_users()
+        self.assertEqual(len(searches), 1)
+
+        self.identity_api.update_user(self.user_foo['id'], {'enabled': False})
+        self.assertFalse(
+            self.identity_api.get_user(self.user_foo['id'])['enabled'])
+        self.assertEqual(len(searches), 2)
+        ldap_common.core._CACHES.clear()
+
+
+class LDAPIdentityPooled(LDAPIdentity):
+    """Runs the LDAP backend tests over pooled connections."""
+
+    def setUp(self):
+        ldap_common.core._POOLS.clear()
+        super(LDAPIdentityPooled, self).setUp()
+        self.config([test.etcdir('keystone.conf.sample'),
+                     test.testsdir('test_overrides.conf'),
+                     test.testsdir('backend_ldap.conf')])
+        CONF.ldap.use_pool = True
+        clear_database()
+        self.identity_man = identity.Manager()
+        self.identity_api = self.identity_man.driver
+        self.load_fixtures(default_fixtures)
+
+    def tearDown(self):
+        ldap_common.core._POOLS.clear()
+        super(LDAPIdentityPooled, self).tearDown()
+
+    def test_apis_share_a_pool(self):
+        user_api = identity.backends.ldap.UserApi(CONF)
+        project_api = identity.backends.ldap.ProjectApi(CONF)
+        self.assertIs(user_api.get_connection(),
+                      project_api.get_connection())
+
+    def test_credentials_are_not_pooled(self):
+        user_api = identity.backends.ldap.UserApi(CONF)
+        conn = user_api.get_connection(CONF.ldap.user, CONF.ldap.password)
+        self.assertNotIsInstance(conn, ldap_common.ConnectionPool)
+
+
+class LDAPIdentityCached(LDAPIdentity):
+    """Runs the LDAP backend tests with DNs and entries cached."""
+
+    def setUp(self):
+        ldap_common.core._CACHES.clear()
+        super(LDAPIdentityCached, self).setUp()
+        self.config([test.etcdir('keystone.conf.sample'),
+                     test.testsdir('test_overrides.conf'),
+                     test.testsdir('backend_ldap.conf')])
+        CONF.ldap.cache_time = 600
+        CONF.ldap.query_scope = 'sub'
+        clear_database()
+        self.identity_man = identity.Manager()
+        self.identity_api = self.identity_man.driver
+        self.load_fixtures(default_fixtures)
+
+    def tearDown(self):
+        ldap_common.core._CACHES.clear()
+        super(LDAPIdentityCached, self).tearDown()
+
+    def count_searches(self):
+        searches = []
+        search_s = fakeldap.FakeLdap.search_s
+
+        def _search_s(conn, dn, scope, query=None, fields=None):
+            searches.append(query)
+            return search_s(conn, dn, scope, query, fields)
+
+        self.stubs.Set(fakeldap.FakeLdap, 'search_s', _search_s)
+        return searches
+
+    def test_apis_share_a_cache(self):
+        self.assertIs(identity.backends.ldap.UserApi(CONF).entry_cache,
+                      self.identity_api.user.entry_cache)
+
+    def test_id_to_dn_is_cached(self):
+        user_api = self.identity_api.user
+        dn = user_api._id_to_dn(self.user_foo['id'])
+        searches = self.count_searches()
+        self.assertEqual(user_api._id_to_dn(self.user_foo['id']), dn)
+        self.assertEqual(searches, [])
+
+    def test_get_is_cached(self):
+        self.identity_api.get_user(self.user_foo['id'])
+        searches = self.count_searches()
+        user_ref = self.identity_api.get_user(self.user_foo['id'])
+        self.assertEqual(user_ref['name'], self.user_foo['name'])
+        self.assertEqual(searches, [])
+
+    def test_update_is_seen_by_other_apis(self):
+        self.identity_api.get_user(self.user_foo['id'])
+        user_api = identity.backends.ldap.UserApi(CONF)
+        user_api.update(self.user_foo['id'], {'email': 'new@example.com'})
+        user_ref = self.identity_api.get_user(self.user_foo['id'])
+        self.assertEqual(user_ref['email'], 'new@example.com')
+
+    def test_get_users_searches_once(self):
+        ldap_common.core._CACHES.clear()
+        project_api = identity.backends.ldap.ProjectApi(CONF)
+        searches = self.count_searches()
+        user_ids = [user_ref['id']
+                    for user_ref in project_api.get_users(
+                        self.tenant_baz['id'])]
+        self.assertEqual(sorted(user_ids),
+                         sorted([self.user_two['id'],
+                                 self.user_badguy['id']]))
+        user_searches = [query for query in searches
+                         if 'inetOrgPerson' in query]
+        self.assertEqual(len(user_searches), 1)
+
+
+class FakeAsyncConnection(object):
+    """Records the order of the asynchronous calls a search makes."""
+
+    def __init__(self, results):
+        self.results = results
+        self.calls = []
+
+    def search(self, dn, scope, query, attrlist=None):
+        self.calls.append(('search', query))
+        return query
+
+    def result(self, msgid, all=1):
+        self.calls.append(('result', msgid))
+        if isinstance(self.results[msgid], Exception):
+            raise self.results[msgid]
+        if all:
+            return ldap.RES_SEARCH_RESULT, self.results[msgid]
+        # one entry at a time
+        if not self.results[msgid]:
+            return ldap.RES_SEARCH_RESULT, []
+        return ldap.RES_SEARCH_ENTRY, [self.results[msgid].pop(0)]
+
+    def abandon(self, msgid):
+        self.calls.append(('abandon', msgid))
+
+
+class LdapWrapperTests(test.TestCase):
+    def setUp(self):
+        super(LdapWrapperTests, self).setUp()
+        self.conn = FakeAsyncConnection({
+            '(cn=a)': [('cn=a,dc=example', {'cn': ['a']})],
+            '(cn=b)': [('cn=b,dc=example', {'enabled': ['TRUE']})],
+            '(cn=c)': ldap.SIZELIMIT_EXCEEDED(),
+        })
+        self.stubs.Set(ldap, 'initialize', lambda url: self.conn)
+        self.wrapper = ldap_common.LdapWrapper('ldap://localhost', 0)
+
+    def test_search_many_sends_before_reading(self):
+        res = self.wrapper.search_many('dc=example', ldap.SCOPE_SUBTREE,
+                                       ['(cn=a)', '(cn=b)'])
+        self.assertEqual(res, [('cn=a,dc=example', {'cn': ['a']}),
+                               ('cn=b,dc=example', {'enabled': [True]})])
+        self.assertEqual(self.conn.calls, [('search', '(cn=a)'),
+                                           ('search', '(cn=b)'),
+                                           ('result', '(cn=a)'),
+                                           ('result', '(cn=b)')])
+
+    def test_search_many_abandons_unread_searches(self):
+        self.assertRaises(ldap.SIZELIMIT_EXCEEDED,
+                          self.wrapper.search_many,
+                          'dc=example',
+                          ldap.SCOPE_SUBTREE,
+                          ['(cn=a)', '(cn=c)', '(cn=b)'])
+        self.assertEqual(self.conn.calls[-2:], [('result', '(cn=c)'),
+                                                ('abandon', '(cn=b)')])
+
+    def test_search_iter_reads_as_asked(self):
+        self.conn.results['(cn=*)'] = [('cn=a,dc=example', {'cn': ['a']}),
+                                       ('cn=b,dc=example', {'cn': ['b']})]
+        res = self.wrapper.search_iter('dc=example', ldap.SCOPE_SUBTREE,
+                                       '(cn=*)')
+        self.assertEqual(res.next(), ('cn=a,dc=example', {'cn': ['a']}))
+        self.assertEqual(self.conn.calls, [('search', '(cn=*)'),
+                                           ('result', '(cn=*)')])
+        self.assertEqual(list(res), [('cn=b,dc=example', {'cn': ['b']})])
+        self.assertNotIn(('abandon', '(cn=*)'), self.conn.calls)
+
+    def test_search_iter_left_early_is_abandoned(self):
+        res = self.wrapper.search_iter('dc=example', ldap.SCOPE_SUBTREE,
+                                       '(cn=a)')
+        res.next()
+        res.close()
+        self.assertEqual(self.conn.calls[-1], ('abandon', '(cn=a)'))
+
+
+class LdapConnectionPoolTests(test.TestCase):
+    def setUp(self):
+        super(LdapConnectionPoolTests, self).setUp()
+        clear_database()
+        self.opened = []
+        connect = ldap_common.core.connect
+
+        def _connect(url, page_size):
+            conn = connect(url, page_size)
+            self.opened.append(conn)
+            return conn
+
+        self.stubs.Set(ldap_common.core, 'connect', _connect)
+        self.pool = ldap_common.ConnectionPool('fake://memory',
+                                               user='cn=Admin',
+                                               password='password',
+                                               size=2,
+                                               checkout_timeout=0,
+                                               retry_delay=0)
+
+    def tearDown(self):
+        fakeldap.server_fail = False
+        super(LdapConnectionPoolTests, self).tearDown()
+
+    def test_connection_is_reused(self):
+        self.pool.add_s('cn=a,dc=example,dc=com', [('cn', ['a'])])
+        self.pool.search_s('cn=a,dc=example,dc=com', ldap.SCOPE_BASE)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+    def test_errors_return_the_connection(self):
+        self.assertRaises(ldap.NO_SUCH_OBJECT,
+                          self.pool.delete_s,
+                          'cn=missing,dc=example,dc=com')
+        self.assertEqual(self.pool.stats(),
+                         {'size': 2, 'connections': 1, 'idle': 1,
+                          'in_use': 0})
+
+    def test_interrupted_call_returns_the_connection(self):
+        def _interrupted(*args, **kwargs):
+            raise greenlet.GreenletExit()
+
+        self.stubs.Set(fakeldap.FakeLdap, 'search_s', _interrupted)
+        for i in range(3):
+            self.assertRaises(greenlet.GreenletExit,
+                              self.pool.search_s,
+                              'dc=example,dc=com',
+                              ldap.SCOPE_ONELEVEL)
+        self.assertEqual(self.pool.stats(),
+                         {'size': 2, 'connections': 1, 'idle': 1,
+                          'in_use': 0})
+
+    def test_checkout_times_out(self):
+        held = [self.pool._checkout(), self.pool._checkout()]
+        self.assertRaises(exception.UnexpectedError, self.pool._checkout)
+        self.assertEqual(len(held), 2)
+
+    def test_expired_connection_is_replaced(self):
+        self.pool.lifetime = 0
+        self.pool.search_s('dc=example,dc=com', ldap.SCOPE_ONELEVEL)
+        self.pool.search_s('dc=example,dc=com', ldap.SCOPE_ONELEVEL)
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(self.pool.stats()['connections'], 1)
+
+    def test_reconnects_when_server_goes_down(self):
+        self.pool.search_s('dc=example,dc=com', ldap.SCOPE_ONELEVEL)
+        calls = []
+
+        def _sleep(seconds):
+            calls.append(seconds)
+            fakeldap.server_fail = False
+
+        self.stubs.Set(ldap_common.core.time, 'sleep', _sleep)
+        fakeldap.server_fail = True
+        self.pool.search_s('dc=example,dc=com', ldap.SCOPE_ONELEVEL)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(self.pool.stats()['connections'], 1)
+
+    def test_search_iter_keeps_its_connection(self):
+        self.pool.add_s('cn=a,dc=example,dc=com', [('cn', ['a'])])
+        self.pool.add_s('cn=b,dc=example,dc=com', [('cn', ['b'])])
+        res = self.pool.search_iter('dc=example,dc=com', ldap.SCOPE_ONELEVEL,
+                                    None)
+        res.next()
+        self.assertEqual(self.pool.stats()['in_use'], 1)
+        res.close()
+        self.assertEqual(self.pool.stats()['in_use'], 0)
+        self.assertEqual(len(list(self.pool.search_iter(
+            'dc=example,dc=com', ldap.SCOPE_ONELEVEL, None))), 2)
+        self.assertEqual(self.pool.stats()['in_use'], 0)
+
+    def test_search_iter_retries_before_the_first_entry(self):
+        self.pool.search_s('dc=example,dc=com', ldap.SCOPE_ONELEVEL)
+        self.pool.add_s('cn=a,dc=example,dc=com', [('cn', ['a'])])
+
+        def _sleep(seconds):
+            fakeldap.server_fail = False
+
+        self.stubs.Set(ldap_common.core.time, 'sleep', _sleep)
+        fakeldap.server_fail = True
+        res = list(self.pool.search_iter('dc=example,dc=com',
+                                         ldap.SCOPE_ONELEVEL,
+                                         None))
+        self.assertEqual([dn for dn, attrs in res],
+                         ['cn=a,dc=example,dc=com'])
+
+    def test_gives_up_after_retries(self):
+        fakeldap.server_fail = True
+        self.assertRaises(ldap.SERVER_DOWN,
+                          self.pool.search_s,
+                          'dc=example,dc=com',
+                          ldap.SCOPE_ONELEVEL)
+        self.assertEqual(self.pool.stats()['connections'], 0)
@@ -14,11 +14,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import uuid
 
 import memcache
 
 from keystone.common import utils
+from keystone import exception
+from keystone.openstack.common import jsonutils
 from keystone.openstack.common import timeutils
 from keystone import test
 from keystone.token.backends import memcache as token_memcache
@@ -32,6 +35,7 @@ class MemcacheClient(object):
     def __init__(self, *args, **kwargs):
         """Ignores the passed in args."""
         self.cache = {}
+        self.cas_ids = {}
 
     def add(self, key, value):
         if self.get(key):
@@ -57,6 +61,27 @@ class MemcacheClient(object):
         if obj and (obj[1] == 0 or obj[1] > now):
             return obj[0]
 
+    def gets(self, key):
+        """Retrieves the value for a key, remembering it for cas()."""
+        self.cas_ids[key] = self.cache.get(key)
+        return self.get(key)
+
+    def cas(self, key, value, time=0):
+        """Sets the value unless it changed since gets()."""
+        if key in self.cas_ids:
+            if self.cache.get(key) is not self.cas_ids.pop(key):
+                return False
+        return self.set(key, value, time)
+
+    def get_multi(self, keys):
+        """Retrieves the values for the keys that are present."""
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
     def set(self, key, value, time=0):
         """Sets the value for a key."""
         self.check_key(key)
@@ -71,6 +96,19 @@ class MemcacheClient(object):
             #NOTE(bcwaldon): python-memcached always returns the same value
             pass
 
+    def incr(self, key, delta=1):
+        value = self.get(key)
+        if value is None:
+            return None
+        value = int(value) + delta
+        self.set(key, value)
+        return value
+
+    def delete_multi(self, keys):
+        for key in keys:
+            self.delete(key)
+        return True
+
 
 class MemcacheToken(test.TestCase, test_backend.TokenTests):
     def setUp(self):
@@ -96,3 +134,168 @@ class MemcacheToken(test.TestCase, test_backend.TokenTests):
     def test_list_tokens_unicode_user_id(self):
         user_id = unicode(uuid.uuid4().hex)
         self.token_api.list_tokens(user_id)
+
+    def user_index(self, shard=0):
+        key = self.token_api._prefix_user_id('testuserid')
+        return self.token_api.client.get(
+            self.token_api._index_key(key, shard))
+
+    def test_user_index_pruned_on_write(self):
+        token_id = uuid.uuid4().hex
+        expire_time = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        self.token_api.create_token(token_id,
+                                    {'id': token_id,
+                                     'expires': expire_time,
+                                     'user': {'id': 'testuserid'}})
+        self.assertEqual(len(self.user_index()['tokens']), 1)
+        token_id = self.create_token_sample_data()
+        self.assertEqual([x[0] for x in self.user_index()['tokens']],
+                         [token_id])
+
+    def test_user_index_is_sharded(self):
+        self.opt_in_group('memcache', user_index_shard_size=2)
+        token_ids = [self.create_token_sample_data() for i in range(5)]
+        self.assertEqual(self.user_index()['shards'], 3)
+        for shard in range(3):
+            self.assertTrue(len(self.user_index(shard)['tokens']) <= 2)
+        self.assertEqual(sorted(self.token_api.list_tokens('testuserid')),
+                         sorted(token_ids))
+        self.token_api.revoke_tokens(user_id='testuserid')
+        self.assertEqual(self.token_api.list_tokens('testuserid'), [])
+
+    def test_user_index_reuses_abandoned_shard(self):
+        self.opt_in_group('memcache', user_index_shard_size=1)
+        token_id = self.create_token_sample_data()
+        # left behind by a writer that never raised the shard count
+        key = self.token_api._prefix_user_id('testuserid')
+        self.token_api.client.set(self.token_api._index_key(key, 1),
+                                  {'tokens': [[uuid.uuid4().hex, None]]})
+        token_id2 = self.create_token_sample_data()
+        self.assertEqual(self.user_index()['shards'], 3)
+        self.assertEqual(sorted(self.token_api.list_tokens('testuserid')),
+                         sorted([token_id, token_id2]))
+
+    def test_legacy_user_index(self):
+        token_id = self.create_token_sample_data()
+        self.token_api.client.set(
+            self.token_api._prefix_user_id('testuserid'),
+            '"%s","%s"' % (token_id, uuid.uuid4().hex))
+        self.assertEqual(self.token_api.list_tokens('testuserid'),
+                         [token_id])
+        token_id2 = self.create_token_sample_data()
+        self.assertEqual([x[0] for x in self.user_index()['tokens']],
+                         [token_id, token_id2])
+
+    def test_revocation_list_is_compact(self):
+        token_id = self.create_token_sample_data()
+        self.token_api.delete_token(token_id)
+        record = self.token_api.client.get(self.token_api.revocation_key)
+        self.assertEqual([x[0] for x in record['tokens']], [token_id])
+
+    def test_revocation_list_is_sharded(self):
+        self.opt_in_group('memcache', revocation_list_shard_size=2)
+        token_ids = [self.create_token_sample_data() for i in range(5)]
+        self.token_api.revoke_tokens(token_ids=token_ids)
+        record = self.token_api.client.get(self.token_api.revocation_key)
+        self.assertEqual(record['shards'], 3)
+        revoked = [x['id'] for x in self.token_api.list_revoked_tokens()]
+        self.assertEqual(sorted(revoked), sorted(token_ids))
+
+    def revoked_ids(self):
+        return sorted(x['id'] for x in self.token_api.list_revoked_tokens())
+
+    def test_revocation_list_grows_under_concurrent_writers(self):
+        self.opt_in_group('memcache', revocation_list_shard_size=1)
+        first = self.create_token_sample_data()
+        self.token_api.delete_token(first)
+        other = self.create_token_sample_data()
+        token_id = self.create_token_sample_data()
+
+        # another process shares the cache but not our gets() state
+        other_api = token_memcache.Token(client=MemcacheClient())
+        other_api.client.cache = self.token_api.client.cache
+        client = self.token_api.client
+        cas = client.cas
+        raced = []
+
+        def racing_cas(key, value, time=0):
+            if key == self.token_api.revocation_key and not raced:
+                # the other writer grows the list between our gets and cas
+                raced.append(key)
+                other_api.delete_token(other)
+            return cas(key, value, time)
+
+        self.stubs.Set(client, 'cas', racing_cas)
+        self.token_api.delete_token(token_id)
+        self.assertEqual(raced, [self.token_api.revocation_key])
+        self.assertEqual(self.revoked_ids(), sorted([first, other, token_id]))
+
+    def test_revocation_list_not_grown_without_shard_count(self):
+        self.opt_in_group('memcache', revocation_list_shard_size=1)
+        first = self.create_token_sample_data()
+        self.token_api.delete_token(first)
+        token_id = self.create_token_sample_data()
+        client = self.token_api.client
+        cas = client.cas
+
+        def failing_cas(key, value, time=0):
+            if key == self.token_api.revocation_key:
+                return False
+            return cas(key, value, time)
+
+        self.stubs.Set(client, 'cas', failing_cas)
+        self.assertRaises(exception.UnexpectedError,
+                          self.token_api.delete_token,
+                          token_id)
+        self.stubs.UnsetAll()
+        key = self.token_api._index_key(self.token_api.revocation_key, 1)
+        self.assertIsNone(client.get(key))
+
+        # the revocation is retried once the head can be updated again
+        self.token_api._add_to_revocation_list({'id': token_id})
+        self.assertEqual(self.revoked_ids(), sorted([first, token_id]))
+
+    def test_revocation_list_without_expiry(self):
+        token_id = uuid.uuid4().hex
+        self.token_api._add_to_revocation_list({'id': token_id})
+        self.assertEqual(self.token_api.list_revoked_tokens(),
+                         [{'id': token_id, 'expires': None}])
+
+    def test_revocation_list_drops_expired_entries(self):
+        self.opt_in_group('memcache', revocation_list_shard_size=1)
+        expire_time = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        self.token_api._add_to_revocation_list({'id': uuid.uuid4().hex,
+                                                'expires': expire_time})
+        self.assertEqual(self.token_api.list_revoked_tokens(), [])
+        token_id = self.create_token_sample_data()
+        self.token_api.delete_token(token_id)
+        record = self.token_api.client.get(self.token_api.revocation_key)
+        self.assertEqual(record.get('shards', 1), 1)
+        self.assertEqual([x[0] for x in record['tokens']], [token_id])
+
+    def test_revocation_list_parsed_once(self):
+        token_id = self.create_token_sample_data()
+        self.token_api.delete_token(token_id)
+        revoked = self.token_api.list_revoked_tokens()
+        self.stubs.Set(self.token_api, '_read_index', None)
+        self.assertEqual(self.token_api.list_revoked_tokens(), revoked)
+        self.stubs.UnsetAll()
+
+        token_id2 = self.create_token_sample_data()
+        self.token_api.delete_token(token_id2)
+        self.assertEqual(
+            sorted(x['id'] for x in self.token_api.list_revoked_tokens()),
+            sorted([token_id, token_id2]))
+
+    def test_legacy_revocation_list(self):
+        token_id = uuid.uuid4().hex
+        expires = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        self.token_api.client.set(
+            self.token_api.revocation_key,
+            jsonutils.dumps({'id': token_id,
+                             'expires': expires,
+                             'user': {'id': 'testuserid'}}))
+        revoked = self.token_api.list_revoked_tokens()
+        self.assertEqual([x['id'] for x in revoked], [token_id])
+        self.assertEqual(revoked[0]['expires'],
+                         expires.replace(microsecond=0))
@@ -17,6 +17,7 @@
 import uuid
 
 from keystone import config
+from keystone import identity
 from keystone.identity.backends import pam as identity_pam
 from keystone import test
 
@@ -65,3 +66,18 @@ class PamIdentity(test.TestCase):
         metadata_out = self.identity_api.get_metadata('root',
                                                       self.tenant_in['id'])
         self.assertDictEqual(metadata, metadata_out)
+
+    def test_get_roles_by_ids_empty(self):
+        identity_man = identity.Manager()
+        self.assertEqual(identity_man.get_roles_by_ids({}, []), [])
+
+    def test_get_users_by_ids(self):
+        identity_man = identity.Manager()
+        users_out = identity_man.get_users_by_ids({}, [self.user_in['id']])
+        self.assertEqual([self.user_in], users_out)
+
+    def test_get_projects_by_ids(self):
+        identity_man = identity.Manager()
+        tenants_out = identity_man.get_projects_by_ids(
+            {}, [self.tenant_in['id']])
+        self.assertEqual([self.tenant_in], tenants_out)
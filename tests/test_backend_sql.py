@@ -14,16 +14,20 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import uuid
 
 from keystone import catalog
+from keystone.catalog.backends import sql as catalog_sql
 from keystone.common import sql
 from keystone import config
 from keystone import exception
 from keystone import identity
+from keystone.openstack.common import timeutils
 from keystone import policy
 from keystone import test
 from keystone import token
+from keystone.token.backends import sql as token_sql
 from keystone import trust
 
 
@@ -165,6 +169,52 @@ class SqlIdentity(SqlTests, test_backend.IdentityTests):
                           user['id'],
                           self.tenant_bar['id'])
 
+    def test_delete_role_removes_assignments(self):
+        role = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        self.identity_api.create_role(role['id'], role)
+        domain = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex}
+        self.identity_api.create_domain(domain['id'], domain)
+        group = {'id': uuid.uuid4().hex, 'name': uuid.uuid4().hex,
+                 'domain_id': domain['id']}
+        self.identity_man.create_group({}, group['id'], group)
+        self.identity_api.create_grant(user_id=self.user_foo['id'],
+                                       domain_id=domain['id'],
+                                       role_id=role['id'])
+        self.identity_api.create_grant(group_id=group['id'],
+                                       project_id=self.tenant_bar['id'],
+                                       role_id=role['id'])
+        self.identity_api.add_role_to_user_and_project(
+            self.user_foo['id'], self.tenant_bar['id'], role['id'])
+
+        self.identity_api.delete_role(role['id'])
+        self.assertEqual(self.identity_api.list_grants(
+            user_id=self.user_foo['id'],
+            domain_id=domain['id']), [])
+        self.assertEqual(self.identity_api.list_grants(
+            group_id=group['id'],
+            project_id=self.tenant_bar['id']), [])
+        self.assertNotIn(role['id'],
+                         self.identity_api.get_roles_for_user_and_project(
+                             self.user_foo['id'], self.tenant_bar['id']))
+
+    def test_metadata_keeps_roles_apart(self):
+        self.identity_api.create_metadata(self.user_two['id'],
+                                          self.tenant_bar['id'],
+                                          {'roles': ['member'],
+                                           'extra': 'extra'})
+        self.identity_api.update_metadata(self.user_two['id'],
+                                          self.tenant_bar['id'],
+                                          {'roles': [self.role_admin['id']]})
+        metadata_ref = self.identity_api.get_metadata(self.user_two['id'],
+                                                      self.tenant_bar['id'])
+        self.assertEqual(metadata_ref, {'roles': [self.role_admin['id']],
+                                        'extra': 'extra'})
+        self.assertEqual(
+            [x['id'] for x in self.identity_api.list_grants(
+                user_id=self.user_two['id'],
+                project_id=self.tenant_bar['id'])],
+            [self.role_admin['id']])
+
     def test_update_project_returns_extra(self):
         """This tests for backwards-compatibility with an essex/folsom bug.
 
@@ -230,7 +280,37 @@ class SqlTrust(SqlTests, test_backend.TrustTests):
 
 
 class SqlToken(SqlTests, test_backend.TokenTests):
-    pass
+    def test_token_columns(self):
+        token_id = uuid.uuid4().hex
+        data = {'id': token_id, 'a': 'b',
+                'trust_id': 'trust',
+                'user': {'id': 'user'},
+                'tenant': {'id': 'tenant'}}
+        self.token_api.create_token(token_id, data)
+        session = self.token_api.get_session()
+        token_ref = session.query(token_sql.TokenModel).get(token_id)
+        self.assertEqual(token_ref.user_id, 'user')
+        self.assertEqual(token_ref.tenant_id, 'tenant')
+        self.assertEqual(token_ref.trust_id, 'trust')
+        self.assertNotIn('user_id', self.token_api.get_token(token_id))
+
+    def test_flush_expired_tokens_in_batches(self):
+        self.opt_in_group('token', flush_batch_size=2, flush_batch_pause=0)
+        expire_time = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        for i in range(5):
+            token_id = uuid.uuid4().hex
+            self.token_api.create_token(token_id,
+                                        {'id': token_id,
+                                         'expires': expire_time,
+                                         'user': {'id': 'testuserid'}})
+        token_id = uuid.uuid4().hex
+        self.token_api.create_token(token_id,
+                                    {'id': token_id,
+                                     'user': {'id': 'testuserid'}})
+        self.assertEqual(self.token_api.flush_expired_tokens(), 5)
+        session = self.token_api.get_session()
+        self.assertEqual(session.query(token_sql.TokenModel).count(), 1)
+        self.assertEqual(self.token_api.flush_expired_tokens(), 0)
 
 
 class SqlCatalog(SqlTests, test_backend.CatalogTests):
@@ -302,6 +382,89 @@ class SqlCatalog(SqlTests, test_backend.CatalogTests):
         with self.assertRaises(exception.StringLengthExceeded):
             self.catalog_api.create_endpoint(endpoint['id'], endpoint.copy())
 
+    def _create_endpoint(self, url, catalog_api=None):
+        catalog_api = catalog_api or self.catalog_api
+        service = {
+            'id': uuid.uuid4().hex,
+            'type': uuid.uuid4().hex,
+            'name': uuid.uuid4().hex,
+        }
+        catalog_api.create_service(service['id'], service.copy())
+        endpoint = {
+            'id': uuid.uuid4().hex,
+            'region': uuid.uuid4().hex,
+            'service_id': service['id'],
+            'interface': 'public',
+            'url': url,
+        }
+        catalog_api.create_endpoint(endpoint['id'], endpoint.copy())
+        return service, endpoint
+
+    def test_get_catalog_substitutes_ids(self):
+        url = 'http://localhost:$(public_port)s/v2/$(tenant_id)s/$(user_id)s'
+        service, endpoint = self._create_endpoint(url)
+
+        for tenant_id in ('tenant1', 'tenant2'):
+            catalog = self.catalog_api.get_catalog('user', tenant_id)
+            self.assertEqual(
+                catalog[endpoint['region']][service['type']]['publicURL'],
+                'http://localhost:%s/v2/%s/user' % (CONF.public_port,
+                                                    tenant_id))
+
+        catalog = self.catalog_api.get_v3_catalog('user', 'tenant1')
+        self.assertEqual(len(catalog), 1)
+        self.assertEqual(catalog[0]['id'], service['id'])
+        self.assertEqual(catalog[0]['type'], service['type'])
+        self.assertEqual(len(catalog[0]['endpoints']), 1)
+        v3_endpoint = catalog[0]['endpoints'][0]
+        self.assertEqual(v3_endpoint['id'], endpoint['id'])
+        self.assertEqual(v3_endpoint['interface'], 'public')
+        self.assertNotIn('service_id', v3_endpoint)
+        self.assertEqual(
+            v3_endpoint['url'],
+            'http://localhost:%s/v2/tenant1/user' % CONF.public_port)
+
+    def test_catalog_is_compiled_once(self):
+        self._create_endpoint('http://localhost/$(tenant_id)s')
+        compiled = []
+        compile_catalog = catalog_sql.CompiledCatalog
+
+        def _compile(*args, **kwargs):
+            compiled.append(args)
+            return compile_catalog(*args, **kwargs)
+
+        self.stubs.Set(catalog_sql, 'CompiledCatalog', _compile)
+        for i in range(3):
+            self.catalog_api.get_catalog('user', uuid.uuid4().hex)
+            self.catalog_api.get_v3_catalog('user', uuid.uuid4().hex)
+        self.assertEqual(len(compiled), 1)
+
+    def test_catalog_is_refreshed_after_writes(self):
+        service, endpoint = self._create_endpoint('http://old')
+        self.catalog_api.get_catalog('user', 'tenant')
+
+        self.catalog_api.update_endpoint(endpoint['id'], {'url': 'http://new'})
+        catalog = self.catalog_api.get_catalog('user', 'tenant')
+        self.assertEqual(
+            catalog[endpoint['region']][service['type']]['publicURL'],
+            'http://new')
+
+        self.catalog_api.delete_service(service['id'])
+        self.assertEqual(self.catalog_api.get_catalog('user', 'tenant'), {})
+
+    def test_catalog_is_refreshed_after_interval(self):
+        self.opt_in_group('catalog', refresh_interval=60)
+        self.assertEqual(self.catalog_api.get_v3_catalog('user', 'tenant'),
+                         [])
+        # a change made by another process
+        self._create_endpoint('http://other', catalog.Manager().driver)
+        self.assertEqual(self.catalog_api.get_v3_catalog('user', 'tenant'),
+                         [])
+
+        self.opt_in_group('catalog', refresh_interval=0)
+        self.assertEqual(
+            len(self.catalog_api.get_v3_catalog('user', 'tenant')), 1)
+
 
 class SqlPolicy(SqlTests, test_backend.PolicyTests):
     pass
@@ -0,0 +1,188 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import datetime
+import uuid
+
+from keystone.common import cache
+from keystone import exception
+from keystone import identity
+from keystone.openstack.common import timeutils
+from keystone import test
+from keystone import trust
+
+import test_backend_kvs
+
+
+CONF = test.CONF
+
+
+class CacheTestCase(test.TestCase):
+    def setUp(self):
+        super(CacheTestCase, self).setUp()
+        self.opt_in_group('cache', enabled=True)
+        self.opt_in_group('identity',
+                          driver='keystone.identity.backends.kvs.Identity')
+        self.opt_in_group('trust',
+                          driver='keystone.trust.backends.kvs.Trust')
+        cache._BACKENDS.clear()
+
+    def tearDown(self):
+        cache._BACKENDS.clear()
+        super(CacheTestCase, self).tearDown()
+
+
+class CachedDriverTests(CacheTestCase):
+    def setUp(self):
+        super(CachedDriverTests, self).setUp()
+        self.identity_man = identity.Manager()
+        self.identity_api = self.identity_man.driver
+        self.driver = self.identity_api.driver
+        self.role_id = uuid.uuid4().hex
+        self.identity_api.create_role(self.role_id,
+                                      {'id': self.role_id, 'name': 'old'})
+
+    def count_calls(self, name):
+        calls = []
+        f = getattr(self.driver, name)
+
+        def _counted(*args, **kwargs):
+            calls.append(args)
+            return f(*args, **kwargs)
+
+        self.stubs.Set(self.driver, name, _counted)
+        return calls
+
+    def test_disabled(self):
+        self.opt_in_group('identity', caching=False)
+        self.assertNotIsInstance(identity.Manager().driver,
+                                 cache.CachedDriver)
+        self.opt_in_group('identity', caching=True)
+        self.opt_in_group('cache', enabled=False)
+        self.assertNotIsInstance(identity.Manager().driver,
+                                 cache.CachedDriver)
+
+    def test_read_through(self):
+        calls = self.count_calls('get_role')
+        for i in range(3):
+            role = self.identity_man.get_role({}, self.role_id)
+            self.assertEqual(role['name'], 'old')
+        self.assertEqual(len(calls), 1)
+
+    def test_cached_value_is_a_copy(self):
+        self.identity_api.get_role(self.role_id)['name'] = 'changed'
+        self.assertEqual(self.identity_api.get_role(self.role_id)['name'],
+                         'old')
+
+    def test_write_invalidates(self):
+        calls = self.count_calls('get_role')
+        self.identity_api.get_role(self.role_id)
+        self.identity_api.update_role(self.role_id, {'name': 'new'})
+        del calls[:]
+        self.assertEqual(self.identity_api.get_role(self.role_id)['name'],
+                         'new')
+        self.assertEqual(len(calls), 1)
+
+    def test_write_through_another_manager_invalidates(self):
+        self.identity_api.get_role(self.role_id)
+        identity.Manager().driver.delete_role(self.role_id)
+        self.assertRaises(exception.RoleNotFound,
+                          self.identity_api.get_role,
+                          self.role_id)
+
+    def test_errors_are_not_cached(self):
+        role_id = uuid.uuid4().hex
+        self.assertRaises(exception.RoleNotFound,
+                          self.identity_api.get_role,
+                          role_id)
+        self.driver.create_role(role_id, {'id': role_id, 'name': 'fresh'})
+        self.assertEqual(self.identity_api.get_role(role_id)['name'], 'fresh')
+
+    def test_method_cache_times(self):
+        self.opt_in_group('cache',
+                          method_cache_times=['identity.get_role:0',
+                                              'identity.get_user:3600'])
+        self.assertEqual(cache.cache_time('identity', 'get_role'), 0)
+        self.assertEqual(cache.cache_time('identity', 'get_user'), 3600)
+        self.assertEqual(cache.cache_time('identity', 'get_project'),
+                         CONF.identity.cache_time)
+
+        calls = self.count_calls('get_role')
+        self.identity_api.get_role(self.role_id)
+        self.identity_api.get_role(self.role_id)
+        self.assertEqual(len(calls), 2)
+
+    def test_uncached_methods_pass_through(self):
+        self.assertEqual(self.identity_api.list_roles,
+                         self.driver.list_roles)
+
+
+class CachedTrustTests(CacheTestCase):
+    def test_expired_trust_is_not_returned(self):
+        trust_man = trust.Manager()
+        trust_id = uuid.uuid4().hex
+        expires_at = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        trust_man.driver.create_trust(trust_id,
+                                      {'trustor_user_id': 'trustor',
+                                       'trustee_user_id': 'trustee',
+                                       'project_id': 'project',
+                                       'impersonation': False,
+                                       'expires_at': expires_at},
+                                      [])
+        self.assertEqual(trust_man.get_trust({}, trust_id)['id'], trust_id)
+
+        timeutils.set_time_override(expires_at + datetime.timedelta(1))
+        try:
+            self.assertIsNone(trust_man.get_trust({}, trust_id))
+        finally:
+            timeutils.clear_time_override()
+
+
+class CheckWorkersTests(CacheTestCase):
+    def test_memory_backend_refused_with_workers(self):
+        self.opt(workers=2)
+        self.assertRaises(cache.ConfigurationError, cache.check_workers)
+        self.assertEqual(cache._BACKENDS, {})
+
+    def test_memcache_backend_allowed_with_workers(self):
+        self.opt(workers=2)
+        self.opt_in_group('cache',
+                          backend='keystone.common.cache.MemcacheBackend')
+        cache.check_workers()
+
+    def test_memory_backend_allowed_without_workers(self):
+        cache.check_workers()
+        self.opt(workers=2)
+        self.opt_in_group('cache', enabled=False)
+        cache.check_workers()
+
+
+class CachedKvsIdentity(test_backend_kvs.KvsIdentity):
+    """Runs the identity backend tests with every lookup cached."""
+
+    def setUp(self):
+        cache._BACKENDS.clear()
+        super(CachedKvsIdentity, self).setUp()
+        self.opt_in_group('cache', enabled=True)
+        self.identity_man.driver = cache.CachedDriver(
+            self.identity_api,
+            'identity',
+            identity.Manager.cached_methods)
+        self.identity_api = self.identity_man.driver
+
+    def tearDown(self):
+        cache._BACKENDS.clear()
+        super(CachedKvsIdentity, self).tearDown()
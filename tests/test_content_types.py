@@ -21,6 +21,7 @@ from lxml import etree
 import nose.exc
 
 from keystone.common import serializer
+from keystone.common import signing
 from keystone.openstack.common import jsonutils
 from keystone import test
 
@@ -713,6 +714,46 @@ class JsonTestCase(RestfulTestCase, CoreApiTests):
             port=self._admin_port())
         self.assertValidRevocationListResponse(r)
 
+    def test_fetch_revocation_list_not_modified(self):
+        token = self.get_scoped_token()
+        r = self.restful_request(
+            method='GET',
+            path='/v2.0/tokens/revoked',
+            token=token,
+            expected_status=200,
+            port=self._admin_port())
+        etag = r.getheader('ETag')
+        self.assertIsNotNone(etag)
+
+        # an unchanged list is neither rebuilt nor signed again
+        def fail(*args, **kwargs):
+            raise AssertionError('revocation list signed again')
+
+        self.stubs.Set(signing, 'sign_text', fail)
+        self.restful_request(
+            method='GET',
+            path='/v2.0/tokens/revoked',
+            headers={'If-None-Match': etag},
+            token=token,
+            expected_status=304,
+            port=self._admin_port())
+        self.stubs.UnsetAll()
+
+        self.admin_request(
+            method='DELETE',
+            path='/v2.0/tokens/%s' % self.get_scoped_token(),
+            token=token,
+            expected_status=204)
+        r = self.restful_request(
+            method='GET',
+            path='/v2.0/tokens/revoked',
+            headers={'If-None-Match': etag},
+            token=token,
+            expected_status=200,
+            port=self._admin_port())
+        self.assertValidRevocationListResponse(r)
+        self.assertNotEqual(r.getheader('ETag'), etag)
+
     def assertValidRevocationListResponse(self, response):
         self.assertIsNotNone(response.body['signed'])
 
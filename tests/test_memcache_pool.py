@@ -0,0 +1,126 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+
+import greenlet
+
+from keystone.common import memcache_pool
+from keystone import exception
+from keystone import test
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.cas_resets = 0
+        self.disconnects = 0
+        self.thread = None
+
+    def get(self, key):
+        self.thread = threading.current_thread()
+        return key
+
+    def fail(self):
+        raise IOError()
+
+    def reset_cas(self):
+        self.cas_resets += 1
+
+    def disconnect_all(self):
+        self.disconnects += 1
+
+
+class PooledClientTestCase(test.TestCase):
+    def setUp(self):
+        super(PooledClientTestCase, self).setUp()
+        self.pool = memcache_pool.PooledClient(['localhost:11211'],
+                                               size=2,
+                                               checkout_timeout=0.01)
+        self.clients = []
+
+        def create_client():
+            client = FakeClient()
+            self.clients.append(client)
+            return client
+
+        self.pool._create_client = create_client
+
+    def test_calls_are_forwarded(self):
+        self.assertEqual(self.pool.get('foo'), 'foo')
+        self.assertEqual(self.pool.get('bar'), 'bar')
+        self.assertEqual(len(self.clients), 1)
+        self.assertEqual(self.clients[0].cas_resets, 2)
+        stats = self.pool.stats()
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+
+    def test_nested_reservations_share_a_client(self):
+        with self.pool.reserve() as client:
+            with self.pool.reserve() as nested:
+                self.assertIs(nested, client)
+            self.assertEqual(self.pool.get('foo'), 'foo')
+        self.assertEqual(len(self.clients), 1)
+
+    def test_checkout_timeout(self):
+        with self.pool.reserve():
+            with self.pool.reserve():
+                pass
+
+            def checkout_in_thread():
+                with self.pool.reserve():
+                    pass
+
+            thread = threading.Thread(target=checkout_in_thread)
+            thread.start()
+            thread.join()
+            with self.pool.reserve():
+                pass
+        self.assertEqual(len(self.clients), 2)
+
+        first = self.pool._checkout()
+        second = self.pool._checkout()
+        self.assertRaises(exception.UnexpectedError, self.pool.get, 'foo')
+        stats = self.pool.stats()
+        self.assertEqual(stats['in_use'], 2)
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+        self.pool._idle.put(first)
+        self.pool._idle.put(second)
+        self.assertEqual(self.pool.get('foo'), 'foo')
+
+    def test_failed_call_disconnects(self):
+        self.assertRaises(IOError, self.pool.fail)
+        self.assertEqual(self.clients[0].disconnects, 1)
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+    def test_interrupted_call_disconnects(self):
+        def interrupt():
+            raise greenlet.GreenletExit()
+
+        self.pool.get('foo')
+        self.clients[0].interrupt = interrupt
+        self.assertRaises(greenlet.GreenletExit, self.pool.interrupt)
+        self.assertEqual(self.clients[0].disconnects, 1)
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+    def test_client_is_shared_between_threads(self):
+        client = memcache_pool._MemcacheClient(['localhost:11211'])
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(client.servers))
+        thread.start()
+        thread.join()
+        self.assertEqual(seen, [client.servers])
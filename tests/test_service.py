@@ -0,0 +1,130 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import httplib
+import os
+import signal
+import time
+
+from keystone.common import dependency
+from keystone.common import service
+from keystone.common import wsgi
+from keystone import service as keystone_service
+from keystone import test
+
+
+SIGNALS = (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)
+
+
+class ProcessLauncherTestCase(test.TestCase):
+    def setUp(self):
+        super(ProcessLauncherTestCase, self).setUp()
+        self.opt(graceful_shutdown_timeout=5)
+        self.stubs.Set(service, 'RESTART_DELAY', 0)
+        self.handlers = dict((signo, signal.getsignal(signo))
+                             for signo in SIGNALS)
+        self.server = wsgi.Server(None, host='127.0.0.1', port=0)
+        self.server.listen(key='socket')
+        self.port = self.server.socket_info['socket'][1]
+        self.launcher = service.ProcessLauncher([self.server],
+                                                2,
+                                                self._prepare_worker)
+        self.launcher.start()
+
+    def tearDown(self):
+        self.launcher.running = False
+        self.launcher.wait()
+        for signo, handler in self.handlers.items():
+            signal.signal(signo, handler)
+        self.server.socket.close()
+        super(ProcessLauncherTestCase, self).tearDown()
+
+    def _prepare_worker(self, index):
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return ['%s %s' % (index, os.getpid())]
+
+        self.server.application = app
+
+    def get(self):
+        conn = httplib.HTTPConnection('127.0.0.1', self.port, timeout=5)
+        try:
+            conn.request('GET', '/')
+            index, pid = conn.getresponse().read().split()
+        finally:
+            conn.close()
+        return int(index), int(pid)
+
+    def supervise_until(self, condition):
+        deadline = time.time() + 10
+        while not condition():
+            self.assertTrue(time.time() < deadline)
+            self.launcher._wait_child()
+
+    def test_workers_share_the_socket(self):
+        self.assertEqual(len(self.launcher.children), 2)
+        index, pid = self.get()
+        self.assertEqual(self.launcher.children[pid][0], index)
+
+    def test_dead_worker_is_replaced(self):
+        pid = sorted(self.launcher.children)[0]
+        index = self.launcher.children[pid][0]
+        os.kill(pid, signal.SIGKILL)
+        self.supervise_until(lambda: pid not in self.launcher.children)
+        self.assertEqual(sorted(i for i, started
+                                in self.launcher.children.values()),
+                         [0, 1])
+        self.assertIn(index, [i for i, started
+                              in self.launcher.children.values()])
+        self.get()
+
+    def test_restart(self):
+        old = set(self.launcher.children)
+        self.launcher._restart_all()
+        self.assertEqual(len(self.launcher.children), 4)
+        self.supervise_until(lambda: not old & set(self.launcher.children))
+        self.assertEqual(len(self.launcher.children), 2)
+        index, pid = self.get()
+        self.assertNotIn(pid, old)
+
+    def test_stop(self):
+        pids = list(self.launcher.children)
+        self.launcher.running = False
+        self.launcher.wait()
+        self.assertEqual(self.launcher.children, {})
+        for pid in pids:
+            self.assertRaises(OSError, os.kill, pid, 0)
+
+    def test_stop_before_worker_handles_signals(self):
+        # what the parent's handler leaves behind when SIGTERM reaches a
+        # worker before it installs its own
+        self.launcher.running = False
+        pid = self.launcher._start_child(2)
+        self.launcher.children.pop(pid)
+        deadline = time.time() + 10
+        while os.waitpid(pid, os.WNOHANG) == (0, 0):
+            self.assertTrue(time.time() < deadline)
+            time.sleep(0.1)
+
+
+class LoadDriversTestCase(test.TestCase):
+    def test_managers_are_rebuilt(self):
+        old = dict(keystone_service.DRIVERS)
+        drivers = keystone_service.load_drivers()
+        self.assertEqual(sorted(drivers), sorted(old))
+        for name, manager in drivers.iteritems():
+            self.assertIsNot(manager, old[name])
+            self.assertIs(dependency.REGISTRY[name], manager)
@@ -0,0 +1,252 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+
+import eventlet
+import greenlet
+import nose.exc
+
+from keystone.common import cms
+from keystone.common import libcrypto
+from keystone.common import signing
+from keystone import test
+
+
+CONF = test.CONF
+TOKEN_DATA = json.dumps({'access': {'token': {'id': 'placeholder'},
+                                    'user': {'id': 'foo', 'name': 'FOO'}}})
+
+
+class SigningTestCase(test.TestCase):
+    def setUp(self):
+        super(SigningTestCase, self).setUp()
+        self.expected = cms.cms_sign_text(TOKEN_DATA,
+                                          CONF.signing.certfile,
+                                          CONF.signing.keyfile)
+
+    def test_subprocess_signer(self):
+        signer = signing.SubprocessSigner()
+        signed = signer.sign_text(TOKEN_DATA,
+                                  CONF.signing.certfile,
+                                  CONF.signing.keyfile)
+        self.assertEqual(signed, self.expected)
+
+    def test_in_process_signer_is_byte_identical(self):
+        if not libcrypto.is_available():
+            raise nose.exc.SkipTest('libcrypto is not available')
+        signer = signing.InProcessSigner()
+        for i in range(3):
+            signed = signer.sign_text(TOKEN_DATA,
+                                      CONF.signing.certfile,
+                                      CONF.signing.keyfile)
+            self.assertEqual(signed, self.expected)
+        self.assertEqual(len(signer._credentials), 1)
+
+    def test_in_process_signer_output_verifies(self):
+        token_id = signing.sign_token(TOKEN_DATA)
+        self.assertTrue(cms.is_ans1_token(token_id))
+        verified = cms.verify_token(token_id,
+                                    CONF.signing.certfile,
+                                    CONF.signing.ca_certs)
+        self.assertEqual(json.loads(verified), json.loads(TOKEN_DATA))
+
+    def test_in_process_signer_falls_back(self):
+        self.stubs.Set(libcrypto, 'is_available', lambda: False)
+        signer = signing.InProcessSigner()
+        signed = signer.sign_text(TOKEN_DATA,
+                                  CONF.signing.certfile,
+                                  CONF.signing.keyfile)
+        self.assertEqual(signed, self.expected)
+        self.assertEqual(signer._credentials, {})
+
+    def test_missing_credentials(self):
+        for signer in (signing.InProcessSigner(), signing.SubprocessSigner()):
+            self.assertRaises(signing.SigningError,
+                              signer.sign_text,
+                              TOKEN_DATA,
+                              'invalid',
+                              CONF.signing.keyfile)
+
+    def test_configured_signer(self):
+        self.opt_in_group('signing',
+                          signer='keystone.common.signing.SubprocessSigner')
+        self.assertIsInstance(signing.get_signer(), signing.SubprocessSigner)
+        self.assertEqual(signing.sign_text(TOKEN_DATA), self.expected)
+
+
+class WorkerPoolSignerTestCase(test.TestCase):
+    def setUp(self):
+        super(WorkerPoolSignerTestCase, self).setUp()
+        self.opt_in_group('signing',
+                          worker_pool_size=1,
+                          worker_checkout_timeout=1)
+        self.signer = signing.WorkerPoolSigner()
+        self.expected = cms.cms_sign_text(TOKEN_DATA,
+                                          CONF.signing.certfile,
+                                          CONF.signing.keyfile)
+
+    def tearDown(self):
+        while self.signer._idle.qsize():
+            self.signer._idle.get().kill()
+        super(WorkerPoolSignerTestCase, self).tearDown()
+
+    def idle_worker(self):
+        worker = self.signer._idle.get()
+        self.signer._idle.put(worker)
+        return worker
+
+    def sign(self, certfile=None):
+        return self.signer.sign_text(TOKEN_DATA,
+                                     certfile or CONF.signing.certfile,
+                                     CONF.signing.keyfile)
+
+    def test_sign(self):
+        self.assertEqual(self.sign(), self.expected)
+        self.assertEqual(self.sign(), self.expected)
+        self.assertEqual(self.signer.stats()['workers'], 1)
+
+    def test_signing_error_keeps_worker(self):
+        self.sign()
+        pid = self.idle_worker().process.pid
+        self.assertRaises(signing.SigningError, self.sign, 'invalid')
+        self.assertEqual(self.idle_worker().process.pid, pid)
+        self.assertEqual(self.sign(), self.expected)
+
+    def test_dead_worker_is_restarted(self):
+        self.sign()
+        worker = self.idle_worker()
+        worker.process.kill()
+        worker.process.wait()
+        self.assertRaises(signing.SigningError, self.sign)
+        self.assertNotEqual(self.idle_worker().process.pid,
+                            worker.process.pid)
+        self.assertEqual(self.sign(), self.expected)
+
+    def test_interrupted_worker_is_replaced(self):
+        self.sign()
+        worker = self.idle_worker()
+
+        def interrupt(request):
+            raise greenlet.GreenletExit()
+
+        self.stubs.Set(worker, 'call', interrupt)
+        self.assertRaises(greenlet.GreenletExit, self.sign)
+        self.assertEqual(self.signer.stats()['workers'], 1)
+        self.assertNotEqual(self.idle_worker().process.pid,
+                            worker.process.pid)
+        self.assertEqual(self.sign(), self.expected)
+
+    def test_outer_timeout_replaces_worker(self):
+        self.sign()
+        worker = self.idle_worker()
+
+        def hang(request):
+            eventlet.sleep(1)
+
+        self.stubs.Set(worker, 'call', hang)
+        with eventlet.Timeout(0.01, False):
+            self.sign()
+            self.fail('outer timeout did not fire')
+        self.assertEqual(self.signer.stats()['workers'], 1)
+        self.assertNotEqual(self.idle_worker().process.pid,
+                            worker.process.pid)
+        self.assertEqual(self.sign(), self.expected)
+
+    def test_checkout_timeout(self):
+        worker = self.signer._checkout()
+        try:
+            self.assertRaises(signing.SigningError, self.sign)
+        finally:
+            self.signer._idle.put(worker)
+        self.assertEqual(self.sign(), self.expected)
+
+
+class VerifierTestCase(test.TestCase):
+    def setUp(self):
+        super(VerifierTestCase, self).setUp()
+        self.verifier = signing.Verifier()
+        self.token_id = signing.sign_token(TOKEN_DATA)
+
+    def verify(self, token_id=None):
+        return self.verifier.verify_token(token_id or self.token_id,
+                                          CONF.signing.certfile,
+                                          CONF.signing.ca_certs)
+
+    def test_verify(self):
+        self.assertEqual(json.loads(self.verify()), json.loads(TOKEN_DATA))
+
+    def test_verify_matches_openssl(self):
+        expected = cms.verify_token(self.token_id,
+                                    CONF.signing.certfile,
+                                    CONF.signing.ca_certs)
+        self.assertEqual(self.verify(), expected)
+
+    def test_verified_token_is_cached(self):
+        data = self.verify()
+
+        def fail(*args, **kwargs):
+            raise AssertionError('token verified twice')
+
+        self.stubs.Set(self.verifier, 'verify_text', fail)
+        self.assertEqual(self.verify(), data)
+        self.assertEqual(self.verifier.cache.hits, 1)
+
+    def test_tampered_token(self):
+        tampered = self.token_id[:-8] + 'AAAAAAAA'
+        self.assertRaises(signing.VerificationError, self.verify, tampered)
+        self.assertEqual(len(self.verifier.cache), 0)
+
+    def test_untrusted_signer(self):
+        self.verify()
+        self.assertRaises(signing.VerificationError,
+                          self.verifier.verify_token,
+                          self.token_id,
+                          CONF.signing.certfile,
+                          CONF.signing.certfile)
+        self.assertEqual(len(self.verifier.cache), 0)
+
+    def touch_certfile(self):
+        mtime = os.stat(CONF.signing.certfile).st_mtime
+        os.utime(CONF.signing.certfile, (mtime + 10, mtime + 10))
+        self.addCleanup(os.utime, CONF.signing.certfile, (mtime, mtime))
+
+    def test_credentials_checked_on_interval(self):
+        self.verify()
+        self.touch_certfile()
+        self.stubs.Set(os, 'stat', None)
+        self.assertEqual(json.loads(self.verify()), json.loads(TOKEN_DATA))
+        self.assertEqual(self.verifier.cache.hits, 1)
+
+    def assert_reverified_after_rotation(self):
+        self.opt_in_group('signing', credentials_check_interval=0)
+        self.verify()
+        self.touch_certfile()
+        verified = []
+        self.stubs.Set(self.verifier, 'verify_text',
+                       lambda *args: verified.append(args) or TOKEN_DATA)
+        self.verify()
+        self.assertEqual(len(verified), 1)
+
+    def test_rotated_credentials_reverify(self):
+        if not libcrypto.is_available():
+            raise nose.exc.SkipTest('libcrypto is not available')
+        self.assert_reverified_after_rotation()
+
+    def test_rotated_credentials_reverify_without_libcrypto(self):
+        self.stubs.Set(libcrypto, 'is_available', lambda: False)
+        self.assert_reverified_after_rotation()
@@ -31,6 +31,7 @@ import uuid
 
 from migrate.versioning import api as versioning_api
 import sqlalchemy
+from sqlalchemy.engine import reflection
 
 from keystone.common import sql
 from keystone.common.sql import migration
@@ -538,6 +539,99 @@ class SqlUpgradeTests(test.TestCase):
         self.assertTableColumns("trust_role",
                                 ["trust_id", "role_id"])
 
+    def test_upgrade_token_indexes(self):
+        self.upgrade(18)
+        token_table = sqlalchemy.Table('token', self.metadata, autoload=True)
+        tokens = [
+            {'id': 'user-token',
+             'extra': json.dumps({'user': {'id': 'foo'}, 'tenant': None})},
+            {'id': 'tenant-token',
+             'extra': json.dumps({'user': {'id': 'foo'},
+                                  'tenant': {'id': 'bar'}})},
+            {'id': 'trust-token',
+             'extra': json.dumps({'user': {'id': 'foo'},
+                                  'trust_id': 'baz'})},
+        ]
+        for token in tokens:
+            self.engine.execute(token_table.insert().values(valid=True,
+                                                            **token))
+
+        self.upgrade(19)
+        self.assertTableColumns('token',
+                                ['id', 'expires', 'extra', 'valid',
+                                 'user_id', 'tenant_id', 'trust_id'])
+        session = self.Session()
+        token_table = sqlalchemy.Table('token', sqlalchemy.MetaData(),
+                                       autoload=True,
+                                       autoload_with=self.engine)
+        rows = dict((row.id, (row.user_id, row.tenant_id, row.trust_id))
+                    for row in session.query(token_table))
+        session.close()
+        self.assertEqual(rows, {'user-token': ('foo', None, None),
+                                'tenant-token': ('foo', 'bar', None),
+                                'trust-token': ('foo', None, 'baz')})
+
+        self.downgrade(18)
+        self.assertTableColumns('token', ['id', 'expires', 'extra', 'valid'])
+
+    def test_upgrade_token_expires_index(self):
+        def token_indexes():
+            inspector = reflection.Inspector.from_engine(self.engine)
+            return [index['name'] for index in inspector.get_indexes('token')]
+
+        self.upgrade(19)
+        self.assertNotIn('ix_token_expires', token_indexes())
+        self.upgrade(20)
+        self.assertIn('ix_token_expires', token_indexes())
+        self.downgrade(19)
+        self.assertNotIn('ix_token_expires', token_indexes())
+
+    def test_upgrade_role_assignment(self):
+        def metadata(table_name):
+            rows = self.engine.execute('select * from %s' % table_name)
+            return dict(((row[0], row[1]), json.loads(row['data']))
+                        for row in rows)
+
+        self.upgrade(20)
+        for role_id in ['r1', 'r2']:
+            self.engine.execute("insert into role (id, name, extra) "
+                                "values ('%s', '%s', '{}')" %
+                                (role_id, role_id))
+        grants = {
+            'user_project_metadata': {
+                ('u1', 'p1'): {'roles': ['r1', 'r2', 'gone'], 'k': 'v'},
+                ('u2', 'p1'): {'roles': []}},
+            'group_domain_metadata': {
+                ('g1', 'd1'): {'roles': ['r2']}},
+        }
+        for table_name, rows in grants.iteritems():
+            for (actor_id, target_id), data in rows.iteritems():
+                self.engine.execute(
+                    "insert into %s values ('%s', '%s', '%s')" %
+                    (table_name, actor_id, target_id, json.dumps(data)))
+
+        self.upgrade(21)
+        assignments = set(tuple(row) for row in self.engine.execute(
+            'select type, actor_id, target_id, role_id '
+            'from role_assignment'))
+        self.assertEqual(assignments,
+                         set([('UserProject', 'u1', 'p1', 'r1'),
+                              ('UserProject', 'u1', 'p1', 'r2'),
+                              ('GroupDomain', 'g1', 'd1', 'r2')]))
+        self.assertEqual(metadata('user_project_metadata'),
+                         {('u1', 'p1'): {'k': 'v'}, ('u2', 'p1'): {}})
+        self.assertEqual(metadata('group_domain_metadata'),
+                         {('g1', 'd1'): {}})
+
+        self.downgrade(20)
+        self.assertTableDoesNotExist('role_assignment')
+        upm = metadata('user_project_metadata')
+        self.assertEqual(upm[('u1', 'p1')]['k'], 'v')
+        self.assertEqual(set(upm[('u1', 'p1')]['roles']), set(['r1', 'r2']))
+        self.assertEqual(upm[('u2', 'p1')], {})
+        self.assertEqual(metadata('group_domain_metadata'),
+                         {('g1', 'd1'): {'roles': ['r2']}})
+
     def populate_user_table(self, with_pass_enab=False,
                             with_pass_enab_domain=False):
         # Populate the appropriate fields in the user
@@ -29,7 +29,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
+from eventlet import tpool
+
 from keystone.common import utils
+from keystone import exception
 from keystone import test
 
 
@@ -63,3 +68,185 @@ class UtilsTestCase(test.TestCase):
         self.assertFalse(utils.auth_str_equal('a', 'aaaaa'))
         self.assertFalse(utils.auth_str_equal('aaaaa', 'a'))
         self.assertFalse(utils.auth_str_equal('ABC123', 'abc123'))
+
+    def test_page_refs(self):
+        refs = [{'id': x, 'even': int(x) % 2 == 0} for x in '3175264']
+        self.assertEqual([ref['id'] for ref in utils.page_refs(refs)],
+                         list('1234567'))
+        self.assertEqual(
+            [ref['id'] for ref in utils.page_refs(iter(refs),
+                                                  filters={'even': True},
+                                                  marker='2',
+                                                  limit=1)],
+            ['4'])
+        self.assertEqual(
+            [ref['id'] for ref in utils.page_refs(iter(refs),
+                                                  marker='6',
+                                                  limit=2,
+                                                  page_reverse=True)],
+            ['4', '5'])
+
+
+class PasswordHasherTestCase(test.TestCase):
+    def setUp(self):
+        super(PasswordHasherTestCase, self).setUp()
+        self.opt(crypt_strength=1000, password_hash_workers=1)
+        self.stubs.Set(utils, '_PASSWORD_HASHER', None)
+
+    def tearDown(self):
+        hasher = utils._PASSWORD_HASHER
+        if hasher is not None and hasher._pool is not None:
+            while hasher._pool._idle.qsize():
+                hasher._pool._idle.get().kill()
+        super(PasswordHasherTestCase, self).tearDown()
+
+    def assertHashes(self):
+        password = u'Comment \xe7a va'
+        hashed = utils.hash_password(password)
+        self.assertIsInstance(hashed, str)
+        self.assertTrue(utils.check_password(password, hashed))
+        self.assertFalse(utils.check_password('wrong', hashed))
+
+    def test_thread_pool(self):
+        self.opt(password_hash_pool='thread')
+        calls = []
+        execute = tpool.execute
+
+        def _execute(*args, **kwargs):
+            calls.append(args)
+            return execute(*args, **kwargs)
+
+        self.stubs.Set(tpool, 'execute', _execute)
+        self.assertHashes()
+        self.assertEqual(len(calls), 3)
+
+    def test_process_pool(self):
+        self.opt(password_hash_pool='process')
+        self.assertHashes()
+        self.assertEqual(utils.get_password_hasher()._pool.stats()['workers'],
+                         1)
+        self.assertRaises(exception.UnexpectedError,
+                          utils.check_password,
+                          'password',
+                          'not a hash')
+        self.assertHashes()
+
+    def test_queue_is_bounded(self):
+        self.opt(password_hash_pool='thread', password_hash_queue_size=0)
+        hasher = utils.get_password_hasher()
+        hasher._semaphore.acquire()
+        try:
+            self.assertRaises(exception.UnexpectedError,
+                              utils.hash_password,
+                              'password')
+        finally:
+            hasher._semaphore.release()
+        self.assertHashes()
+
+
+class VerifiedPasswordCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(VerifiedPasswordCacheTestCase, self).setUp()
+        self.opt(crypt_strength=1000,
+                 password_hash_pool='none',
+                 password_cache_time=60)
+        self.stubs.Set(utils, '_PASSWORD_HASHER', None)
+        self.stubs.Set(utils, '_PASSWORD_CACHE', None)
+        self.hashed = utils.hash_password('right')
+        self.verified = []
+        hasher = utils.get_password_hasher()
+        run = hasher.run
+
+        def _run(op, *args):
+            if op == 'verify':
+                self.verified.append(args)
+            return run(op, *args)
+
+        self.stubs.Set(hasher, 'run', _run)
+
+    def test_match_is_not_hashed_again(self):
+        for i in range(3):
+            self.assertTrue(utils.check_password('right', self.hashed, 'u1'))
+        self.assertEqual(len(self.verified), 1)
+
+    def test_wrong_password_is_always_hashed(self):
+        utils.check_password('right', self.hashed, 'u1')
+        for i in range(3):
+            self.assertFalse(utils.check_password('wrong', self.hashed, 'u1'))
+        self.assertEqual(len(self.verified), 4)
+
+    def test_keyed_by_user_and_stored_hash(self):
+        utils.check_password('right', self.hashed, 'u1')
+        utils.check_password('right', self.hashed, 'u2')
+        new_hash = utils.hash_password('right')
+        self.assertTrue(utils.check_password('right', new_hash, 'u1'))
+        self.assertEqual(len(self.verified), 3)
+
+    def test_nothing_recoverable_is_cached(self):
+        utils.check_password('right', self.hashed, 'u1')
+        entries = utils.get_password_cache()._verified._entries
+        self.assertEqual(len(entries), 1)
+        for key in entries:
+            self.assertNotIn('right', key)
+            self.assertNotIn('u1', key)
+
+    def test_expires(self):
+        utils.check_password('right', self.hashed, 'u1')
+        now = time.time()
+        self.stubs.Set(time, 'time', lambda: now + 61)
+        utils.check_password('right', self.hashed, 'u1')
+        self.assertEqual(len(self.verified), 2)
+
+    def test_disabled(self):
+        self.opt(password_cache_time=0)
+        self.assertIsNone(utils.get_password_cache())
+        utils.check_password('right', self.hashed, 'u1')
+        utils.check_password('right', self.hashed, 'u1')
+        self.assertEqual(len(self.verified), 2)
+
+    def test_without_user_id(self):
+        utils.check_password('right', self.hashed)
+        utils.check_password('right', self.hashed)
+        self.assertEqual(len(self.verified), 2)
+
+
+class LRUCacheTestCase(test.TestCase):
+    def test_get_set(self):
+        cache = utils.LRUCache(2)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        cache = utils.LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+
+    def test_expires(self):
+        cache = utils.LRUCache(2, ttl=10)
+        now = time.time()
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=100)
+        self.stubs.Set(time, 'time', lambda: now + 50)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_delete_and_clear(self):
+        cache = utils.LRUCache(3)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.delete('a')
+        cache.delete('missing')
+        self.assertNotIn('a', cache)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        cache.set('c', 3)
+        self.assertEqual(cache.get('c'), 3)
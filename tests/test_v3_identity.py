@@ -151,6 +151,53 @@ class IdentityTestCase(test_v3.RestfulTestCase):
         r = self.get('/users')
         self.assertValidUserListResponse(r, ref=self.user)
 
+    def _follow(self, link):
+        # links are absolute, requests are made relative to /v3
+        return self.get(link.split('/v3', 1)[1])
+
+    def test_list_users_paged(self):
+        """GET /users?limit={limit}"""
+        for i in range(4):
+            ref = self.new_user_ref(domain_id=self.domain_id)
+            self.identity_api.create_user(ref['id'], ref)
+        user_ids = sorted(x['id'] for x in self.get('/users').body['users'])
+
+        r = self.get('/users?limit=2')
+        self.assertValidUserListResponse(r, expected_length=2)
+        self.assertIsNone(r.body['links']['previous'])
+        seen = [x['id'] for x in r.body['users']]
+        while r.body['links']['next']:
+            r = self._follow(r.body['links']['next'])
+            self.assertValidUserListResponse(r)
+            seen.extend(x['id'] for x in r.body['users'])
+        self.assertEqual(seen, user_ids)
+
+        # the page before the last one
+        start = user_ids.index(r.body['users'][0]['id'])
+        r = self._follow(r.body['links']['previous'])
+        self.assertEqual([x['id'] for x in r.body['users']],
+                         user_ids[start - 2:start])
+
+    def test_list_users_max_page_size(self):
+        """GET /users (max_page_size)"""
+        ref = self.new_user_ref(domain_id=self.domain_id)
+        self.identity_api.create_user(ref['id'], ref)
+        self.opt(max_page_size=1)
+        r = self.get('/users?limit=10')
+        self.assertValidUserListResponse(r, expected_length=1)
+        self.assertIsNotNone(r.body['links']['next'])
+
+    def test_list_users_filtered(self):
+        """GET /users?name={name}"""
+        r = self.get('/users?name=%(name)s' % self.user)
+        self.assertValidUserListResponse(r, ref=self.user, expected_length=1)
+        r = self.get('/users?enabled=false')
+        self.assertValidUserListResponse(r, expected_length=0)
+
+    def test_list_users_invalid_limit(self):
+        """GET /users?limit=0"""
+        self.get('/users?limit=0', expected_status=400)
+
     def test_get_user(self):
         """GET /users/{user_id}"""
         r = self.get('/users/%(user_id)s' % {
@@ -14,6 +14,10 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import httplib
+
+import eventlet
+from eventlet import event
 import webob
 
 from keystone.common import wsgi
@@ -76,3 +80,102 @@ class ApplicationTest(test.TestCase):
         self.assertEqual(resp.body, '')
         self.assertEqual(resp.headers.get('Content-Length'), '0')
         self.assertEqual(resp.headers.get('Content-Type'), None)
+
+
+class ServerReloadTest(test.TestCase):
+    def setUp(self):
+        super(ServerReloadTest, self).setUp()
+        self.released = event.Event()
+        self.server = wsgi.Server(self._app('old', self.released),
+                                  host='127.0.0.1')
+        self.server.start(key='socket')
+        self.port = self.server.socket_info['socket'][1]
+
+    def tearDown(self):
+        self.server.kill()
+        super(ServerReloadTest, self).tearDown()
+
+    def _app(self, name, released=None):
+        def app(environ, start_response):
+            if released is not None and environ['PATH_INFO'] == '/slow':
+                released.wait()
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [name]
+        return app
+
+    def get(self, path='/', port=None):
+        conn = httplib.HTTPConnection('127.0.0.1',
+                                      port or self.port,
+                                      timeout=5)
+        try:
+            conn.request('GET', path)
+            return conn.getresponse().read()
+        finally:
+            conn.close()
+
+    def test_reload(self):
+        self.assertEqual(self.get(), 'old')
+        slow = eventlet.spawn(self.get, '/slow')
+        eventlet.sleep(0.1)
+
+        reloading = eventlet.spawn(self.server.reload,
+                                   self._app('new'),
+                                   timeout=5)
+        eventlet.sleep(0.1)
+        self.assertEqual(self.get(), 'new')
+        self.assertEqual(self.get('/slow'), 'new')
+
+        # the request in flight is answered by the old application
+        self.released.send()
+        self.assertEqual(slow.wait(), 'old')
+        reloading.wait()
+
+    def test_reload_times_out(self):
+        def _get_slow():
+            try:
+                return self.get('/slow')
+            except httplib.HTTPException:
+                return None
+
+        slow = eventlet.spawn(_get_slow)
+        eventlet.sleep(0.1)
+        self.server.reload(self._app('new'), timeout=0.1)
+        self.assertIsNone(slow.wait())
+        self.assertEqual(self.get(), 'new')
+
+    def test_wait_follows_reload(self):
+        self.server.reload(self._app('new'), timeout=1)
+        waiting = eventlet.spawn(self.server.wait)
+        eventlet.sleep(0.1)
+        self.assertFalse(waiting.dead)
+        self.server.kill()
+        waiting.wait()
+
+    def test_reload_with_full_pool(self):
+        server = wsgi.Server(self._app('old', self.released),
+                             host='127.0.0.1',
+                             threads=1)
+        server.start(key='socket')
+        self.addCleanup(server.kill)
+        port = server.socket_info['socket'][1]
+
+        slow = eventlet.spawn(self.get, '/slow', port)
+        eventlet.sleep(0.1)
+        # accepted, then waits for room in the pool
+        queued = eventlet.spawn(self.get, '/', port)
+        eventlet.sleep(0.1)
+
+        reloading = eventlet.spawn(server.reload, self._app('new'), timeout=5)
+        eventlet.sleep(0.1)
+        self.released.send()
+        self.assertEqual(slow.wait(), 'old')
+        self.assertEqual(queued.wait(), 'old')
+        reloading.wait()
+        self.assertEqual(self.get(port=port), 'new')
+
+    def test_reload_before_start(self):
+        server = wsgi.Server(self._app('old'), host='127.0.0.1')
+        self.addCleanup(server.kill)
+        server.reload(self._app('new'))
+        port = server.socket.getsockname()[1]
+        self.assertEqual(self.get(port=port), 'new')
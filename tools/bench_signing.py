@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compare PKI token signing throughput of the available signers.
+
+Usage::
+
+    tools/bench_signing.py [--config-file keystone.conf] [--count N]
+
+Signs a representative v2 token with every signer and prints tokens/sec.
+Without a config file the example certificates in examples/pki are used.
+
+"""
+
+import json
+import os
+import sys
+import time
+
+ROOTDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOTDIR)
+
+from keystone.common import signing
+from keystone import config
+
+
+CONF = config.CONF
+config.register_cli_int('count', default=200)
+
+SIGNERS = ['keystone.common.signing.SubprocessSigner',
+           'keystone.common.signing.InProcessSigner',
+           'keystone.common.signing.WorkerPoolSigner']
+
+TOKEN_DATA = {
+    'access': {
+        'token': {'id': 'placeholder',
+                  'expires': '2013-03-14T00:00:00Z',
+                  'tenant': {'id': 'tenant_id', 'name': 'tenant_name',
+                             'enabled': True, 'description': None}},
+        'serviceCatalog': [
+            {'name': 'service-%d' % i,
+             'type': 'type-%d' % i,
+             'endpoints_links': [],
+             'endpoints': [{'region': 'RegionOne',
+                            'publicURL': 'http://host:%d/v2/tenant_id' % i,
+                            'internalURL': 'http://host:%d/v2/tenant_id' % i,
+                            'adminURL': 'http://host:%d/v2/tenant_id' % i}]}
+            for i in range(8)],
+        'user': {'id': 'user_id', 'name': 'user_name', 'username': 'user_name',
+                 'roles': [{'name': 'Member'}, {'name': 'admin'}],
+                 'roles_links': []},
+        'metadata': {'is_admin': 0, 'roles': ['role_1', 'role_2']},
+    }
+}
+
+
+def bench(signer, text, count):
+    # warm up, so credential loading is not part of the measurement
+    signer.sign_text(text, CONF.signing.certfile, CONF.signing.keyfile)
+    start = time.time()
+    for i in xrange(count):
+        signer.sign_text(text, CONF.signing.certfile, CONF.signing.keyfile)
+    return count / (time.time() - start)
+
+
+def main():
+    CONF(project='keystone')
+    if not CONF.config_file:
+        pki = os.path.join(ROOTDIR, 'examples', 'pki')
+        CONF.set_override('certfile',
+                          os.path.join(pki, 'certs', 'signing_cert.pem'),
+                          group='signing')
+        CONF.set_override('keyfile',
+                          os.path.join(pki, 'private', 'signing_key.pem'),
+                          group='signing')
+
+    text = json.dumps(TOKEN_DATA)
+    for name in SIGNERS:
+        CONF.set_override('signer', name, group='signing')
+        rate = bench(signing.get_signer(), text, CONF.count)
+        print '%-45s %10.1f tokens/sec' % (name, rate)
+
+
+if __name__ == '__main__':
+    main()